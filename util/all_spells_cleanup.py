@@ -1,37 +1,10 @@
+import argparse
 import csv
-from collections import defaultdict
+import json
 import sys
+from array import array
 
-def make_unique_headers(headers):
-    counter = defaultdict(int)
-    unique_headers = []
-    
-    for h in headers:
-        if counter[h] == 0:
-            unique_headers.append(h)
-        else:
-            unique_headers.append(f"{h}{counter[h]}")
-        counter[h] += 1
-    return unique_headers
-
-def parse_csv_to_dicts(file_path):
-    data = []
-    try:
-        with open(file_path, newline='', encoding='cp1252') as csvfile:
-            reader = csv.reader(csvfile)
-            raw_headers = next(reader)
-            headers = make_unique_headers(raw_headers)
-            
-            for row in reader:
-                row_dict = dict(zip(headers, row))
-                data.append(row_dict)
-        return data
-    except FileNotFoundError:
-        print(f"Error: File '{file_path}' not found.")
-        return []
-    except Exception as e:
-        print(f'An error occurred: {e}')
-        return []
+from spell_csv import header_ordered, iter_spell_rows
 
 spell_csv_file = "/home/countzero/git/dnd_tools/data_extracts/all_spells.csv"
 
@@ -105,22 +78,101 @@ columns_to_keep = [
     'LevelStr'
     ]
 
-records = parse_csv_to_dicts(spell_csv_file)
-
-spell_list = []
-for record in records:
-    filtered = {k: v for k, v in record.items() if k in [*columns_to_keep, *class_name_abbr.keys()]}
-    if filtered:
-        levels = []
-        for k, v in filtered.items():
-            if k in class_name_abbr and v:
-                levels.append(f'{class_name_abbr[k]} {v}')
-        filtered['LevelStr'] = ', '.join(levels)
-        for k in class_name_abbr.keys():
-            filtered.pop(k, None)
-        spell_list.append(filtered.values())
-
-# write to stdout
-school_w = csv.writer(sys.stdout, quoting=csv.QUOTE_ALL)
-school_w.writerow(columns_to_keep)
-school_w.writerows(spell_list)
\ No newline at end of file
+# LevelStr, the last column, is built from the class columns rather than read
+read_columns = columns_to_keep[:-1]
+class_names = list(class_name_abbr.keys())
+
+def header_ordered_classes(file_path):
+    """Returns class_names in the order their columns appear in the CSV export, which is the
+    order LevelStr lists them in. Classes the export has no column for come last.
+    """
+    return header_ordered(file_path, class_names)
+
+def iter_cleaned_rows(file_path, levels_sink=None, classes=None):
+    """Yields a tuple in columns_to_keep order for every row of a spell CSV export.
+    The kept and class columns are mapped to row positions once; each row's class levels
+    are joined into LevelStr with the precomputed abbreviations, in classes order (by
+    default the CSV's own column order). levels_sink.add(name, levels), if given, also
+    receives each row's class levels in that order.
+    """
+    if classes is None:
+        classes = header_ordered_classes(file_path)
+    abbrs = [class_name_abbr[c] for c in classes]
+    kept = len(read_columns)
+    for row in iter_spell_rows(file_path, [*read_columns, *classes]):
+        levels = row[kept:]
+        level_str = ', '.join(f'{abbr} {v}' for abbr, v in zip(abbrs, levels) if v)
+        if levels_sink is not None:
+            levels_sink.add(row[0], levels)
+        yield (*row[:kept], level_str)
+
+# Level stored for a class that does not have the spell, or whose level is not a number
+NO_LEVEL = -1
+# The largest level a signed byte cell holds; larger numbers are listed in unparsed
+MAX_LEVEL = 127
+
+class ClassLevelMatrix:
+    """Spell x class level matrix kept in one flat signed byte array, row-major, so it holds
+    one byte per cell however many spells the export has. Levels that are not plain numbers
+    from 0 to MAX_LEVEL are stored as NO_LEVEL and listed in unparsed.
+    """
+    def __init__(self, classes):
+        self.classes = list(classes)
+        self.spells = []
+        self.levels = array('b')
+        self.unparsed = []  # (spell, class, raw level)
+
+    def add(self, name, levels):
+        self.spells.append(name)
+        for c, v in zip(self.classes, levels):
+            if not v:
+                self.levels.append(NO_LEVEL)
+                continue
+            level = v.strip()
+            # isdecimal rather than isdigit, which accepts superscripts int() cannot read
+            if level.isdecimal() and int(level) <= MAX_LEVEL:
+                self.levels.append(int(level))
+            else:
+                self.levels.append(NO_LEVEL)
+                self.unparsed.append((name, c, v))
+
+    def row(self, index):
+        """Returns the levels of the index-th spell, one per class."""
+        width = len(self.classes)
+        return self.levels[index * width:(index + 1) * width]
+
+    def write(self, output):
+        """Writes {"classes", "spells", "levels": one list per spell, "unparsed"} as compact JSON,
+        one spell's levels at a time so the matrix is never copied into Python lists whole.
+        """
+        separators = (',', ':')
+        output.write('{"classes":' + json.dumps(self.classes, separators=separators))
+        output.write(',"spells":' + json.dumps(self.spells, separators=separators))
+        output.write(',"levels":[')
+        for index in range(len(self.spells)):
+            if index:
+                output.write(',')
+            output.write(json.dumps(self.row(index).tolist(), separators=separators))
+        output.write('],"unparsed":' + json.dumps(self.unparsed, separators=separators) + '}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Write the kept columns of a spell CSV export, with a LevelStr built from the class columns, to stdout as CSV.')
+    parser.add_argument('-f', '--file', default=spell_csv_file, help='Path to the CSV file')
+    parser.add_argument('--columnar', help='Also write the spell x class level matrix to this path as columnar JSON')
+    args = parser.parse_args()
+
+    classes = header_ordered_classes(args.file)
+    matrix = ClassLevelMatrix([class_name_abbr[c] for c in classes]) if args.columnar else None
+
+    # write to stdout as the rows are read
+    school_w = csv.writer(sys.stdout, quoting=csv.QUOTE_ALL)
+    school_w.writerow(columns_to_keep)
+    school_w.writerows(iter_cleaned_rows(args.file, matrix, classes))
+
+    if matrix is not None:
+        with open(args.columnar, 'w', encoding='utf-8') as f:
+            matrix.write(f)
+        print(f"Wrote {len(matrix.spells)} x {len(matrix.classes)} class level matrix to {args.columnar}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+"""Setup and timing shared by the benchmark scripts.
+
+Importing this module makes the util scripts importable, since the benchmarks live one level
+below the scripts they exercise and are run directly.
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+UTIL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if UTIL_DIR not in sys.path:
+    sys.path.insert(0, UTIL_DIR)
+
+def time_best(func, repeat, quiet=False):
+    """Returns (best seconds per run, output of the last run) for func() over repeat runs.
+    With quiet, whatever func prints (e.g. parser warnings) is silenced.
+    """
+    best = float('inf')
+    output = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+            start = time.perf_counter()
+            output = func()
+            best = min(best, time.perf_counter() - start)
+    return best, output
@@ -0,0 +1,51 @@
+import argparse
+import glob
+import json
+import os
+import sys
+
+# Importing common also makes the util scripts importable
+from common import time_best
+
+import legacy
+import pdf_processor
+
+def load_pages(json_dir):
+    """Loads every cached OCR JSON page below json_dir (e.g. ocr_output_dir/*/json/*.json)."""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(json_dir, "**", "*.json"), recursive=True)):
+        if os.path.basename(os.path.dirname(path)) != "json":
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            pages.append((path, json.load(f)))
+    return pages
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the legacy and NumPy process_ocr_blocks implementations over cached OCR JSON.')
+    parser.add_argument('-d', '--json_dir', help='Directory to search for */json/*.json pages. Defaults to ocr_output_dir from the config.')
+    parser.add_argument('-c', '--config_file', help='Path to the JSON configuration file. Defaults to ../conf/ocr.json', default=None)
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Number of timed passes; the best is reported')
+    args = parser.parse_args()
+
+    json_dir = args.json_dir or pdf_processor.load_config(args.config_file)['paths']['ocr_output_dir']
+    pages = load_pages(json_dir)
+    if not pages:
+        print(f"No OCR JSON pages found under {json_dir}")
+        sys.exit(1)
+
+    legacy_time, legacy_outputs = time_best(lambda: [legacy.process_ocr_blocks(data) for _, data in pages], args.repeat)
+    current_time, current_outputs = time_best(lambda: [pdf_processor.process_ocr_blocks(data) for _, data in pages], args.repeat)
+
+    mismatches = [path for (path, _), old, new in zip(pages, legacy_outputs, current_outputs) if old != new]
+    for path in mismatches:
+        print(f"❌ Output differs for {path}")
+
+    print(f"Pages: {len(pages)}")
+    print(f"Legacy:  {legacy_time:.3f}s ({len(pages) / legacy_time:.0f} pages/s)")
+    print(f"Current: {current_time:.3f}s ({len(pages) / current_time:.0f} pages/s)")
+    print(f"Speedup: {legacy_time / current_time:.2f}x")
+    print(f"Identical output: {len(pages) - len(mismatches)}/{len(pages)} pages")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,483 @@
+"""Frozen copies of implementations that have since been optimized.
+
+The benchmarks compare the current code against these for both speed and identical
+output. Do not change them.
+"""
+import re
+
+def process_ocr_blocks(raw_ocr_data):
+    """Processes OCR results, orders text blocks by columns, and returns spatially ordered raw text."""
+    parsing_res_list = raw_ocr_data.get('parsing_res_list', [])
+
+    if not parsing_res_list:
+        return ""
+
+    # 1. Collect all text-like blocks with their coordinates
+    text_blocks_with_coords = []
+    for block_info in parsing_res_list:
+        block_label = block_info.get('block_label')
+        block_text = block_info.get('block_content', '')
+        block_bbox = block_info.get('block_bbox', [0,0,0,0])
+
+        # Exclude 'aside_text' and number blocks that are likely page numbers (far left or far right)
+        if block_label == 'number':
+            x1, _, x2, _ = block_bbox
+            page_width_threshold = 600 # Heuristic: numbers beyond this x1 are likely page numbers
+            page_left_threshold = 50 # Heuristic: numbers before this x2 are likely page numbers (if on left side)
+            if x1 > page_width_threshold or x2 < page_left_threshold:
+                continue # Skip this block if it's a side page number
+
+        if block_label in ['text', 'paragraph_title', 'figure_title', 'list_item', 'table', 'number']:
+            if block_bbox and len(block_bbox) == 4:
+                x1, y1, x2, y2 = block_bbox
+                text_blocks_with_coords.append({
+                    'text': block_text,
+                    'x1': x1,
+                    'y1': y1,
+                    'x2': x2,
+                    'y2': y2,
+                    'label': block_label
+                })
+
+    if not text_blocks_with_coords:
+        return ""
+
+    # 2. Dynamically determine column boundaries based on x-coordinates of all blocks
+    # Collect all x1 coordinates to identify natural clusters, which represent column starts.
+    x1_coords = [b['x1'] for b in text_blocks_with_coords]
+    if not x1_coords:
+        return ""
+
+    # Sort x1 coordinates to make clustering easier
+    x1_coords.sort()
+
+    # Simple clustering: identify significant gaps between sorted x1 coordinates.
+    # A "significant gap" indicates a new column.
+    # The threshold for a gap will depend on the OCR output resolution and typical column spacing.
+    # A value of 50-70 pixels might be a good starting point for a visual column break.
+    # Let's use 50 as a balance between separating columns and grouping slightly indented text.
+    gap_threshold = 50 
+
+    column_x_clusters = []
+    if x1_coords:
+        current_cluster = [x1_coords[0]]
+        for i in range(1, len(x1_coords)):
+            if x1_coords[i] - current_cluster[-1] > gap_threshold:
+                # End of current cluster, start a new one
+                column_x_clusters.append(current_cluster)
+                current_cluster = [x1_coords[i]]
+            else:
+                current_cluster.append(x1_coords[i])
+        column_x_clusters.append(current_cluster) # Add the last cluster
+
+    # Now, define column boundaries based on these clusters.
+    # A column's boundary can be the min x1 of the cluster to the max x2 of blocks in that cluster.
+    # For simplicity, let's define a column by its approximate start and end x.
+    column_boundaries = []
+    for cluster in column_x_clusters:
+        min_x = min(cluster)
+        # To determine the max_x for a column, we can look at all blocks whose x1 is in this cluster.
+        # This is a bit more complex, so for now, let's use a simpler approach:
+        # assume column width. Or, better, use the min x of the *next* cluster as the boundary.
+        # If it's the last column, use a large arbitrary value.
+        column_boundaries.append((min_x, min_x + 300)) # Assume approximate column width of 300 pixels
+        # This assumption might be problematic if columns have very different widths.
+        # A more robust solution would be to look at the maximum x2 for blocks within the cluster.
+
+    # Let's refine column_boundaries to be more accurate based on the actual blocks, not just x1s.
+    # Group all blocks by their approximate x1 cluster before defining precise column boundaries.
+    clustered_blocks_by_x1 = {}
+    for block in text_blocks_with_coords:
+        assigned_to_cluster = False
+        for cluster_idx, cluster in enumerate(column_x_clusters):
+            # Check if block's x1 is within the range of this cluster (min to max of cluster x1s)
+            if min(cluster) - 20 <= block['x1'] <= max(cluster) + 20: # Add buffer for slight variations
+                if cluster_idx not in clustered_blocks_by_x1:
+                    clustered_blocks_by_x1[cluster_idx] = []
+                clustered_blocks_by_x1[cluster_idx].append(block)
+                assigned_to_cluster = True
+                break
+        if not assigned_to_cluster:
+            # Fallback for blocks that don't fit a cluster (e.g., images, or very wide blocks)
+            # Assign to the closest cluster or a default wide column.
+            # For simplicity for now, let's just add to the first column if not assigned.
+            if len(column_x_clusters) > 0:
+                if 0 not in clustered_blocks_by_x1:
+                    clustered_blocks_by_x1[0] = []
+                clustered_blocks_by_x1[0].append(block)
+            else:
+                # Should not happen if text_blocks_with_coords is not empty
+                pass
+
+    # Now, based on clustered_blocks_by_x1, define more accurate column boundaries.
+    column_boundaries = []
+    for cluster_idx in sorted(clustered_blocks_by_x1.keys()):
+        blocks_in_cluster = clustered_blocks_by_x1[cluster_idx]
+        if blocks_in_cluster:
+            min_x_for_col = min(b['x1'] for b in blocks_in_cluster)
+            max_x_for_col = max(b['x2'] for b in blocks_in_cluster)
+            column_boundaries.append((min_x_for_col, max_x_for_col))
+
+    # If no columns detected (e.g., very sparse page), default to a single wide column.
+    if not column_boundaries and text_blocks_with_coords:
+        min_x_overall = min(b['x1'] for b in text_blocks_with_coords)
+        max_x_overall = max(b['x2'] for b in text_blocks_with_coords)
+        column_boundaries = [(min_x_overall, max_x_overall)]
+    elif not column_boundaries:
+        return "" # No blocks to process
+
+    # Sort column boundaries by their start x-coordinate (left to right)
+    column_boundaries.sort(key=lambda c: c[0])
+
+    # 3. Assign blocks to identified columns
+    columns_grouped_blocks = {i: [] for i in range(len(column_boundaries))}
+    
+    for block in text_blocks_with_coords:
+        assigned = False
+        block_center_x = (block['x1'] + block['x2']) / 2 # Use center x for robust assignment
+
+        for i, (col_x1, col_x2) in enumerate(column_boundaries):
+            # Check if the block's center x-coordinate is within the column's x-range.
+            # Add a small buffer to the column range to account for minor OCR inaccuracies
+            # or blocks slightly spilling over boundaries.
+            if block_center_x >= col_x1 - 10 and block_center_x <= col_x2 + 10:
+                columns_grouped_blocks[i].append(block)
+                assigned = True
+                break
+        
+        if not assigned:
+            # Fallback: if a block doesn't fit any column, assign to the closest one
+            closest_col_idx = 0
+            min_distance = float('inf')
+            for i, (col_x1, col_x2) in enumerate(column_boundaries):
+                col_center_x = (col_x1 + col_x2) / 2
+                distance = abs(block_center_x - col_center_x)
+                if distance < min_distance:
+                    min_distance = distance
+                    closest_col_idx = i
+            columns_grouped_blocks[closest_col_idx].append(block)
+
+    # 4. Process each column individually (vertical sorting) and concatenate
+    final_output_parts = []
+    for col_idx in sorted(columns_grouped_blocks.keys()):
+        column_blocks = columns_grouped_blocks[col_idx]
+        if not column_blocks:
+            continue
+
+        # Sort blocks within this column by y1 (vertical position), then x1 (horizontal for tie-breaking)
+        column_blocks.sort(key=lambda b: (b['y1'], b['x1']))
+
+        column_text_content = ""
+        for block in column_blocks:
+            column_text_content += block['text'] + "\n"
+        
+        if column_text_content:
+            final_output_parts.append(column_text_content.strip())
+
+    # 5. Concatenate columns with a separator (e.g., double newline between columns)
+    raw_ocr_output = "\n\n".join(final_output_parts)
+    return raw_ocr_output
+
+# --- ocr_spell_cleaner ---
+DESCRIPTION_HINTS = re.compile(
+    r"""(?x)  # verbose mode
+    \b(
+        Mass\b
+        |You\b
+        |This\b
+        |The\b
+        |It\b
+        |A\b
+        |An\b
+    )"""
+)
+
+def split_targets_and_description(text):
+    # Look for sentence-ending punctuation followed by likely description starter
+    matches = list(re.finditer(r'(?<=[.;?!])\s+(?=[A-Z])', text))
+    for match in matches:
+        idx = match.start()
+        # Check what comes next
+        remainder = text[idx:].lstrip()
+        if DESCRIPTION_HINTS.match(remainder):
+            return text[:idx].strip(), remainder.strip()
+
+    # If nothing found, assume whole string is targets (fallback)
+    return text.strip(), ''
+
+def validate_spell_block(block_content: str, min_length: int = 100, min_keywords: int = 2) -> bool:
+    """
+    Validates if a given block of text is likely a full spell description.
+    Checks for minimum length and presence of a certain number of spell-related keywords.
+    """
+    # Keywords expected in a valid spell block (case-insensitive for robustness)
+    SPELL_KEYWORDS = [
+        "Level", "Components", "Casting Time", "Range", "Effect", "Duration", "Target", "Targets", "Enchantment",
+        "Saving Throw", "Spell Resistance", "Divination", "Evocation", "Conjuration", "Necromancy", "Abjuration", "Transmutation"
+    ]
+
+    if len(block_content) < min_length:
+        return False
+
+    found_keywords_count = 0
+    for keyword in SPELL_KEYWORDS:
+        if re.search(r'\b' + re.escape(keyword) + r'\b', block_content, re.IGNORECASE):
+            found_keywords_count += 1
+            if found_keywords_count >= min_keywords:
+                return True
+    
+    return False
+
+def find_block_end(end_token: str, buffer: str) -> int:
+    search_start_pos = 0
+    buffer_end = len(buffer) - len(end_token)
+    possible_block_end = 0
+    while (search_start_pos < buffer_end):
+        possible_end_pos = buffer[search_start_pos:].find(end_token)
+        # found a possible end, check if it's a valid spell block
+        if possible_end_pos != -1:
+            possible_block_end = search_start_pos + possible_end_pos
+            if validate_spell_block(buffer[:possible_block_end]):
+                # valid spell block, return the end position
+                return possible_block_end
+            else:
+                # invalid spell block, continue searching
+                search_start_pos = possible_block_end + 1
+        else:
+            # no more possible ends, return -1
+            return -1
+    # no room in buffer for another end token, return -1
+    return -1
+
+def format_spell_block(block: str) -> str:
+    """
+    Formats a spell block into a markdown string, cleaning up common OCR errors.
+    """
+    name = ""
+    spell_school = ""
+    base_level = ""
+    # Normalize whitespace: replace multiple spaces with a single space
+    block = re.sub(r'\s+', ' ', block)
+
+    # Split the block into lines initially
+    lines = block.split('\n')
+    cleaned_lines = []
+    for line in lines:
+        line = line.strip()
+        if line:
+            cleaned_lines.append(line)
+    
+    clean_block = " ".join(cleaned_lines)
+    spell_schools = ['Abjuration', 'Conjuration', 'Divination', 'Enchantment', 'Evocation', 'Illusion', 'Necromancy', 'Transmutation', 'Universal']
+    class_abbreviations = ['Bbn', 'Brd', 'Clr', 'Drd', 'Ftr', 'Mnk', 'Pal', 'Rgr', 'Rog', 'Sor/Wiz', 'Wiz']
+    spell_domains = ['Air', 'Animal', 'Chaos', 'Death', 'Destruction', 'Earth', 'Evil', 'Fire', 'Good', 'Healing', 'Knowledge', 'Law', 'Luck', 'Magic', 'Plant', 'Protection', 'Strength', 'Sun', 'Travel', 'Trickery', 'War', 'Water']
+    level_types = [*class_abbreviations, *spell_domains]
+    level_types.sort()
+    optional_labels = ['Components', 'Casting Time', 'Range', 'Area','Effect', 'Target', 'Targets', 'Duration', 'Saving Throw', 'Spell Resistance']
+    duration_pattern = re.compile(
+        r"""
+        ^                            # start of string
+        (?:                          # non-capturing group
+            (?:\d+|One)              # number or "One"
+            \s+
+            \w+(?:\.)?            # unit like min., round, day, etc.
+            (?:/level)?              # optional /level
+            (?:\s*\(*D*\)*)?          # optional (D), (F), etc.
+        |
+            \w+                      # standalone like Concentration, Instantaneous
+        )
+        (?:                          # optional additional duration
+            \s+or\s+
+            (?:\d+|One)\s+\w+(?:\.\w+)?(?:/level)?(?:\s*\(.*?\))?
+        )?
+        """,
+        re.VERBOSE | re.IGNORECASE)
+    component_pattern = re.compile(
+        r"""
+        [\s,\.]*                         # allow spaces, commas, or periods before the component
+        (
+            F\s*[/\.]?\s*DF             # F/DF, F.DF, F DF, F DF, F DF, F DF
+            |DF
+            |XP
+            |[VSMF]                     # V, S, M, F
+        )
+        """,
+        re.IGNORECASE | re.VERBOSE
+    )
+    # the first words prior to a spell school is the spell name
+    for school in spell_schools:
+        school_index = clean_block.find(school)
+        if school_index != -1:
+            name = clean_block[:school_index].strip()
+            clean_block = clean_block[school_index:].strip()
+            break
+    else:
+        name = clean_block.split()[0] # no spell school found, use the first word as the spell name
+    # after the spell school there should be the Level entry
+    level_index = clean_block.find("Level")
+    levels = []
+    if level_index != -1:
+        spell_school = clean_block[:level_index].strip()
+        # the spell level block consists of one or more class abbreviations and level numbers, each pair separated by a comma
+        # this sequence is the spell level block
+        clean_block = clean_block[level_index + 5:]
+        # go through each level type and if found, add to level array with the level number
+        for level_type in level_types:
+            # bail out if the block starts with a component entry
+            if clean_block.startswith(' Components'):
+                break
+            match = re.search(f"{level_type}\s*(\d+)", clean_block)
+            if match:
+                # find the level number
+                level_number = match.group(1)
+                levels.append(f"{level_type} {level_number}")
+                clean_block = clean_block[match.end():]
+        if len(levels) > 0:
+            base_level = ", ".join(levels)
+        else:
+            print(f"Unable to parse spell levels for {name}, cannot format spell block")
+            return clean_block
+    else:
+        print(f"Unable to find 'Level' for {name}, cannot format spell block")
+        return clean_block.strip()
+    
+    optional_entries_found = []
+    optional_entries = {}
+    # go through each optional entry and if found, add to the formatted block
+    for entry in optional_labels:
+        entry_index = clean_block.find(entry)
+        if entry_index != -1:
+            optional_entries_found.append((entry, entry_index))
+
+    if (len(optional_entries_found) > 0):
+        filtered_oe = []
+        for i in range(len(optional_entries_found)-1):
+            field, index = optional_entries_found[i]
+            next_field, next_index = optional_entries_found[i+1]
+            if index <= next_index:
+                filtered_oe.append((field, index))
+
+        filtered_oe.append(optional_entries_found[-1])
+        optional_entries_found = filtered_oe
+
+    # optional entries end at the start of the next optional entry or the end of the block
+    while (optional_entries_found):
+        label, index = optional_entries_found.pop(0)
+        if len(optional_entries_found) > 0:
+            n_label, n_index = optional_entries_found[0]
+            optional_entries[label] = clean_block[index + len(label):n_index].strip()
+        else:
+            optional_entries[label] = clean_block[index + len(label):].strip()
+
+    desc = ""
+    # if spell resistance is found, validate the value and the remainder will be the spell description
+    if "Spell Resistance" in optional_entries:
+        #valid_values = ['No or Yes (harmless)', 'Yes (harmless)', 'Yes (object)', 'Yes (harmless, object)', 'Yes (harmless) or Yes (harmless, object)', 'Yes; See text', 'No; See text', 'No (object) and Yes; see text', 'Yes', 'No', 'See text']
+        SPELL_RESISTANCE_RE = re.compile(
+            r"""
+            ^
+            (
+                (?:
+                    (?:Yes|No)                               # Yes or No
+                    (?:\s*\(\s*(?:harmless|object|harmless\s*,\s*object)\s*\))?  # optional parens
+                )
+                (?:                                          # optionally followed by or/and clause
+                    \s*(?:or|and)\s*
+                    (?:Yes|No)
+                    (?:\s*\(\s*(?:harmless|object|harmless\s*,\s*object)\s*\))?
+                )*
+                |
+                See\s+text
+            )
+            (?:\s*;\s*See\s+text)?                           # optional '; See text'
+            (?=\b|[\s.;])                                    # must be followed by a boundary
+            """,
+            re.VERBOSE | re.IGNORECASE
+        )
+        sr_value = optional_entries["Spell Resistance"].rstrip()
+        match = SPELL_RESISTANCE_RE.match(sr_value)
+        if match:
+            desc = sr_value[match.end():].strip()
+            optional_entries["Spell Resistance"] = match.group(1)
+        else:
+            print(f"Invalid spell resistance value for {name}: {optional_entries['Spell Resistance']}")
+    
+    if "Duration" in optional_entries:
+        duration_match = duration_pattern.match(optional_entries["Duration"])
+        if duration_match:
+            if desc == "":
+                desc = optional_entries["Duration"][duration_match.end():].strip()
+            optional_entries["Duration"] = duration_match.group(0)
+        else:
+            print(f"Invalid duration value for {name}: {optional_entries['Duration']}")
+
+    if "Components" in optional_entries:
+        pos = 0
+        found_components = []
+        while (pos < len(optional_entries["Components"])):
+            match = component_pattern.match(optional_entries["Components"], pos)
+            if not match:
+                break
+            token = match.group(1).upper().replace(' ', '').replace('.', '')
+            if token == 'FDF':
+                token = 'F/DF'
+            found_components.append(token)
+            pos = match.end()
+        if len(found_components) > 0:
+            if desc == "":
+                desc = optional_entries["Components"][pos:].strip()
+            cleaned = ', '.join(found_components)
+            optional_entries["Components"] = cleaned
+        else:
+            print(f"No components found for {name}")
+
+    if "Targets" in optional_entries and desc == "":
+        targets, desc = split_targets_and_description(optional_entries["Targets"])
+        optional_entries["Targets"] = targets
+
+    if "Target" in optional_entries and desc == "":
+        targets, desc = split_targets_and_description(optional_entries["Target"])
+        optional_entries["Target"] = targets
+
+    if "Saving Throw" in optional_entries and desc == "":
+        SAVING_THROW_RE = re.compile(
+            r"""
+            ^(
+                (?:
+                    None |
+                    (?:Fortitude|Reflex|Will)
+                    \s+(?:negates|half|partial|reduces|none)
+                    (?:\s*\(.*?\))?
+                    (?:\s*(?:or|and)\s*
+                        (?:Fortitude|Reflex|Will)
+                        \s+(?:negates|half|partial|reduces|none)
+                        (?:\s*\(.*?\))?
+                    )*
+                    (?:\s*;\s*see\s+text(?:\s+for\s+\w+(?:\s+\w+)*)?)?
+                )
+            )
+            (?=\s+(?:This|You|Creatures|Mass|One|The|An|A)\b)
+            """,
+            re.IGNORECASE | re.VERBOSE,
+        )
+        saving_throw = optional_entries["Saving Throw"]
+        match = SAVING_THROW_RE.match(saving_throw)
+        if match:
+            desc = saving_throw[match.end():].strip()
+            optional_entries["Saving Throw"] = match.group(1)
+        else:
+            print(f"Invalid saving throw value for {name}: {optional_entries['Saving Throw']}")
+
+    if desc == "":
+        print(f"No description found for {name}, using entire block as description")
+        desc = clean_block
+
+    formatted_block = f"## {name}\n"
+    formatted_block += f"{spell_school}\n"
+    formatted_block += f"**Level:** {base_level}\n"
+    for entry in optional_entries:
+        if optional_entries[entry] != "":
+            formatted_block += f"**{entry}:** {optional_entries[entry]}\n"
+    formatted_block += f"{desc.rstrip()}"
+
+    return formatted_block
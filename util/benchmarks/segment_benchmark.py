@@ -0,0 +1,47 @@
+import argparse
+import sys
+
+# Importing common also makes the util scripts importable
+from common import time_best
+
+import legacy
+import ocr_spell_cleaner
+
+def legacy_segment(text, end_token):
+    """Segments text the way callers of the old find_block_end had to: one call per block on the remaining text."""
+    blocks = []
+    start = 0
+    while True:
+        block_end = legacy.find_block_end(end_token, text[start:])
+        if block_end == -1:
+            break
+        blocks.append(text[start:start + block_end])
+        start += block_end + len(end_token)
+    if text[start:].strip():
+        blocks.append(text[start:])
+    return blocks
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare legacy find_block_end segmentation with SpellBlockSegmenter over a text dump.')
+    parser.add_argument('-i', '--input', required=True, help='Text dump to segment, e.g. one or more concatenated spells.txt files')
+    parser.add_argument('-t', '--end_token', default='---', help='Token that may end a spell block')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Number of timed passes; the best is reported')
+    args = parser.parse_args()
+
+    with open(args.input, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    segmenter = ocr_spell_cleaner.SpellBlockSegmenter(args.end_token)
+    legacy_time, legacy_blocks = time_best(lambda: legacy_segment(text, args.end_token), args.repeat)
+    current_time, current_blocks = time_best(lambda: list(segmenter.segment(text)), args.repeat)
+
+    print(f"Text: {len(text)} characters, {len(current_blocks)} blocks")
+    print(f"Legacy:  {legacy_time:.3f}s ({len(text) / legacy_time / 1e6:.2f} MB/s)")
+    print(f"Current: {current_time:.3f}s ({len(text) / current_time / 1e6:.2f} MB/s)")
+    print(f"Speedup: {legacy_time / current_time:.2f}x")
+    identical = legacy_blocks == current_blocks
+    print(f"Identical blocks: {'yes' if identical else 'no'}")
+    sys.exit(0 if identical else 1)
+
+if __name__ == '__main__':
+    main()
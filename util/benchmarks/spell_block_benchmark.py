@@ -0,0 +1,42 @@
+import argparse
+import sys
+
+# Importing common also makes the util scripts importable
+from common import time_best
+
+import legacy
+import ocr_spell_cleaner
+
+def load_blocks(spells_file):
+    """Splits a spells.txt into its '---' delimited blocks, skipping empty ones."""
+    with open(spells_file, 'r', encoding='utf-8') as f:
+        return [block for block in f.read().split('---') if block.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the legacy and precompiled format_spell_block implementations over a spells.txt.')
+    parser.add_argument('-i', '--input', required=True, help='spells.txt with --- delimited spell blocks')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Number of timed passes; the best is reported')
+    args = parser.parse_args()
+
+    blocks = load_blocks(args.input)
+    if not blocks:
+        print(f"No spell blocks found in {args.input}")
+        sys.exit(1)
+
+    # quiet: the parsers print a warning for every malformed block
+    legacy_time, legacy_outputs = time_best(lambda: [legacy.format_spell_block(block) for block in blocks], args.repeat, quiet=True)
+    current_time, current_outputs = time_best(lambda: [ocr_spell_cleaner.format_spell_block(block) for block in blocks], args.repeat, quiet=True)
+
+    mismatches = [i for i, (old, new) in enumerate(zip(legacy_outputs, current_outputs)) if old != new]
+    for i in mismatches:
+        print(f"❌ Output differs for block {i}: {blocks[i].strip()[:60]!r}")
+
+    print(f"Blocks: {len(blocks)}")
+    print(f"Legacy:  {legacy_time:.3f}s ({len(blocks) / legacy_time:.0f} blocks/s)")
+    print(f"Current: {current_time:.3f}s ({len(blocks) / current_time:.0f} blocks/s)")
+    print(f"Speedup: {legacy_time / current_time:.2f}x")
+    print(f"Identical output: {len(blocks) - len(mismatches)}/{len(blocks)} blocks")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,19 @@
+import argparse
+import bisect
 import csv
 import re
 
+from ocr_spell_cleaner import SPELL_SCHOOLS
+from spell_matcher import ApproximateNameIndex, NameMatcher, fold_ocr_text, read_canonical_names
+
+# A candidate scoring at least this much is accepted without asking
+DEFAULT_MIN_SCORE = 5
+# How far past the name to look for the school line that follows a spell header
+SCHOOL_LOOKAHEAD = 80
+SCHOOL_ALTERNATION = "|".join(re.escape(school) for school in SPELL_SCHOOLS)
+SCHOOL_RE = re.compile(r"\s*(?:" + SCHOOL_ALTERNATION + r")\b", re.IGNORECASE)
+SCHOOL_WORD_RE = re.compile(r"\b(?:" + SCHOOL_ALTERNATION + r")\b", re.IGNORECASE)
+
 # Read spell names from CSV
 def read_names(csv_path):
     with open(csv_path, newline='') as f:
@@ -11,83 +24,196 @@ def read_names(csv_path):
 # Read input text file
 def read_text_file(file_path):
     with open(file_path, 'r', encoding='utf-8') as f:
-        return f.readlines()
-
-# Main logic
-def insert_delimiters(names, lines):
-    current_line = 0
-    found_spells = []
-
-    for spell in names:
-        print(f"Processing spell: {spell}")
-        spell_lower = spell.lower()
-        spell_len = len(lines)
-        found = False
-
-        while current_line < spell_len:
-            line = lines[current_line]
-            index = line.lower().find(spell_lower)
-
-            if index != -1:
-                # Auto-accept if spell starts the line and line is at top or after '---'
-                if index == 0:
-                    prev_line = lines[current_line - 1].strip() if current_line > 0 else ''
-                    if current_line == 0 or prev_line == '---':
-                        found_spells.append(spell)
-                        current_line += 1
-                        found = True
-                        print(f"Found spell: {spell} with proper delimiter, moving to next spell")
-                        break
-
-                # Otherwise prompt
-                context_start = max(0, current_line - 2)
-                context_end = min(len(lines), current_line + 2)
-                context = ''.join(lines[context_start:context_end])
-                print(f"\n❓ Possible match for: **{spell}**")
-                print("Context:\n---\n" + context + "---")
-                choice = input("Insert delimiter and accept? (Y)es / (N)o: ").strip().lower()
-
-                if choice == 'y':
-                    before = line[:index].rstrip()
-                    after = line[index:].lstrip()
-                    new_lines = []
-                    if before:
-                        new_lines.append(before + '\n')
-                    new_lines.extend(['---\n', after])
-
-                    # Replace the current line with split content
-                    lines = lines[:current_line] + new_lines + lines[current_line + 1:]
-                    found_spells.append(spell)
-                    current_line += len(new_lines)
-                    found = True
+        return f.read()
+
+def line_bounds(text, start):
+    """Returns (start of the line containing start, start of the line after it or len(text))."""
+    line_start = text.rfind('\n', 0, start) + 1
+    line_end = text.find('\n', start)
+    return line_start, len(text) if line_end == -1 else line_end + 1
+
+def previous_line(text, line_start):
+    """Returns the stripped line before the one starting at line_start, or None at the top of the text."""
+    if line_start == 0:
+        return None
+    return text[text.rfind('\n', 0, line_start - 1) + 1:line_start - 1].strip()
+
+# Score how much an occurrence of a spell name at text[start:end] looks like the spell's header
+def score_candidate(text, start, end, name):
+    line_start, _ = line_bounds(text, start)
+    at_line_start = not text[line_start:start].strip()
+    delimited = at_line_start and previous_line(text, line_start) in (None, '---')
+
+    score = 0
+    if at_line_start:
+        score += 2
+    if delimited:
+        score += 2
+    if SCHOOL_RE.match(text, end, min(len(text), end + SCHOOL_LOOKAHEAD)):
+        score += 2
+    if (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum()):
+        score += 1
+    else:
+        # Inside a longer word, e.g. "Light" in "Daylight"
+        score -= 2
+    if text[start:end] == name:
+        score += 1
+    return score, delimited
+
+# Ask on stdin whether to split before a low-confidence match
+def prompt_for_match(text, start, name, score):
+    # Two lines before the match, its line and the line after
+    line_start, line_end = line_bounds(text, start)
+    context_start = line_start
+    for _ in range(2):
+        if context_start > 0:
+            context_start = text.rfind('\n', 0, context_start - 1) + 1
+    context_end = line_bounds(text, line_end)[1] if line_end < len(text) else line_end
+    print(f"\n❓ Possible match for: **{name}** (score {score})")
+    print("Context:\n---\n" + text[context_start:context_end] + "---")
+    choice = input("Insert delimiter and accept? (Y)es / (N)o: ").strip().lower()
+    return choice == 'y'
+
+# Build the updated text from the split offsets in one pass instead of rebuilding the line list per split
+def apply_splits(text, splits):
+    pieces = []
+    previous = 0
+    for offset in sorted(splits):
+        line_start = max(text.rfind('\n', 0, offset) + 1, previous)
+        pieces.append(text[previous:line_start])
+        before = text[line_start:offset].rstrip()
+        if before:
+            pieces.append(before + '\n')
+        pieces.append('---\n')
+        previous = offset
+    pieces.append(text[previous:])
+    return ''.join(pieces)
+
+# Yield (start, end) of the name in each line from start to end that looks like a spell
+# header: followed by a school on the same or the next line, or right after a --- line.
+# Lines ending in a hyphen are joined with the next one.
+def iter_header_names(text, start, end):
+    line_start = start if start == 0 or text[start - 1] == '\n' else text.find('\n', start) + 1
+    if line_start == 0 and start > 0:
+        return  # start is on the last line
+    while line_start < end:
+        line_end = text.find('\n', line_start)
+        line_end = len(text) if line_end == -1 else line_end
+        while text[line_start:line_end].rstrip().endswith('-') and line_end < len(text):
+            next_end = text.find('\n', line_end + 1)
+            line_end = len(text) if next_end == -1 else next_end
+        name_start = line_start + len(text[line_start:line_end]) - len(text[line_start:line_end].lstrip())
+        school = SCHOOL_WORD_RE.search(text, name_start, line_end)
+        if school and school.start() > name_start:
+            name_end = school.start()
+        elif SCHOOL_RE.match(text, line_end) or previous_line(text, line_start) in (None, '---'):
+            name_end = line_end
+        else:
+            name_end = None
+        if name_end is not None:
+            name_end = name_start + len(text[name_start:name_end].rstrip())
+            if name_end > name_start:
+                yield name_start, name_end
+        line_start = line_end + 1
+
+# Main logic: find every name in one pass, then walk the names in book order, accepting the
+# first confident header after the previous spell and prompting (via confirm) only when
+# there is no confident candidate. confirm=None never prompts; those names are left for review.
+# Names with no exact occurrence are then looked for with an OCR-tolerant name index among the
+# header-like lines between the spells around them, e.g. "Magic Mis-\nsile" or "Ca11 Lightning".
+def insert_delimiters(names, text, confirm=prompt_for_match, min_score=DEFAULT_MIN_SCORE, name_index=None):
+    occurrences = NameMatcher(names).find_all(text)
+    cursor = 0
+    accepted = {}  # name index -> (start, delimited)
+    missing = []  # (name index, cursor when it was looked for)
+    unresolved = set()
+
+    for index, spell in enumerate(names):
+        starts = occurrences.get(index, [])
+        candidates = starts[bisect.bisect_left(starts, cursor):]
+        match = None
+        low_confidence = []
+        for start in candidates:
+            score, delimited = score_candidate(text, start, start + len(spell), spell)
+            if score >= min_score:
+                match = (start, delimited)
+                break
+            low_confidence.append((start, score, delimited))
+
+        if match is None and confirm is not None:
+            for start, score, delimited in low_confidence:
+                if confirm(text, start, spell, score):
+                    match = (start, delimited)
                     break
-                else:
-                    current_line += 1
-            else:
-                current_line += 1
 
-        if not found:
-            print(f"⚠️ Spell not found: {spell}")
+        if match is None:
+            if low_confidence:
+                unresolved.add(index)
+            missing.append((index, cursor))
+            continue
+
+        accepted[index] = match
+        cursor = match[0] + len(spell)
+
+    if missing:
+        name_index = name_index or ApproximateNameIndex(names)
+        accepted_starts = sorted(start for start, _ in accepted.values())
+        fuzzy_cursor = 0
+        for index, window_start in missing:
+            spell = names[index]
+            window_start = max(window_start, fuzzy_cursor)
+            following = bisect.bisect_right(accepted_starts, window_start)
+            window_end = accepted_starts[following] if following < len(accepted_starts) else len(text)
+            for start, end in iter_header_names(text, window_start, window_end):
+                found = name_index.lookup(text[start:end])
+                if found is None or fold_ocr_text(found[0]) != fold_ocr_text(spell):
+                    continue
+                score, delimited = score_candidate(text, start, end, spell)
+                if score >= min_score or (confirm is not None and confirm(text, start, spell, score)):
+                    accepted[index] = (start, delimited)
+                    bisect.insort(accepted_starts, start)
+                    fuzzy_cursor = end
+                    unresolved.discard(index)
+                    print(f"Found spell: {spell} as {text[start:end]!r}")
+                    break
+                unresolved.add(index)
 
-    return lines, found_spells
+    for index, spell in enumerate(names):
+        if index not in accepted:
+            print(f"⚠️ Spell not found: {spell}")
+    splits = [start for start, delimited in accepted.values() if not delimited]
+    found_spells = [spell for index, spell in enumerate(names) if index in accepted]
+    return apply_splits(text, splits), found_spells, [names[index] for index in sorted(unresolved)]
 
 # Write updated text to file
-def write_text_file(file_path, lines):
+def write_text_file(file_path, text):
     with open(file_path, 'w', encoding='utf-8') as f:
-        f.writelines(lines)
+        f.write(text)
 
 # ---- Run it ----
-if __name__ == '__main__':
-    spell_csv = '../data_extracts/phb_spells.csv'
-    text_path = '../cache/raw_text/phb35/spells.txt'
-    updated_text_path = '../cache/raw_text/phb35/spells_updated.txt'
-
-    names = read_names(spell_csv)
-    lines = read_text_file(text_path)
-
-    updated_lines, found = insert_delimiters(names, lines)
+def main():
+    parser = argparse.ArgumentParser(description='Insert --- delimiters before each spell header in an OCR text dump.')
+    parser.add_argument('-n', '--names', required=True, help='CSV of spell names in book order (first column), e.g. ../data_extracts/phb_spells.csv')
+    parser.add_argument('-i', '--input', required=True, help='OCR text dump, e.g. ../cache/raw_text/phb35/spells.txt')
+    parser.add_argument('-o', '--output', required=True, help='Path for the delimited text')
+    parser.add_argument('--min_score', type=int, default=DEFAULT_MIN_SCORE, help='Candidates scoring at least this much are accepted without asking')
+    parser.add_argument('--batch', action='store_true', help='Never prompt; names with only low-confidence matches are skipped and listed')
+    parser.add_argument('--canonical_names', help='spells.tsv or CSV of all known spell names used to recognize OCR-damaged headers; defaults to --names')
+    args = parser.parse_args()
+
+    names = read_names(args.names)
+    text = read_text_file(args.input)
+
+    confirm = None if args.batch else prompt_for_match
+    name_index = ApproximateNameIndex(read_canonical_names(args.canonical_names)) if args.canonical_names else None
+    updated_text, found, unresolved = insert_delimiters(names, text, confirm=confirm, min_score=args.min_score, name_index=name_index)
+
+    write_text_file(args.output, updated_text)
+
+    print(f"\n✅ Finished processing. {len(found)} of {len(names)} spells found and marked.")
+    if unresolved:
+        print(f"🔎 {len(unresolved)} spells had only low-confidence matches and need review: {', '.join(unresolved)}")
+    print(f"✍️ Updated file saved to: {args.output}")
 
-    write_text_file(updated_text_path, updated_lines)
-
-    print(f"\n✅ Finished processing. {len(found)} spells found and marked.")
-    print(f"✍️ Updated file saved to: {updated_text_path}")
+if __name__ == '__main__':
+    main()
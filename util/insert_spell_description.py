@@ -1,8 +1,19 @@
+import argparse
+import hashlib
+import json
 import mysql.connector
 import re
 import os
 from dotenv import load_dotenv
 
+from spell_matcher import db_name_key
+
+# The legacy spells table this script was written for; the Prisma schema's equivalent is
+# Spell.description, selectable with --table Spell --column description
+SPELL_TABLE = 'spells'
+DESCRIPTION_COLUMN = 'desc'
+DEFAULT_BATCH_SIZE = 500
+
 def parse_markdown(filepath):
     spells = []
     with open(filepath, 'r', encoding='utf-8') as f:
@@ -34,7 +45,86 @@ def parse_markdown(filepath):
         })
     return spells
 
-def update_descs(spells_data):
+def read_spell_records(filepath):
+    """Streams name and description from the spell records written by ocr_spell_cleaner,
+    skipping blocks the cleaner could not parse.
+    """
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if not record['parsed']:
+                continue
+            yield {
+                'name': record['name'],
+                'description': record['description'].strip()
+            }
+
+def description_hash(description):
+    return hashlib.sha256((description or '').encode('utf-8')).digest()
+
+def import_descriptions(conn, spells_data, batch_size=DEFAULT_BATCH_SIZE, mode='executemany', table=SPELL_TABLE, column=DESCRIPTION_COLUMN, edition_id=None):
+    """Updates the description of every spell in spells_data whose stored description differs,
+    in one transaction, and returns a report of what matched, changed and was missing.
+
+    The stored descriptions are read with one query and compared by content hash, so
+    re-importing a book only writes what changed. mode 'executemany' sends the updates in
+    batches of batch_size; mode 'join' loads them into a temporary table in batches and
+    applies them with a single UPDATE ... JOIN. Names are compared with db_name_key, as the
+    database's collation compares them. With edition_id only that edition's rows are read
+    and updated; without it every row sharing a name is updated, whatever its edition.
+    """
+    edition_filter, edition_params = ("editionId = %s", (edition_id,)) if edition_id is not None else ("", ())
+    cursor = conn.cursor()
+    try:
+        stored = {}  # name key -> hashes of the descriptions stored under that name
+        stored_names = {}  # name key -> the name as stored, so the updates match it exactly
+        where = f" WHERE {edition_filter}" if edition_filter else ""
+        cursor.execute(f"SELECT name, `{column}` FROM `{table}`{where}", edition_params)
+        for name, description in cursor.fetchall():
+            key = db_name_key(name)
+            stored.setdefault(key, set()).add(description_hash(description))
+            stored_names.setdefault(key, name)
+
+        # the last description given for a name wins
+        incoming = {db_name_key(spell['name']): (spell['name'], spell['description']) for spell in spells_data}
+        missing = [name for key, (name, _) in incoming.items() if key not in stored]
+        changed = [(description, stored_names[key]) for key, (_, description) in incoming.items()
+                   if key in stored and stored[key] != {description_hash(description)}]
+
+        if mode == 'join':
+            cursor.execute("CREATE TEMPORARY TABLE spell_description_import (name VARCHAR(255) PRIMARY KEY, description MEDIUMTEXT)")
+            for start in range(0, len(changed), batch_size):
+                cursor.executemany("INSERT INTO spell_description_import (description, name) VALUES (%s, %s)", changed[start:start + batch_size])
+            where = f" WHERE s.{edition_filter}" if edition_filter else ""
+            cursor.execute(f"UPDATE `{table}` s JOIN spell_description_import i ON s.name = i.name SET s.`{column}` = i.description{where}", edition_params)
+            rows_updated = cursor.rowcount
+            cursor.execute("DROP TEMPORARY TABLE spell_description_import")
+        else:
+            where = f" AND {edition_filter}" if edition_filter else ""
+            rows_updated = 0
+            for start in range(0, len(changed), batch_size):
+                batch = [row + edition_params for row in changed[start:start + batch_size]]
+                cursor.executemany(f"UPDATE `{table}` SET `{column}` = %s WHERE name = %s{where}", batch)
+                rows_updated += cursor.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    return {
+        'spells': len(incoming),
+        'matched': len(incoming) - len(missing),
+        'changed': len(changed),
+        'unchanged': len(incoming) - len(missing) - len(changed),
+        'missing': missing,
+        'rows_updated': rows_updated,
+    }
+
+def update_descs(spells_data, batch_size=DEFAULT_BATCH_SIZE, mode='executemany', table=SPELL_TABLE, column=DESCRIPTION_COLUMN, edition_id=None):
     try:
         conn = mysql.connector.connect(
             host=os.getenv('DB_HOST'),
@@ -42,32 +132,48 @@ def update_descs(spells_data):
             password=os.getenv('DB_PASS'),
             database=os.getenv('DB_NAME')
         )
-        cursor = conn.cursor()
-
-        for spell in spells_data:
-            update_query = "UPDATE spells SET desc = %s WHERE name = %s"
-            cursor.execute(update_query, (spell['description'], spell['name']))
-            print(f"Updated description for {spell['name']}")
-
-        conn.commit()
+        report = import_descriptions(conn, spells_data, batch_size, mode, table, column, edition_id)
+        print(f"Matched {report['matched']} of {report['spells']} spells: {report['changed']} changed ({report['rows_updated']} rows updated), {report['unchanged']} unchanged, {len(report['missing'])} missing")
+        for name in report['missing']:
+            print(f"Missing from {table}: {name}")
+        return report
 
     except mysql.connector.Error as err:
         print(f"Error: {err}")
     finally:
         if 'conn' in locals() and conn.is_connected():
-            cursor.close()
             conn.close()
             print("Database connection closed.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Import spell descriptions into the database, writing only the ones that changed.')
+    parser.add_argument('-i', '--input', help='Spell records (.jsonl) from ocr_spell_cleaner or cleaned markdown; defaults to the PHB 3.5 records, then its markdown')
+    parser.add_argument('--mode', choices=['executemany', 'join'], default='executemany', help='Send updates in executemany batches, or load a temporary table and apply one UPDATE ... JOIN')
+    parser.add_argument('--batch_size', type=int, default=DEFAULT_BATCH_SIZE, help='Rows per executemany batch')
+    parser.add_argument('--table', default=SPELL_TABLE, help='Table holding the spells')
+    parser.add_argument('--column', default=DESCRIPTION_COLUMN, help='Description column of that table')
+    parser.add_argument('--edition_id', type=int, help='Only read and update spells of this edition (Spell.editionId); without it same-named spells of every edition are updated')
+    args = parser.parse_args()
+
     load_dotenv()
 
+    records_filepath = '../cache/processed_spells/phb35_spells.jsonl'
     markdown_filepath = '../cache/processed_spells/phb35_spells_cleaned.md'
-    
-    if not os.path.exists(markdown_filepath):
-        print(f"Error: Markdown file not found at {markdown_filepath}")
+    if args.input:
+        if args.input.endswith('.jsonl'):
+            records_filepath, markdown_filepath = args.input, None
+        else:
+            records_filepath, markdown_filepath = None, args.input
+
+    if records_filepath and os.path.exists(records_filepath):
+        print(f"Reading {records_filepath}...")
+        spells = list(read_spell_records(records_filepath))
+    elif not markdown_filepath or not os.path.exists(markdown_filepath):
+        print(f"Error: {'Markdown' if markdown_filepath else 'Records'} file not found at {markdown_filepath or records_filepath}")
+        spells = None
     else:
         print(f"Parsing {markdown_filepath}...")
         spells = parse_markdown(markdown_filepath)
+    if spells is not None:
         print(f"Found {len(spells)} spells. Updating database...")
-        update_descs(spells) 
\ No newline at end of file
+        update_descs(spells, args.batch_size, args.mode, args.table, args.column, args.edition_id)
@@ -1,6 +1,15 @@
+import argparse
+import contextlib
 import csv
+import heapq
+import json
 import re
 import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from spell_matcher import ApproximateNameIndex, read_canonical_names
 
 DESCRIPTION_HINTS = re.compile(
     r"""(?x)  # verbose mode
@@ -28,297 +37,786 @@ def split_targets_and_description(text):
     # If nothing found, assume whole string is targets (fallback)
     return text.strip(), ''
 
+# Keywords expected in a valid spell block (case-insensitive for robustness)
+SPELL_KEYWORDS = [
+    "Level", "Components", "Casting Time", "Range", "Effect", "Duration", "Target", "Targets", "Enchantment",
+    "Saving Throw", "Spell Resistance", "Divination", "Evocation", "Conjuration", "Necromancy", "Abjuration", "Transmutation"
+]
+
+WORD_CHAR_RE = re.compile(r'\w')
+
+def iter_overlapping_matches(pattern, text, pos=0, endpos=None):
+    """Yields every match of pattern in text[pos:endpos], including overlapping ones."""
+    if endpos is None:
+        endpos = len(text)
+    match = pattern.search(text, pos, endpos)
+    while match:
+        yield match
+        match = pattern.search(text, match.start() + 1, endpos)
+
+class KeywordMatcher:
+    """Finds whole-word, case-insensitive keyword matches with one compiled alternation.
+
+    Longer keywords are tried first, so each match reports the longest keyword at its
+    position; implied_keywords adds the shorter keywords that match there as whole words
+    too (e.g. "Spell" within "Spell Resistance", but not "Target" within "Targets").
+    Keywords must start and end with word characters.
+    """
+    def __init__(self, keywords=SPELL_KEYWORDS):
+        self.keywords = list(keywords)
+        self.ordered = sorted(self.keywords, key=len, reverse=True)
+        self.max_length = len(self.ordered[0])
+        alternation = "|".join(f"({re.escape(keyword)})" for keyword in self.ordered)
+        self.keyword_re = re.compile(rf"\b(?:{alternation})\b", re.IGNORECASE)
+        # Matches at the very start or end of a block, where the block edge is the word boundary
+        self.head_re = re.compile(rf"(?:{alternation})\b", re.IGNORECASE)
+        self.tail_re = re.compile(rf"\b(?:{alternation})\Z", re.IGNORECASE)
+        self.implied = [
+            [
+                (other, len(other)) for other in self.keywords
+                if keyword.lower().startswith(other.lower())
+                and (len(other) == len(keyword) or not WORD_CHAR_RE.match(keyword[len(other)]))
+            ]
+            for keyword in self.ordered
+        ]
+
+    def implied_keywords(self, match, endpos=None):
+        """Returns the keywords matching as whole words at match.start() and ending by endpos."""
+        start = match.start()
+        implied = self.implied[match.lastindex - 1]
+        if endpos is None:
+            return [keyword for keyword, _ in implied]
+        return [keyword for keyword, length in implied if start + length <= endpos]
+
+SPELL_KEYWORD_MATCHER = KeywordMatcher()
+
 def validate_spell_block(block_content: str, min_length: int = 100, min_keywords: int = 2) -> bool:
     """
     Validates if a given block of text is likely a full spell description.
     Checks for minimum length and presence of a certain number of spell-related keywords.
     """
-    # Keywords expected in a valid spell block (case-insensitive for robustness)
-    SPELL_KEYWORDS = [
-        "Level", "Components", "Casting Time", "Range", "Effect", "Duration", "Target", "Targets", "Enchantment",
-        "Saving Throw", "Spell Resistance", "Divination", "Evocation", "Conjuration", "Necromancy", "Abjuration", "Transmutation"
-    ]
-
     if len(block_content) < min_length:
         return False
 
-    found_keywords_count = 0
-    for keyword in SPELL_KEYWORDS:
-        if re.search(r'\b' + re.escape(keyword) + r'\b', block_content, re.IGNORECASE):
-            found_keywords_count += 1
-            if found_keywords_count >= min_keywords:
-                return True
-    
+    found_keywords = set()
+    for match in iter_overlapping_matches(SPELL_KEYWORD_MATCHER.keyword_re, block_content):
+        found_keywords.update(SPELL_KEYWORD_MATCHER.implied_keywords(match))
+        if len(found_keywords) >= min_keywords:
+            return True
+
     return False
 
-def find_block_end(end_token: str, buffer: str) -> int:
-    search_start_pos = 0
-    buffer_end = len(buffer) - len(end_token)
-    possible_block_end = 0
-    while (search_start_pos < buffer_end):
-        possible_end_pos = buffer[search_start_pos:].find(end_token)
-        # found a possible end, check if it's a valid spell block
-        if possible_end_pos != -1:
-            possible_block_end = search_start_pos + possible_end_pos
-            if validate_spell_block(buffer[:possible_block_end]):
-                # valid spell block, return the end position
-                return possible_block_end
-            else:
-                # invalid spell block, continue searching
-                search_start_pos = possible_block_end + 1
-        else:
-            # no more possible ends, return -1
-            return -1
-    # no room in buffer for another end token, return -1
-    return -1
+class SpellBlockSegmenter:
+    """Splits text into spell blocks at end tokens.
 
-def format_spell_block(block: str) -> str:
-    """
-    Formats a spell block into a markdown string, cleaning up common OCR errors.
+    An end token closes a block once the text since the block start passes
+    validate_spell_block. Keyword matches are collected in one forward scan and counted
+    as the candidate end moves through the buffer, so every candidate is decided without
+    copying or rescanning the text before it, and a whole dump segments in linear time.
     """
-    name = ""
-    spell_school = ""
-    base_level = ""
-    # Normalize whitespace: replace multiple spaces with a single space
-    block = re.sub(r'\s+', ' ', block)
-
-    # Split the block into lines initially
-    lines = block.split('\n')
-    cleaned_lines = []
-    for line in lines:
-        line = line.strip()
-        if line:
-            cleaned_lines.append(line)
-    
-    clean_block = " ".join(cleaned_lines)
-    spell_schools = ['Abjuration', 'Conjuration', 'Divination', 'Enchantment', 'Evocation', 'Illusion', 'Necromancy', 'Transmutation', 'Universal']
-    class_abbreviations = ['Bbn', 'Brd', 'Clr', 'Drd', 'Ftr', 'Mnk', 'Pal', 'Rgr', 'Rog', 'Sor/Wiz', 'Wiz']
-    spell_domains = ['Air', 'Animal', 'Chaos', 'Death', 'Destruction', 'Earth', 'Evil', 'Fire', 'Good', 'Healing', 'Knowledge', 'Law', 'Luck', 'Magic', 'Plant', 'Protection', 'Strength', 'Sun', 'Travel', 'Trickery', 'War', 'Water']
-    level_types = [*class_abbreviations, *spell_domains]
-    level_types.sort()
-    optional_labels = ['Components', 'Casting Time', 'Range', 'Area','Effect', 'Target', 'Targets', 'Duration', 'Saving Throw', 'Spell Resistance']
-    duration_pattern = re.compile(
-        r"""
-        ^                            # start of string
-        (?:                          # non-capturing group
-            (?:\d+|One)              # number or "One"
-            \s+
-            \w+(?:\.)?            # unit like min., round, day, etc.
-            (?:/level)?              # optional /level
-            (?:\s*\(*D*\)*)?          # optional (D), (F), etc.
-        |
-            \w+                      # standalone like Concentration, Instantaneous
+    def __init__(self, end_token='---', min_length=100, min_keywords=2, keyword_matcher=SPELL_KEYWORD_MATCHER):
+        self.end_token = end_token
+        self.min_length = min_length
+        self.min_keywords = max(min_keywords, 1)  # validate_spell_block needs at least one match to pass
+        self.matcher = keyword_matcher
+
+    def is_valid_block(self, buffer, start, end, found_keywords):
+        """Checks buffer[start:end] given the keywords already found strictly inside it."""
+        if end - start < self.min_length:
+            return False
+        if len(found_keywords) >= self.min_keywords:
+            return True
+        # Matches touching the block edges depend on where the block starts and ends, not on
+        # the text around it: "Target" right before the end token counts even if "s" follows
+        edge_keywords = set(found_keywords)
+        head = self.matcher.head_re.match(buffer, start, end)
+        if head:
+            edge_keywords.update(self.matcher.implied_keywords(head))
+        tail_start = max(start + 1, end - self.matcher.max_length)
+        for match in iter_overlapping_matches(self.matcher.tail_re, buffer, tail_start, end):
+            edge_keywords.update(self.matcher.implied_keywords(match))
+        return len(edge_keywords) >= self.min_keywords
+
+    def find_block_end(self, buffer, start=0):
+        """Returns the index of the first end token after start that closes a valid spell block, or -1."""
+        matches = iter_overlapping_matches(self.matcher.keyword_re, buffer, start + 1)
+        next_match = next(matches, None)
+        pending = []
+        found_keywords = set()
+        search_start_pos = start
+        buffer_end = len(buffer) - len(self.end_token)
+        while search_start_pos < buffer_end:
+            possible_block_end = buffer.find(self.end_token, search_start_pos)
+            if possible_block_end == -1:
+                # no more possible ends
+                return -1
+            # count keywords ending before this possible end, until there are enough of them
+            if possible_block_end - start >= self.min_length and len(found_keywords) < self.min_keywords:
+                still_pending = []
+                for match in pending:
+                    found_keywords.update(self.matcher.implied_keywords(match, possible_block_end))
+                    if match.end() > possible_block_end:
+                        still_pending.append(match)
+                pending = still_pending
+                while len(found_keywords) < self.min_keywords and next_match is not None and next_match.start() < possible_block_end:
+                    found_keywords.update(self.matcher.implied_keywords(next_match, possible_block_end))
+                    if next_match.end() > possible_block_end:
+                        pending.append(next_match)
+                    next_match = next(matches, None)
+
+            if self.is_valid_block(buffer, start, possible_block_end, found_keywords):
+                return possible_block_end
+            search_start_pos = possible_block_end + 1
+        # no room in buffer for another end token
+        return -1
+
+    def segment(self, text):
+        """Yields the spell blocks of text in order, then any non-blank text after the last one."""
+        start = 0
+        while True:
+            block_end = self.find_block_end(text, start)
+            if block_end == -1:
+                break
+            yield text[start:block_end]
+            start = block_end + len(self.end_token)
+        if text[start:].strip():
+            yield text[start:]
+
+def find_block_end(end_token: str, buffer: str) -> int:
+    return SpellBlockSegmenter(end_token).find_block_end(buffer)
+
+SPELL_SCHOOLS = ['Abjuration', 'Conjuration', 'Divination', 'Enchantment', 'Evocation', 'Illusion', 'Necromancy', 'Transmutation', 'Universal']
+CLASS_ABBREVIATIONS = ['Bbn', 'Brd', 'Clr', 'Drd', 'Ftr', 'Mnk', 'Pal', 'Rgr', 'Rog', 'Sor/Wiz', 'Wiz']
+SPELL_DOMAINS = ['Air', 'Animal', 'Chaos', 'Death', 'Destruction', 'Earth', 'Evil', 'Fire', 'Good', 'Healing', 'Knowledge', 'Law', 'Luck', 'Magic', 'Plant', 'Protection', 'Strength', 'Sun', 'Travel', 'Trickery', 'War', 'Water']
+LEVEL_TYPES = sorted([*CLASS_ABBREVIATIONS, *SPELL_DOMAINS])
+OPTIONAL_LABELS = ['Components', 'Casting Time', 'Range', 'Area', 'Effect', 'Target', 'Targets', 'Duration', 'Saving Throw', 'Spell Resistance']
+# Record field for each optional label, in the order the labels are rendered
+LABEL_FIELDS = {label: label.lower().replace(' ', '_') for label in OPTIONAL_LABELS}
+# Fields of a parsed spell record. Unparsed records only have name, parsed (False) and text.
+#   levels:     [{"type": "Sor/Wiz", "level": 3, "level_text": "3"}, ...], level_text being the digits as written ("03")
+#   components: ["V", "S", "M"], the raw text as one item if it could not be split, or None if absent
+#   the other optional fields are strings, or None if absent or empty
+SPELL_RECORD_FIELDS = ["name", "parsed", "school", "levels", *LABEL_FIELDS.values(), "description"]
+
+DURATION_RE = re.compile(
+    r"""
+    ^                            # start of string
+    (?:                          # non-capturing group
+        (?:\d+|One)              # number or "One"
+        \s+
+        \w+(?:\.)?            # unit like min., round, day, etc.
+        (?:/level)?              # optional /level
+        (?:\s*\(*D*\)*)?          # optional (D), (F), etc.
+    |
+        \w+                      # standalone like Concentration, Instantaneous
+    )
+    (?:                          # optional additional duration
+        \s+or\s+
+        (?:\d+|One)\s+\w+(?:\.\w+)?(?:/level)?(?:\s*\(.*?\))?
+    )?
+    """,
+    re.VERBOSE | re.IGNORECASE)
+
+COMPONENT_RE = re.compile(
+    r"""
+    [\s,\.]*                         # allow spaces, commas, or periods before the component
+    (
+        F\s*[/\.]?\s*DF             # F/DF, F.DF, F DF, F DF, F DF, F DF
+        |DF
+        |XP
+        |[VSMF]                     # V, S, M, F
+    )
+    """,
+    re.IGNORECASE | re.VERBOSE
+)
+
+#valid_values = ['No or Yes (harmless)', 'Yes (harmless)', 'Yes (object)', 'Yes (harmless, object)', 'Yes (harmless) or Yes (harmless, object)', 'Yes; See text', 'No; See text', 'No (object) and Yes; see text', 'Yes', 'No', 'See text']
+SPELL_RESISTANCE_RE = re.compile(
+    r"""
+    ^
+    (
+        (?:
+            (?:Yes|No)                               # Yes or No
+            (?:\s*\(\s*(?:harmless|object|harmless\s*,\s*object)\s*\))?  # optional parens
         )
-        (?:                          # optional additional duration
-            \s+or\s+
-            (?:\d+|One)\s+\w+(?:\.\w+)?(?:/level)?(?:\s*\(.*?\))?
-        )?
-        """,
-        re.VERBOSE | re.IGNORECASE)
-    component_pattern = re.compile(
-        r"""
-        [\s,\.]*                         # allow spaces, commas, or periods before the component
-        (
-            F\s*[/\.]?\s*DF             # F/DF, F.DF, F DF, F DF, F DF, F DF
-            |DF
-            |XP
-            |[VSMF]                     # V, S, M, F
+        (?:                                          # optionally followed by or/and clause
+            \s*(?:or|and)\s*
+            (?:Yes|No)
+            (?:\s*\(\s*(?:harmless|object|harmless\s*,\s*object)\s*\))?
+        )*
+        |
+        See\s+text
+    )
+    (?:\s*;\s*See\s+text)?                           # optional '; See text'
+    (?=\b|[\s.;])                                    # must be followed by a boundary
+    """,
+    re.VERBOSE | re.IGNORECASE
+)
+
+SAVING_THROW_RE = re.compile(
+    r"""
+    ^(
+        (?:
+            None |
+            (?:Fortitude|Reflex|Will)
+            \s+(?:negates|half|partial|reduces|none)
+            (?:\s*\(.*?\))?
+            (?:\s*(?:or|and)\s*
+                (?:Fortitude|Reflex|Will)
+                \s+(?:negates|half|partial|reduces|none)
+                (?:\s*\(.*?\))?
+            )*
+            (?:\s*;\s*see\s+text(?:\s+for\s+\w+(?:\s+\w+)*)?)?
         )
-        """,
-        re.IGNORECASE | re.VERBOSE
     )
-    # the first words prior to a spell school is the spell name
-    for school in spell_schools:
-        school_index = clean_block.find(school)
+    (?=\s+(?:This|You|Creatures|Mass|One|The|An|A)\b)
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+
+def print_warning(kind, field, message):
+    """Default parse warning handler: prints the message."""
+    print(message)
+
+class StageTimer:
+    """Accumulates the seconds spent in each parse stage, measured between consecutive laps."""
+    def __init__(self):
+        self.stages = {}
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last
+        self.last = now
+
+class NullTimer:
+    """Stand-in for StageTimer when timing is off."""
+    stages = None
+
+    def lap(self, stage):
+        pass
+
+NULL_TIMER = NullTimer()
+
+class SpellBlockParser:
+    """Formats OCR'd spell blocks as markdown.
+
+    Every pattern is compiled once when the parser is built. A block is normalized once and
+    then walked with position offsets into that single string instead of re-slicing it. The
+    level entries are located with one alternation scan over all level types (no level type
+    may be a prefix of another); school names and optional labels are plain substrings, for
+    which str.find from an offset is faster than any regex scan.
+    """
+    def __init__(self, schools=SPELL_SCHOOLS, level_types=LEVEL_TYPES, optional_labels=OPTIONAL_LABELS):
+        self.schools = list(schools)
+        self.level_types = list(level_types)
+        alternation = "|".join(re.escape(level_type) for level_type in sorted(self.level_types, key=len, reverse=True))
+        self.level_re = re.compile(f"({alternation})" + r"\s*(\d+)")
+        self.optional_labels = list(optional_labels)
+
+    def find_school(self, clean_block):
+        """Returns the index of the first school found, trying schools in list order, or -1."""
+        for school in self.schools:
+            school_index = clean_block.find(school)
+            if school_index != -1:
+                return school_index
+        return -1
+
+    def find_levels(self, clean_block, pos):
+        """Parses the level entries starting at pos. Level types are taken in order, each
+        from its first entry after the previous match. Returns ([{type, level, level_text}], end position).
+        """
+        entries = {}
+        for match in iter_overlapping_matches(self.level_re, clean_block, pos):
+            entries.setdefault(match.group(1), []).append(match)
+
+        levels = []
+        for level_type in self.level_types:
+            # bail out if the block starts with a component entry
+            if clean_block.startswith(' Components', pos):
+                break
+            for match in entries.get(level_type, ()):
+                if match.start() >= pos:
+                    levels.append({"type": level_type, "level": int(match.group(2)), "level_text": match.group(2)})
+                    pos = match.end()
+                    break
+        return levels, pos
+
+    def find_optional_entries(self, clean_block, pos):
+        """Splits clean_block[pos:] into {label: value}, each value running up to the next label."""
+        optional_entries_found = []
+        for label in self.optional_labels:
+            index = clean_block.find(label, pos)
+            if index != -1:
+                optional_entries_found.append((label, index))
+
+        # Drop labels found after the one that follows them in label order (stray mentions)
+        if optional_entries_found:
+            filtered_oe = [
+                entry for entry, next_entry in zip(optional_entries_found, optional_entries_found[1:])
+                if entry[1] <= next_entry[1]
+            ]
+            filtered_oe.append(optional_entries_found[-1])
+            optional_entries_found = filtered_oe
+
+        optional_entries = {}
+        for i, (label, index) in enumerate(optional_entries_found):
+            if i + 1 < len(optional_entries_found):
+                end = optional_entries_found[i + 1][1]
+                optional_entries[label] = clean_block[index + len(label):end].strip()
+            else:
+                optional_entries[label] = clean_block[index + len(label):].strip()
+        return optional_entries
+
+    def parse(self, block: str, warn=print_warning, timer=NULL_TIMER):
+        """
+        Parses a spell block into a spell record (see SPELL_RECORD_FIELDS), cleaning up common
+        OCR errors. Problems found along the way are passed to warn(kind, field, message) and
+        the time spent in each stage to timer. Blocks whose levels cannot be parsed give an
+        unparsed record holding the remaining text; empty blocks give None.
+        """
+        # Normalize whitespace: collapse every run of whitespace to a single space
+        clean_block = " ".join(block.split())
+        timer.lap("normalize")
+        if not clean_block:
+            return None
+
+        # the first words prior to a spell school is the spell name
+        school_index = self.find_school(clean_block)
         if school_index != -1:
             name = clean_block[:school_index].strip()
-            clean_block = clean_block[school_index:].strip()
-            break
-    else:
-        name = clean_block.split()[0] # no spell school found, use the first word as the spell name
-    # after the spell school there should be the Level entry
-    level_index = clean_block.find("Level")
-    levels = []
-    if level_index != -1:
-        spell_school = clean_block[:level_index].strip()
+            pos = school_index
+        else:
+            name = clean_block.split(' ', 1)[0] # no spell school found, use the first word as the spell name
+            pos = 0
+        timer.lap("school_split")
+
+        # after the spell school there should be the Level entry
+        level_index = clean_block.find("Level", pos)
+        if level_index == -1:
+            warn("missing_level", "levels", f"Unable to find 'Level' for {name}, cannot format spell block")
+            return {"name": name, "parsed": False, "text": clean_block[pos:]}
+        spell_school = clean_block[pos:level_index].strip()
+
         # the spell level block consists of one or more class abbreviations and level numbers, each pair separated by a comma
-        # this sequence is the spell level block
-        clean_block = clean_block[level_index + 5:]
-        # go through each level type and if found, add to level array with the level number
-        for level_type in level_types:
-            # bail out if the block starts with a component entry
-            if clean_block.startswith(' Components'):
-                break
-            match = re.search(f"{level_type}\s*(\d+)", clean_block)
+        levels, pos = self.find_levels(clean_block, level_index + 5)
+        timer.lap("level_scan")
+        if not levels:
+            warn("unparsed_levels", "levels", f"Unable to parse spell levels for {name}, cannot format spell block")
+            return {"name": name, "parsed": False, "text": clean_block[pos:]}
+
+        optional_entries = self.find_optional_entries(clean_block, pos)
+        timer.lap("label_scan")
+
+        desc = ""
+        # if spell resistance is found, validate the value and the remainder will be the spell description
+        if "Spell Resistance" in optional_entries:
+            sr_value = optional_entries["Spell Resistance"].rstrip()
+            match = SPELL_RESISTANCE_RE.match(sr_value)
             if match:
-                # find the level number
-                level_number = match.group(1)
-                levels.append(f"{level_type} {level_number}")
-                clean_block = clean_block[match.end():]
-        if len(levels) > 0:
-            base_level = ", ".join(levels)
-        else:
-            print(f"Unable to parse spell levels for {name}, cannot format spell block")
-            return clean_block
-    else:
-        print(f"Unable to find 'Level' for {name}, cannot format spell block")
-        return clean_block.strip()
-    
-    optional_entries_found = []
-    optional_entries = {}
-    # go through each optional entry and if found, add to the formatted block
-    for entry in optional_labels:
-        entry_index = clean_block.find(entry)
-        if entry_index != -1:
-            optional_entries_found.append((entry, entry_index))
-
-    if (len(optional_entries_found) > 0):
-        filtered_oe = []
-        for i in range(len(optional_entries_found)-1):
-            field, index = optional_entries_found[i]
-            next_field, next_index = optional_entries_found[i+1]
-            if index <= next_index:
-                filtered_oe.append((field, index))
-
-        filtered_oe.append(optional_entries_found[-1])
-        optional_entries_found = filtered_oe
-
-    # optional entries end at the start of the next optional entry or the end of the block
-    while (optional_entries_found):
-        label, index = optional_entries_found.pop(0)
-        if len(optional_entries_found) > 0:
-            n_label, n_index = optional_entries_found[0]
-            optional_entries[label] = clean_block[index + len(label):n_index].strip()
-        else:
-            optional_entries[label] = clean_block[index + len(label):].strip()
-
-    desc = ""
-    # if spell resistance is found, validate the value and the remainder will be the spell description
-    if "Spell Resistance" in optional_entries:
-        #valid_values = ['No or Yes (harmless)', 'Yes (harmless)', 'Yes (object)', 'Yes (harmless, object)', 'Yes (harmless) or Yes (harmless, object)', 'Yes; See text', 'No; See text', 'No (object) and Yes; see text', 'Yes', 'No', 'See text']
-        SPELL_RESISTANCE_RE = re.compile(
-            r"""
-            ^
-            (
-                (?:
-                    (?:Yes|No)                               # Yes or No
-                    (?:\s*\(\s*(?:harmless|object|harmless\s*,\s*object)\s*\))?  # optional parens
-                )
-                (?:                                          # optionally followed by or/and clause
-                    \s*(?:or|and)\s*
-                    (?:Yes|No)
-                    (?:\s*\(\s*(?:harmless|object|harmless\s*,\s*object)\s*\))?
-                )*
-                |
-                See\s+text
-            )
-            (?:\s*;\s*See\s+text)?                           # optional '; See text'
-            (?=\b|[\s.;])                                    # must be followed by a boundary
-            """,
-            re.VERBOSE | re.IGNORECASE
-        )
-        sr_value = optional_entries["Spell Resistance"].rstrip()
-        match = SPELL_RESISTANCE_RE.match(sr_value)
-        if match:
-            desc = sr_value[match.end():].strip()
-            optional_entries["Spell Resistance"] = match.group(1)
-        else:
-            print(f"Invalid spell resistance value for {name}: {optional_entries['Spell Resistance']}")
-    
-    if "Duration" in optional_entries:
-        duration_match = duration_pattern.match(optional_entries["Duration"])
-        if duration_match:
-            if desc == "":
-                desc = optional_entries["Duration"][duration_match.end():].strip()
-            optional_entries["Duration"] = duration_match.group(0)
-        else:
-            print(f"Invalid duration value for {name}: {optional_entries['Duration']}")
-
-    if "Components" in optional_entries:
-        pos = 0
-        found_components = []
-        while (pos < len(optional_entries["Components"])):
-            match = component_pattern.match(optional_entries["Components"], pos)
-            if not match:
+                desc = sr_value[match.end():].strip()
+                optional_entries["Spell Resistance"] = match.group(1)
+            else:
+                warn("invalid_value", "spell_resistance", f"Invalid spell resistance value for {name}: {optional_entries['Spell Resistance']}")
+        timer.lap("spell_resistance")
+
+        if "Duration" in optional_entries:
+            duration_match = DURATION_RE.match(optional_entries["Duration"])
+            if duration_match:
+                if desc == "":
+                    desc = optional_entries["Duration"][duration_match.end():].strip()
+                optional_entries["Duration"] = duration_match.group(0)
+            else:
+                warn("invalid_value", "duration", f"Invalid duration value for {name}: {optional_entries['Duration']}")
+        timer.lap("duration")
+
+        components = None
+        if "Components" in optional_entries:
+            components = optional_entries["Components"]
+            component_pos = 0
+            found_components = []
+            while component_pos < len(components):
+                match = COMPONENT_RE.match(components, component_pos)
+                if not match:
+                    break
+                token = match.group(1).upper().replace(' ', '').replace('.', '')
+                if token == 'FDF':
+                    token = 'F/DF'
+                found_components.append(token)
+                component_pos = match.end()
+            if found_components:
+                if desc == "":
+                    desc = components[component_pos:].strip()
+                components = found_components
+            else:
+                warn("unparsed_components", "components", f"No components found for {name}")
+                components = [components] if components else []
+        timer.lap("components")
+
+        if "Targets" in optional_entries and desc == "":
+            targets, desc = split_targets_and_description(optional_entries["Targets"])
+            optional_entries["Targets"] = targets
+
+        if "Target" in optional_entries and desc == "":
+            targets, desc = split_targets_and_description(optional_entries["Target"])
+            optional_entries["Target"] = targets
+        timer.lap("targets")
+
+        if "Saving Throw" in optional_entries and desc == "":
+            saving_throw = optional_entries["Saving Throw"]
+            match = SAVING_THROW_RE.match(saving_throw)
+            if match:
+                desc = saving_throw[match.end():].strip()
+                optional_entries["Saving Throw"] = match.group(1)
+            else:
+                warn("invalid_value", "saving_throw", f"Invalid saving throw value for {name}: {optional_entries['Saving Throw']}")
+        timer.lap("saving_throw")
+
+        if desc == "":
+            warn("missing_description", "description", f"No description found for {name}, using entire block as description")
+            desc = clean_block[pos:]
+
+        record = {"name": name, "parsed": True, "school": spell_school, "levels": levels, "components": components}
+        for label, field in LABEL_FIELDS.items():
+            if label != "Components":
+                record[field] = optional_entries.get(label) or None
+        record["description"] = desc.rstrip()
+        timer.lap("record")
+        return record
+
+    def format(self, block: str, warn=print_warning) -> str:
+        """
+        Formats a spell block into a markdown string, cleaning up common OCR errors.
+        """
+        record = self.parse(block, warn)
+        return render_spell_markdown(record) if record is not None else ""
+
+def render_spell_markdown(record):
+    """Renders a spell record as the cleaned markdown block (without the --- separator)."""
+    if not record["parsed"]:
+        return record["text"]
+    # the digits as written, so "Brd 03" renders as it did before levels were parsed to ints
+    levels = ", ".join(f"{level['type']} {level['level_text']}" for level in record["levels"])
+    formatted_lines = [f"## {record['name']}", record["school"], f"**Level:** {levels}"]
+    for label, field in LABEL_FIELDS.items():
+        value = record[field]
+        if field == "components" and value is not None:
+            value = ", ".join(value)
+        if value:
+            formatted_lines.append(f"**{label}:** {value}")
+    formatted_lines.append(record["description"])
+    return "\n".join(formatted_lines)
+
+SPELL_BLOCK_PARSER = SpellBlockParser()
+
+def parse_spell_block(block: str, warn=print_warning, timer=NULL_TIMER):
+    """
+    Parses a spell block into a spell record, cleaning up common OCR errors.
+    """
+    return SPELL_BLOCK_PARSER.parse(block, warn, timer)
+
+def format_spell_block(block: str, warn=print_warning) -> str:
+    """
+    Formats a spell block into a markdown string, cleaning up common OCR errors.
+    """
+    return SPELL_BLOCK_PARSER.format(block, warn)
+
+def parse_spell_batch(blocks, timed=False):
+    """Parses a batch of spell blocks, collecting each block's warnings instead of printing them.
+    Safe to run in a worker process. Returns [(record, warnings, stage_seconds)] in input order,
+    where warnings are (kind, field, message) and stage_seconds is None unless timed.
+    """
+    results = []
+    for block in blocks:
+        warnings = []
+        timer = StageTimer() if timed else NULL_TIMER
+        record = parse_spell_block(block, lambda kind, field, message: warnings.append((kind, field, message)), timer)
+        results.append((record, warnings, timer.stages))
+    return results
+
+SPELL_DELIMITER = '---'
+
+def iter_delimited_blocks(source, delimiter=SPELL_DELIMITER, chunk_size=1 << 20):
+    """Yields the text between delimiters in a text file object as it is read.
+    Gives the same pieces as source.read().split(delimiter) while holding at most one
+    block and one chunk in memory.
+    """
+    buffer = ""
+    search_from = 0
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        block_start = 0
+        block_end = buffer.find(delimiter, search_from)
+        while block_end != -1:
+            yield buffer[block_start:block_end]
+            block_start = block_end + len(delimiter)
+            block_end = buffer.find(delimiter, block_start)
+        buffer = buffer[block_start:]
+        # a delimiter may still be completed by the next chunk
+        search_from = max(0, len(buffer) - len(delimiter) + 1)
+    yield buffer
+
+# Blocks per task sent to a worker process; large enough to amortize pickling
+SPELL_BATCH_SIZE = 64
+
+def iter_batches(items, batch_size):
+    """Groups an iterable into lists of up to batch_size items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def iter_parsed_spells(blocks, workers=1, batch_size=SPELL_BATCH_SIZE, timed=False):
+    """Yields (record, warnings, stage_seconds) for each spell block in input order.
+    With workers > 1, batches are parsed in a process pool with a bounded number in
+    flight, so blocks are still read lazily and memory stays bounded.
+    """
+    batches = iter_batches(blocks, batch_size)
+    if workers <= 1:
+        for batch in batches:
+            yield from parse_spell_batch(batch, timed)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        for batch in batches:
+            in_flight.append(executor.submit(parse_spell_batch, batch, timed))
+            if len(in_flight) >= workers * 2:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+def iter_spell_records(source, delimiter=SPELL_DELIMITER, workers=1, metrics=None, name_index=None):
+    """Yields the spell record of every non-empty block of source as soon as it is parsed.
+    Each block's warnings are printed together, tagged with the block's position in source.
+    With metrics (a ParseMetrics), blocks are timed and every block is added to it. With
+    name_index (an ApproximateNameIndex), each spell name is replaced by the canonical name
+    it matches despite OCR errors; names matching none get an unknown_name warning.
+    """
+    blocks = iter_delimited_blocks(source, delimiter)
+    parsed_spells = iter_parsed_spells(blocks, workers, timed=metrics is not None)
+    for block_number, (record, warnings, stage_seconds) in enumerate(parsed_spells, start=1):
+        if name_index is not None and record is not None:
+            canonical = name_index.lookup(record["name"])
+            if canonical is None:
+                warnings.append(("unknown_name", "name", f"Unknown spell name {record['name']}"))
+            elif canonical[0] != record["name"]:
+                print(f"[block {block_number}] Canonicalized spell name {record['name']!r} to {canonical[0]!r}")
+                record["name"] = canonical[0]
+        for _, _, message in warnings:
+            print(f"[block {block_number}] {message}")
+        if metrics is not None:
+            metrics.add_block(block_number, record, warnings, stage_seconds)
+        if record is not None: # None for empty blocks, e.g. after the final separator
+            yield record
+
+# Upper bounds, in microseconds, of the stage timing histogram buckets; the last bucket is open
+TIMING_BUCKETS_US = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+class TimingHistogram:
+    """Count, total, max and a log-scale histogram of durations."""
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(TIMING_BUCKETS_US) + 1)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        microseconds = seconds * 1e6
+        for i, bound in enumerate(TIMING_BUCKETS_US):
+            if microseconds <= bound:
+                self.buckets[i] += 1
                 break
-            token = match.group(1).upper().replace(' ', '').replace('.', '')
-            if token == 'FDF':
-                token = 'F/DF'
-            found_components.append(token)
-            pos = match.end()
-        if len(found_components) > 0:
-            if desc == "":
-                desc = optional_entries["Components"][pos:].strip()
-            cleaned = ', '.join(found_components)
-            optional_entries["Components"] = cleaned
         else:
-            print(f"No components found for {name}")
-
-    if "Targets" in optional_entries and desc == "":
-        targets, desc = split_targets_and_description(optional_entries["Targets"])
-        optional_entries["Targets"] = targets
-
-    if "Target" in optional_entries and desc == "":
-        targets, desc = split_targets_and_description(optional_entries["Target"])
-        optional_entries["Target"] = targets
-
-    if "Saving Throw" in optional_entries and desc == "":
-        SAVING_THROW_RE = re.compile(
-            r"""
-            ^(
-                (?:
-                    None |
-                    (?:Fortitude|Reflex|Will)
-                    \s+(?:negates|half|partial|reduces|none)
-                    (?:\s*\(.*?\))?
-                    (?:\s*(?:or|and)\s*
-                        (?:Fortitude|Reflex|Will)
-                        \s+(?:negates|half|partial|reduces|none)
-                        (?:\s*\(.*?\))?
-                    )*
-                    (?:\s*;\s*see\s+text(?:\s+for\s+\w+(?:\s+\w+)*)?)?
-                )
-            )
-            (?=\s+(?:This|You|Creatures|Mass|One|The|An|A)\b)
-            """,
-            re.IGNORECASE | re.VERBOSE,
-        )
-        saving_throw = optional_entries["Saving Throw"]
-        match = SAVING_THROW_RE.match(saving_throw)
-        if match:
-            desc = saving_throw[match.end():].strip()
-            optional_entries["Saving Throw"] = match.group(1)
+            self.buckets[-1] += 1
+
+    def report(self):
+        labels = [f"<={bound}us" for bound in TIMING_BUCKETS_US] + [f">{TIMING_BUCKETS_US[-1]}us"]
+        return {
+            "count": self.count,
+            "total_seconds": round(self.total, 6),
+            "mean_us": round(self.total / self.count * 1e6, 2) if self.count else 0.0,
+            "max_us": round(self.max * 1e6, 2),
+            "histogram": {label: count for label, count in zip(labels, self.buckets) if count},
+        }
+
+class ParseMetrics:
+    """Parse quality and timing for a cleaner run: failure counts by kind and by field,
+    how often each record field was filled, per-stage timing histograms and the slowest
+    blocks. report() gives a JSON-serializable summary.
+    """
+    def __init__(self, slowest_count=10):
+        self.start_time = time.perf_counter()
+        self.blocks = 0
+        self.empty_blocks = 0
+        self.parsed = 0
+        self.unparsed = 0
+        self.failures_by_kind = {}
+        self.failures_by_field = {}
+        self.fields_filled = {field: 0 for field in SPELL_RECORD_FIELDS if field not in ("name", "parsed")}
+        self.stage_timings = {}
+        self.block_timing = TimingHistogram()
+        self.slowest_count = slowest_count
+        self.slowest = []  # min-heap of (seconds, block_number, name)
+
+    def add_block(self, block_number, record, warnings, stage_seconds):
+        self.blocks += 1
+        for kind, field, _ in warnings:
+            self.failures_by_kind[kind] = self.failures_by_kind.get(kind, 0) + 1
+            self.failures_by_field[field] = self.failures_by_field.get(field, 0) + 1
+        if record is None:
+            self.empty_blocks += 1
+        elif record["parsed"]:
+            self.parsed += 1
+            for field in self.fields_filled:
+                if record[field]:
+                    self.fields_filled[field] += 1
         else:
-            print(f"Invalid saving throw value for {name}: {optional_entries['Saving Throw']}")
+            self.unparsed += 1
+
+        if stage_seconds:
+            for stage, seconds in stage_seconds.items():
+                self.stage_timings.setdefault(stage, TimingHistogram()).add(seconds)
+            block_seconds = sum(stage_seconds.values())
+            self.block_timing.add(block_seconds)
+            entry = (block_seconds, block_number, record["name"] if record else "")
+            if len(self.slowest) < self.slowest_count:
+                heapq.heappush(self.slowest, entry)
+            elif entry > self.slowest[0]:
+                heapq.heapreplace(self.slowest, entry)
+
+    def report(self):
+        elapsed = time.perf_counter() - self.start_time
+        return {
+            "blocks": self.blocks,
+            "empty_blocks": self.empty_blocks,
+            "parsed": self.parsed,
+            "unparsed": self.unparsed,
+            "elapsed_seconds": round(elapsed, 3),
+            "blocks_per_second": round(self.blocks / elapsed, 1) if elapsed else 0.0,
+            "failures_by_kind": dict(sorted(self.failures_by_kind.items())),
+            "failures_by_field": dict(sorted(self.failures_by_field.items())),
+            "fields_filled": self.fields_filled,
+            "block_timing": self.block_timing.report(),
+            "stage_timings": {stage: histogram.report() for stage, histogram in self.stage_timings.items()},
+            "slowest_blocks": [
+                {"block": block_number, "name": name, "us": round(seconds * 1e6, 2)}
+                for seconds, block_number, name in sorted(self.slowest, reverse=True)
+            ],
+        }
+
+    def save(self, path):
+        with open_output(path) as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+
+class JsonlSpellWriter:
+    """Writes one JSON spell record per line."""
+    def __init__(self, output):
+        self.output = output
+
+    def write(self, record):
+        self.output.write(json.dumps(record, ensure_ascii=False))
+        self.output.write("\n")
+
+    def close(self):
+        pass
+
+class MarkdownSpellWriter:
+    """Writes spell records as cleaned markdown blocks separated by the delimiter."""
+    def __init__(self, output, delimiter=SPELL_DELIMITER):
+        self.output = output
+        self.delimiter = delimiter
 
-    if desc == "":
-        print(f"No description found for {name}, using entire block as description")
-        desc = clean_block
+    def write(self, record):
+        self.output.write(render_spell_markdown(record))
+        self.output.write(f"\n{self.delimiter}\n") # Separator for clarity between spells
 
-    formatted_block = f"## {name}\n"
-    formatted_block += f"{spell_school}\n"
-    formatted_block += f"**Level:** {base_level}\n"
-    for entry in optional_entries:
-        if optional_entries[entry] != "":
-            formatted_block += f"**{entry}:** {optional_entries[entry]}\n"
-    formatted_block += f"{desc.rstrip()}"
+    def close(self):
+        pass
+
+class ColumnarSpellWriter:
+    """Collects spell records into one list per field and writes them as a single compact
+    JSON object, {"row_count": n, "columns": {field: [values]}}, for bulk loading.
+    """
+    COLUMNS = [*SPELL_RECORD_FIELDS, "text"]
+
+    def __init__(self, output):
+        self.output = output
+        self.columns = {column: [] for column in self.COLUMNS}
+        self.row_count = 0
+
+    def write(self, record):
+        for column, values in self.columns.items():
+            values.append(record.get(column))
+        self.row_count += 1
+
+    def close(self):
+        json.dump({"row_count": self.row_count, "columns": self.columns}, self.output, ensure_ascii=False, separators=(',', ':'))
+
+def write_spell_records(records, writers):
+    """Writes every record to every writer, then closes the writers. Returns the number of records."""
+    written = 0
+    for record in records:
+        for writer in writers:
+            writer.write(record)
+        written += 1
+    for writer in writers:
+        writer.close()
+    return written
+
+def format_spell_stream(source, output, delimiter=SPELL_DELIMITER, workers=1):
+    """Formats every spell block of source as soon as it is read and writes it to output as markdown.
+    Returns the number of spells written.
+    """
+    records = iter_spell_records(source, delimiter, workers)
+    return write_spell_records(records, [MarkdownSpellWriter(output, delimiter)])
 
-    return formatted_block
+def open_output(path):
+    """Opens an output file for writing, creating its directory."""
+    output_dir = os.path.dirname(path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    return open(path, 'w', encoding='utf-8')
 
-# read source text file
-source_text_file = "/home/countzero/git/dnd_tools/cache/raw_text/phb35/spells.txt"
-with open(source_text_file, 'r') as f:
-    source_text = f.read()
+def main():
+    parser = argparse.ArgumentParser(description='Parse --- delimited OCR spell blocks into spell records.')
+    parser.add_argument('-i', '--input', help='Path to the source spells text file', required=True)
+    parser.add_argument('-o', '--output', help='Path to write the spell records to, one JSON object per line', required=True)
+    parser.add_argument('--markdown', help='Also write the cleaned markdown rendered from the records to this path')
+    parser.add_argument('--columnar', help='Also write the records as one compact columnar JSON file to this path')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of processes parsing spell blocks in parallel')
+    parser.add_argument('--metrics', help='Write a JSON report of parse failures and stage timings to this path')
+    parser.add_argument('--slowest', type=int, default=10, help='Number of slowest blocks listed in the metrics report')
+    parser.add_argument('--names', help='spells.tsv or CSV of canonical spell names; OCR-damaged spell names are matched against them and renamed')
+    args = parser.parse_args()
 
-# write detected spell blocks to a new file
-output_file_path = "/home/countzero/git/dnd_tools/cache/processed_spells/phb35_spells_cleaned.md"
+    metrics = ParseMetrics(args.slowest) if args.metrics else None
+    name_index = ApproximateNameIndex(read_canonical_names(args.names)) if args.names else None
 
-os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
+    with contextlib.ExitStack() as stack:
+        source = stack.enter_context(open(args.input, 'r', encoding='utf-8'))
+        writers = [JsonlSpellWriter(stack.enter_context(open_output(args.output)))]
+        if args.markdown:
+            writers.append(MarkdownSpellWriter(stack.enter_context(open_output(args.markdown))))
+        if args.columnar:
+            writers.append(ColumnarSpellWriter(stack.enter_context(open_output(args.columnar))))
+        written = write_spell_records(iter_spell_records(source, workers=args.workers, metrics=metrics, name_index=name_index), writers)
 
-spells = source_text.split('---')
-with open(output_file_path, 'w', encoding='utf-8') as f:
-    for spell in spells:
-        f.write(format_spell_block(spell))
-        f.write("\n---\n") # Separator for clarity between spells
+    print(f"✅ Extracted {written} spells. Records saved to {args.output}")
+    if metrics is not None:
+        metrics.save(args.metrics)
+        report = metrics.report()
+        print(f"Parsed {report['parsed']}, unparsed {report['unparsed']}, failures by kind: {report['failures_by_kind']}. Metrics saved to {args.metrics}")
 
-print(f"✅ Extracted {len(spells)} spells. Output saved to {output_file_path}")
+if __name__ == '__main__':
+    main()
@@ -6,9 +6,18 @@ from pdf2image import convert_from_path, pdfinfo_from_path
 import numpy as np
 from PIL import Image
 import base64
+import io
 import tempfile
 import re
 import argparse
+import math
+from run_state import RunState, fingerprint_file
+import time
+import hashlib
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from functools import partial
 
 # --- Configuration Loading ---
 def load_config(config_path=None):
@@ -28,14 +37,224 @@ def load_config(config_path=None):
 # These will be initialized after config is loaded in main()
 config = {}
 
+# Layout-parsing flags sent with every OCR request. They are part of the OCR cache key,
+# so changing any of them invalidates previously cached results.
+OCR_REQUEST_OPTIONS = {
+    "fileType": 1,
+    "useFormulaRecognition": False,
+    "useTableRecognition": True,
+    "useSealRecognition": False,
+    "useChartRecognition": True,
+    "useDocPreprocessing": True
+}
+
+# --- Response Cache ---
+class ResultCache:
+    """Content-addressed on-disk cache for responses from remote services.
+
+    Entries live at <cache_dir>/<key[:2]>/<key>.json. The manifest maps each source
+    (e.g. a PDF page) to the key it last resolved to, which lets us tell stale entries
+    (the source now hashes to a different key) from orphaned ones (no source points at
+    them any more), and keeps hit/miss/stale counts for recent runs.
+
+    If a fingerprint is given and differs from the one recorded in the manifest, every
+    entry is dropped. Use it for inputs that invalidate the whole cache, like a prompt.
+    """
+    MAX_RUN_HISTORY = 50
+
+    def __init__(self, cache_dir, fingerprint=None):
+        self.cache_dir = cache_dir
+        self.manifest_path = os.path.join(cache_dir, "manifest.json")
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0}
+        self.stale_sources = []
+        self.manifest = {'sources': {}, 'runs': []}
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    self.manifest.update(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not read cache manifest {self.manifest_path} (Error: {e}). Starting a new one.")
+
+        if fingerprint is not None and self.manifest.get('fingerprint') != fingerprint:
+            if self.manifest.get('fingerprint') is not None:
+                self.manifest['sources'] = {}
+                removed = self.prune()
+                print(f"Cache inputs changed since the last run, invalidated {removed} entries in {cache_dir}")
+            self.manifest['fingerprint'] = fingerprint
+
+    @staticmethod
+    def make_key(*parts):
+        """Hashes the given parts into a cache key. Non-bytes parts are hashed as canonical JSON."""
+        digest = hashlib.sha256()
+        for part in parts:
+            if not isinstance(part, (bytes, bytearray, memoryview)):
+                part = json.dumps(part, sort_keys=True).encode("utf-8")
+            # Length-prefix each part so adjacent parts can't run into each other
+            digest.update(len(part).to_bytes(8, "little"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key, source=None):
+        """Returns the cached value for key, or None on a miss."""
+        path = self.entry_path(key)
+        value = None
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    value = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Warning: Ignoring unreadable cache entry {path} (Error: {e}).")
+
+        with self.lock:
+            previous_key = self.manifest['sources'].get(source) if source else None
+            if value is not None:
+                self.stats['hits'] += 1
+                if source:
+                    self.manifest['sources'][source] = key
+            else:
+                self.stats['misses'] += 1
+                if previous_key and previous_key != key:
+                    self.stats['stale'] += 1
+                    self.stale_sources.append(source)
+        return value
+
+    def put(self, key, value, source=None):
+        """Stores value under key and records key as the current entry for source."""
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file first so a crash never leaves a truncated entry behind
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+        if source:
+            with self.lock:
+                self.manifest['sources'][source] = key
+
+    def prune(self):
+        """Removes entries that no source in the manifest points at. Returns the number removed."""
+        with self.lock:
+            live_keys = set(self.manifest['sources'].values())
+        removed = 0
+        for entry_dir in os.listdir(self.cache_dir):
+            entry_dir_path = os.path.join(self.cache_dir, entry_dir)
+            if not os.path.isdir(entry_dir_path):
+                continue
+            for f in os.listdir(entry_dir_path):
+                key = f.split('.')[0]
+                if key not in live_keys:
+                    os.remove(os.path.join(entry_dir_path, f))
+                    removed += 1
+            if not os.listdir(entry_dir_path):
+                os.rmdir(entry_dir_path)
+        return removed
+
+    def save(self):
+        """Records this run's statistics and writes the manifest."""
+        with self.lock:
+            if any(self.stats.values()):
+                self.manifest['runs'].append({
+                    'finished': time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    **self.stats,
+                    'stale_sources': self.stale_sources
+                })
+                self.manifest['runs'] = self.manifest['runs'][-self.MAX_RUN_HISTORY:]
+            tmp_path = f"{self.manifest_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.manifest, f, indent=2)
+            os.replace(tmp_path, self.manifest_path)
+
+    def summary(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        hit_rate = (self.stats['hits'] / lookups * 100) if lookups else 0.0
+        return f"{self.stats['hits']} hits, {self.stats['misses']} misses ({self.stats['stale']} stale), {hit_rate:.1f}% hit rate"
+
+def get_llm_cache_dir(config):
+    """Returns the LLM cleanup cache directory, defaulting to .llm_cache inside ocr_output_dir."""
+    return config['paths'].get('llm_cache_dir') or os.path.join(config['paths']['ocr_output_dir'], ".llm_cache")
+
+def get_prompt_hash(config):
+    return ResultCache.make_key(config['prompts']['text_cleanup_prompt'])
+
+def open_llm_cache(config):
+    """Opens the LLM cleanup cache, invalidating it if the model or cleanup prompt changed."""
+    return ResultCache(get_llm_cache_dir(config), fingerprint=ResultCache.make_key(config['llm_model_name'], get_prompt_hash(config)))
+
+def get_ocr_cache_dir(config):
+    """Returns the OCR cache directory, defaulting to .ocr_cache inside ocr_output_dir."""
+    return config['paths'].get('ocr_cache_dir') or os.path.join(config['paths']['ocr_output_dir'], ".ocr_cache")
+
 # --- Helper Functions ---
-def encode_image_to_base64(image_np):
-    """Encodes a numpy array image to base64."""
-    import io
-    img_pil = Image.fromarray(image_np)
+# Pillow format names and file extensions for the supported OCR upload encodings
+OCR_IMAGE_FORMATS = {'png': ('PNG', 'png'), 'jpeg': ('JPEG', 'jpg'), 'jpg': ('JPEG', 'jpg'), 'webp': ('WEBP', 'webp')}
+
+def get_ocr_image_encoding(config):
+    """Returns (pillow_format, extension, save_options) for page images sent to the OCR endpoint,
+    from settings.ocr_image_format and its PNG compression level or JPEG/WebP quality.
+    """
+    settings = config['settings']
+    image_format, extension = OCR_IMAGE_FORMATS[settings.get('ocr_image_format', 'png').lower()]
+    if image_format == 'PNG':
+        save_options = {'compress_level': settings.get('ocr_png_compress_level', 6)}
+    else:
+        save_options = {'quality': settings.get('ocr_image_quality', 90)}
+    return image_format, extension, save_options
+
+def encode_page_image(image, image_format, save_options):
+    """Encodes a PIL image and returns a view of the encoded bytes, without an intermediate copy."""
+    if image_format != 'PNG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
     buffered = io.BytesIO()
-    img_pil.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+    image.save(buffered, format=image_format, **save_options)
+    return buffered.getbuffer()
+
+def get_resized_image_path(config, img_path):
+    """Returns where the resized, encoded copy of a page image is cached, next to the page image."""
+    image_format, extension, save_options = get_ocr_image_encoding(config)
+    variant = "_".join(f"{value}" for value in save_options.values())
+    resized_dir = os.path.join(os.path.dirname(img_path), f"resized_{config['settings']['image_resize_width']}_{extension}_{variant}")
+    return os.path.join(resized_dir, f"{os.path.splitext(os.path.basename(img_path))[0]}.{extension}")
+
+def load_page_for_ocr(config, img_path):
+    """Resizes a page image to settings.image_resize_width and encodes it for upload.
+    With settings.resized_image_cache, the encoded image is cached next to the page image.
+    Returns (image_bytes, encode_seconds, from_cache).
+    """
+    image_format, _, save_options = get_ocr_image_encoding(config)
+    cache_path = get_resized_image_path(config, img_path) if config['settings'].get('resized_image_cache') else None
+    if cache_path and os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(img_path):
+        with open(cache_path, 'rb') as f:
+            return f.read(), 0.0, True
+
+    start_time = time.perf_counter()
+    with Image.open(img_path) as page_image:
+        original_width, original_height = page_image.size
+        new_width = config['settings']['image_resize_width']
+        new_height = int(original_height * (new_width / original_width))
+        resized_image = page_image.resize((new_width, new_height), Image.LANCZOS)
+    image_bytes = encode_page_image(resized_image, image_format, save_options)
+    encode_seconds = time.perf_counter() - start_time
+
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(image_bytes)
+        os.replace(tmp_path, cache_path)
+    return image_bytes, encode_seconds, False
+
+def build_ocr_request_body(image_bytes):
+    """Builds the layout-parsing JSON request body around the base64 image.
+    The base64 text is spliced in directly rather than going through json.dumps,
+    which would copy and scan the largest part of the body again.
+    """
+    options_json = json.dumps(OCR_REQUEST_OPTIONS).encode("utf-8")
+    return b"".join((b'{"file": "', base64.b64encode(image_bytes), b'", ', options_json[1:]))
 
 def decode_and_save_base64_image(base64_string, output_path):
     """Decodes a base64 string to an image and saves it to the specified path."""
@@ -48,7 +267,39 @@ def decode_and_save_base64_image(base64_string, output_path):
         print(f"Warning: Failed to decode and save base64 image to {output_path}: {e}")
         return False
 
-def clean_with_ollama(config, text_content=None):
+def split_text_for_llm(text, max_chars, separators=("\n\n", "\n")):
+    """Splits text into chunks of at most max_chars, breaking at paragraph boundaries first,
+    then line boundaries, and only splitting inside a line as a last resort.
+    """
+    if not max_chars or len(text) <= max_chars:
+        return [text]
+    if not separators:
+        return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+
+    separator, finer_separators = separators[0], separators[1:]
+    chunks = []
+    current = ""
+    for part in text.split(separator):
+        candidate = f"{current}{separator}{part}" if current else part
+        if len(candidate) <= max_chars:
+            current = candidate
+            continue
+        if current:
+            chunks.append(current)
+        if len(part) > max_chars:
+            chunks.extend(split_text_for_llm(part, max_chars, finer_separators))
+            current = ""
+        else:
+            current = part
+    if current:
+        chunks.append(current)
+    return chunks
+
+def clean_with_ollama(config, text_content=None, session=None, output_file=None):
+    """Streams a cleanup request for text_content to Ollama.
+    Response content is written to output_file (if given) as it arrives.
+    Returns (content, stats) where stats has time to first byte, token count and generation time.
+    """
     messages = []
 
     messages.append({"role": "user", "content": config['prompts']['text_cleanup_prompt'] + f'```markdown\n{text_content}\n```'})
@@ -56,203 +307,168 @@ def clean_with_ollama(config, text_content=None):
     payload = {
         "model": config['llm_model_name'],
         "messages": messages,
-        "stream": False
+        "stream": True
     }
 
-    response = requests.post(config['ollama_url'], json=payload)
-    response.raise_for_status()
-    return response.json()["message"]["content"]
-
-def call_ocr_endpoint(image_base64):
-    """Sends base64 image to OCR endpoint and returns raw JSON response."""
-    global config # Access the global config dictionary
+    start_time = time.perf_counter()
+    stats = {'ttfb': None, 'eval_count': 0, 'eval_seconds': 0.0}
+    content_parts = []
+    done = False
+    response = post_with_retries(
+        session or requests,
+        config['ollama_url'],
+        retries=config['settings'].get('llm_retries', 2),
+        backoff=config['settings'].get('llm_retry_backoff', 2.0),
+        json=payload,
+        stream=True,
+        timeout=config['settings'].get('llm_timeout', 600)
+    )
+    with response:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            message = json.loads(line)
+            if "error" in message:
+                raise RuntimeError(f"Ollama error: {message['error']}")
+            piece = message.get("message", {}).get("content", "")
+            if piece:
+                if stats['ttfb'] is None:
+                    stats['ttfb'] = time.perf_counter() - start_time
+                content_parts.append(piece)
+                if output_file is not None:
+                    output_file.write(piece)
+                    output_file.flush()
+            if message.get("done"):
+                stats['eval_count'] = message.get("eval_count", len(content_parts))
+                # Ollama reports durations in nanoseconds
+                stats['eval_seconds'] = message.get("eval_duration", 0) / 1e9 or (time.perf_counter() - start_time - (stats['ttfb'] or 0))
+                done = True
+                break
+    # A dropped connection ends the stream early; the partial text must not pass for a cleaned page
+    if not done:
+        raise RuntimeError("Ollama stream ended before done")
+
+    return "".join(content_parts), stats
+
+def create_http_session(pool_size):
+    """Creates a keep-alive HTTP session whose connection pool can serve pool_size concurrent requests."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def post_with_retries(session, url, retries=3, backoff=2.0, **kwargs):
+    """POSTs to url, retrying connection errors, timeouts and 5xx responses with exponential backoff.
+    Client errors (4xx) are raised immediately.
+    """
+    for attempt in range(retries + 1):
+        try:
+            response = session.post(url, **kwargs)
+            response.raise_for_status()
+            return response
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+            is_client_error = isinstance(e, requests.HTTPError) and e.response is not None and e.response.status_code < 500
+            if is_client_error or attempt == retries:
+                raise
+            delay = backoff * (2 ** attempt)
+            print(f"Warning: Request to {url} failed ({e}). Retrying in {delay:.1f}s ({attempt + 1}/{retries})...")
+            time.sleep(delay)
+
+def call_ocr_endpoint(config, request_body, session=None):
+    """Sends a prebuilt request body (see build_ocr_request_body) to OCR endpoint and returns raw JSON response."""
     headers = {'Content-Type': 'application/json'}
-    payload = {
-        "file": image_base64,
-        "fileType": 1,
-        "useFormulaRecognition": False,
-        "useTableRecognition": True,
-        "useSealRecognition": False,
-        "useChartRecognition": True,
-        "useDocPreprocessing": True
-    }
-    response = requests.post(config['ocr_endpoint_url'] + "/layout-parsing", headers=headers, json=payload)
-    response.raise_for_status()
+    response = post_with_retries(
+        session or requests,
+        config['ocr_endpoint_url'] + "/layout-parsing",
+        retries=config['settings'].get('ocr_retries', 3),
+        backoff=config['settings'].get('ocr_retry_backoff', 2.0),
+        headers=headers,
+        data=request_body,
+        timeout=config['settings'].get('ocr_timeout', 300)
+    )
 
     return response.json()
 
-def process_ocr_blocks(raw_ocr_data):
-    """Processes OCR results, orders text blocks by columns, and returns spatially ordered raw text."""
-    parsing_res_list = raw_ocr_data.get('parsing_res_list', [])
+# Whitespace cleanup applied to the ordered text of each page
+MULTIPLE_SPACES_RE = re.compile(r' +')
+EMPTY_LINES_RE = re.compile(r'^\s*$\n', re.MULTILINE)
 
-    if not parsing_res_list:
-        return ""
+# Layout heuristics for process_ocr_blocks, in pixels of the resized page image
+LAYOUT_TEXT_LABELS = ('text', 'paragraph_title', 'figure_title', 'list_item', 'table', 'number')
+PAGE_NUMBER_RIGHT_THRESHOLD = 600 # numbers starting beyond this x1 are likely page numbers
+PAGE_NUMBER_LEFT_THRESHOLD = 50 # numbers ending before this x2 are likely page numbers
+COLUMN_GAP_THRESHOLD = 50 # gap between sorted block x1s that starts a new column
+COLUMN_MARGIN = 10 # slack around a column's x-range when assigning block centers
 
-    # 1. Collect all text-like blocks with their coordinates
-    text_blocks_with_coords = []
-    for block_info in parsing_res_list:
+def collect_layout_blocks(raw_ocr_data):
+    """Collects the text-like blocks of an OCR page.
+    Returns (texts, bboxes) where bboxes is an (n, 4) array of x1, y1, x2, y2.
+    """
+    texts = []
+    bboxes = []
+    for block_info in raw_ocr_data.get('parsing_res_list', []):
         block_label = block_info.get('block_label')
-        block_text = block_info.get('block_content', '')
         block_bbox = block_info.get('block_bbox', [0,0,0,0])
 
-        # Exclude 'aside_text' and number blocks that are likely page numbers (far left or far right)
+        # Exclude number blocks that are likely page numbers (far left or far right)
         if block_label == 'number':
             x1, _, x2, _ = block_bbox
-            page_width_threshold = 600 # Heuristic: numbers beyond this x1 are likely page numbers
-            page_left_threshold = 50 # Heuristic: numbers before this x2 are likely page numbers (if on left side)
-            if x1 > page_width_threshold or x2 < page_left_threshold:
-                continue # Skip this block if it's a side page number
-
-        if block_label in ['text', 'paragraph_title', 'figure_title', 'list_item', 'table', 'number']:
-            if block_bbox and len(block_bbox) == 4:
-                x1, y1, x2, y2 = block_bbox
-                text_blocks_with_coords.append({
-                    'text': block_text,
-                    'x1': x1,
-                    'y1': y1,
-                    'x2': x2,
-                    'y2': y2,
-                    'label': block_label
-                })
+            if x1 > PAGE_NUMBER_RIGHT_THRESHOLD or x2 < PAGE_NUMBER_LEFT_THRESHOLD:
+                continue
 
-    if not text_blocks_with_coords:
-        return ""
+        if block_label in LAYOUT_TEXT_LABELS and block_bbox and len(block_bbox) == 4:
+            texts.append(block_info.get('block_content', ''))
+            bboxes.append(block_bbox)
 
-    # 2. Dynamically determine column boundaries based on x-coordinates of all blocks
-    # Collect all x1 coordinates to identify natural clusters, which represent column starts.
-    x1_coords = [b['x1'] for b in text_blocks_with_coords]
-    if not x1_coords:
-        return ""
+    return texts, np.array(bboxes, dtype=np.float64).reshape(-1, 4)
 
-    # Sort x1 coordinates to make clustering easier
-    x1_coords.sort()
-
-    # Simple clustering: identify significant gaps between sorted x1 coordinates.
-    # A "significant gap" indicates a new column.
-    # The threshold for a gap will depend on the OCR output resolution and typical column spacing.
-    # A value of 50-70 pixels might be a good starting point for a visual column break.
-    # Let's use 50 as a balance between separating columns and grouping slightly indented text.
-    gap_threshold = 50 
-
-    column_x_clusters = []
-    if x1_coords:
-        current_cluster = [x1_coords[0]]
-        for i in range(1, len(x1_coords)):
-            if x1_coords[i] - current_cluster[-1] > gap_threshold:
-                # End of current cluster, start a new one
-                column_x_clusters.append(current_cluster)
-                current_cluster = [x1_coords[i]]
-            else:
-                current_cluster.append(x1_coords[i])
-        column_x_clusters.append(current_cluster) # Add the last cluster
-
-    # Now, define column boundaries based on these clusters.
-    # A column's boundary can be the min x1 of the cluster to the max x2 of blocks in that cluster.
-    # For simplicity, let's define a column by its approximate start and end x.
-    column_boundaries = []
-    for cluster in column_x_clusters:
-        min_x = min(cluster)
-        # To determine the max_x for a column, we can look at all blocks whose x1 is in this cluster.
-        # This is a bit more complex, so for now, let's use a simpler approach:
-        # assume column width. Or, better, use the min x of the *next* cluster as the boundary.
-        # If it's the last column, use a large arbitrary value.
-        column_boundaries.append((min_x, min_x + 300)) # Assume approximate column width of 300 pixels
-        # This assumption might be problematic if columns have very different widths.
-        # A more robust solution would be to look at the maximum x2 for blocks within the cluster.
-
-    # Let's refine column_boundaries to be more accurate based on the actual blocks, not just x1s.
-    # Group all blocks by their approximate x1 cluster before defining precise column boundaries.
-    clustered_blocks_by_x1 = {}
-    for block in text_blocks_with_coords:
-        assigned_to_cluster = False
-        for cluster_idx, cluster in enumerate(column_x_clusters):
-            # Check if block's x1 is within the range of this cluster (min to max of cluster x1s)
-            if min(cluster) - 20 <= block['x1'] <= max(cluster) + 20: # Add buffer for slight variations
-                if cluster_idx not in clustered_blocks_by_x1:
-                    clustered_blocks_by_x1[cluster_idx] = []
-                clustered_blocks_by_x1[cluster_idx].append(block)
-                assigned_to_cluster = True
-                break
-        if not assigned_to_cluster:
-            # Fallback for blocks that don't fit a cluster (e.g., images, or very wide blocks)
-            # Assign to the closest cluster or a default wide column.
-            # For simplicity for now, let's just add to the first column if not assigned.
-            if len(column_x_clusters) > 0:
-                if 0 not in clustered_blocks_by_x1:
-                    clustered_blocks_by_x1[0] = []
-                clustered_blocks_by_x1[0].append(block)
-            else:
-                # Should not happen if text_blocks_with_coords is not empty
-                pass
-
-    # Now, based on clustered_blocks_by_x1, define more accurate column boundaries.
-    column_boundaries = []
-    for cluster_idx in sorted(clustered_blocks_by_x1.keys()):
-        blocks_in_cluster = clustered_blocks_by_x1[cluster_idx]
-        if blocks_in_cluster:
-            min_x_for_col = min(b['x1'] for b in blocks_in_cluster)
-            max_x_for_col = max(b['x2'] for b in blocks_in_cluster)
-            column_boundaries.append((min_x_for_col, max_x_for_col))
-
-    # If no columns detected (e.g., very sparse page), default to a single wide column.
-    if not column_boundaries and text_blocks_with_coords:
-        min_x_overall = min(b['x1'] for b in text_blocks_with_coords)
-        max_x_overall = max(b['x2'] for b in text_blocks_with_coords)
-        column_boundaries = [(min_x_overall, max_x_overall)]
-    elif not column_boundaries:
-        return "" # No blocks to process
-
-    # Sort column boundaries by their start x-coordinate (left to right)
-    column_boundaries.sort(key=lambda c: c[0])
-
-    # 3. Assign blocks to identified columns
-    columns_grouped_blocks = {i: [] for i in range(len(column_boundaries))}
-    
-    for block in text_blocks_with_coords:
-        assigned = False
-        block_center_x = (block['x1'] + block['x2']) / 2 # Use center x for robust assignment
-
-        for i, (col_x1, col_x2) in enumerate(column_boundaries):
-            # Check if the block's center x-coordinate is within the column's x-range.
-            # Add a small buffer to the column range to account for minor OCR inaccuracies
-            # or blocks slightly spilling over boundaries.
-            if block_center_x >= col_x1 - 10 and block_center_x <= col_x2 + 10:
-                columns_grouped_blocks[i].append(block)
-                assigned = True
-                break
-        
-        if not assigned:
-            # Fallback: if a block doesn't fit any column, assign to the closest one
-            closest_col_idx = 0
-            min_distance = float('inf')
-            for i, (col_x1, col_x2) in enumerate(column_boundaries):
-                col_center_x = (col_x1 + col_x2) / 2
-                distance = abs(block_center_x - col_center_x)
-                if distance < min_distance:
-                    min_distance = distance
-                    closest_col_idx = i
-            columns_grouped_blocks[closest_col_idx].append(block)
-
-    # 4. Process each column individually (vertical sorting) and concatenate
+def process_ocr_blocks(raw_ocr_data):
+    """Processes OCR results, orders text blocks by columns, and returns spatially ordered raw text."""
+    texts, bboxes = collect_layout_blocks(raw_ocr_data)
+    if not texts:
+        return ""
+    x1, y1, x2 = bboxes[:, 0], bboxes[:, 1], bboxes[:, 2]
+
+    # 1. Cluster column starts: a gap of more than COLUMN_GAP_THRESHOLD between
+    # consecutive sorted x1 values starts a new cluster.
+    x1_order = np.argsort(x1, kind='stable')
+    sorted_x1 = x1[x1_order]
+    cluster_first = np.concatenate(([0], np.nonzero(sorted_x1[1:] - sorted_x1[:-1] > COLUMN_GAP_THRESHOLD)[0] + 1))
+    cluster_starts = sorted_x1[cluster_first]
+    # Every x1 belongs to its own cluster and clusters are more than the gap apart,
+    # so the cluster of a block is simply the last cluster starting at or before it.
+    block_cluster = np.searchsorted(cluster_starts, x1, side='right') - 1
+
+    # 2. Each cluster becomes a column spanning its blocks' min x1 to max x2.
+    # Clusters are already ordered left to right.
+    column_x1 = cluster_starts
+    column_x2 = np.maximum.reduceat(x2[x1_order], cluster_first)
+
+    # 3. Assign each block by its center to the first column whose range (plus margin)
+    # contains it. Column ranges can overlap, so this is a first-match rather than a
+    # searchsorted. Blocks that fit no column go to the column with the closest center.
+    block_center = (x1 + x2) / 2
+    fits = (block_center[:, None] >= column_x1 - COLUMN_MARGIN) & (block_center[:, None] <= column_x2 + COLUMN_MARGIN)
+    block_column = fits.argmax(axis=1)
+    unfit = ~fits.any(axis=1)
+    if unfit.any():
+        column_centers = (column_x1 + column_x2) / 2
+        block_column[unfit] = np.abs(block_center[unfit, None] - column_centers).argmin(axis=1)
+
+    # 4. Order blocks by column, then top to bottom, then left to right. lexsort is
+    # stable, so ties keep their original OCR order.
+    order = np.lexsort((x1, y1, block_column)).tolist()
+    ordered_columns = block_column[order].tolist()
     final_output_parts = []
-    for col_idx in sorted(columns_grouped_blocks.keys()):
-        column_blocks = columns_grouped_blocks[col_idx]
-        if not column_blocks:
-            continue
-
-        # Sort blocks within this column by y1 (vertical position), then x1 (horizontal for tie-breaking)
-        column_blocks.sort(key=lambda b: (b['y1'], b['x1']))
-
-        column_text_content = ""
-        for block in column_blocks:
-            column_text_content += block['text'] + "\n"
-        
-        if column_text_content:
-            final_output_parts.append(column_text_content.strip())
+    column_start = 0
+    for i in range(1, len(order) + 1):
+        if i == len(order) or ordered_columns[i] != ordered_columns[column_start]:
+            final_output_parts.append("\n".join([texts[j] for j in order[column_start:i]]).strip())
+            column_start = i
 
     # 5. Concatenate columns with a separator (e.g., double newline between columns)
-    raw_ocr_output = "\n\n".join(final_output_parts)
-    return raw_ocr_output
+    return "\n\n".join(final_output_parts)
 
 def get_pdf_page_range(pdf_path, start_page, end_page):
     """Determines the actual page range to process for a PDF."""
@@ -328,9 +544,139 @@ def get_existing_files_for_pdf(directory, pdf_name, start_page, end_page, extens
     found_files.sort(key=lambda x: x[1])
     return [path for path, _ in found_files]
 
+def group_page_ranges(pages, max_range_len=None):
+    """Groups page numbers into contiguous (first, last) ranges.
+    Ranges longer than max_range_len are split so they can be spread across workers.
+    """
+    page_ranges = []
+    for page_num in sorted(pages):
+        if page_ranges:
+            first, last = page_ranges[-1]
+            if page_num == last + 1 and (max_range_len is None or last - first + 1 < max_range_len):
+                page_ranges[-1] = (first, page_num)
+                continue
+        page_ranges.append((page_num, page_num))
+    return page_ranges
+
+def get_page_image_path(image_dir, pdf_name, page_num):
+    """Returns the cache path for a rasterized page (pdfname_XXXXXX.png)."""
+    return os.path.join(image_dir, f"{pdf_name}_{str(page_num).zfill(6)}.png")
+
+def rasterize_page_range(pdf_path, pdf_name, image_dir, first_page, last_page, dpi=300):
+    """Rasterizes a contiguous page range with a single poppler call.
+    Pages are written to disk by poppler and moved to their cache names, so they are never held in memory.
+    Returns a list of (page_num, image_path) tuples.
+    """
+    saved_pages = []
+    # Render into a scratch folder inside the cache dir so the final move is a cheap rename
+    with tempfile.TemporaryDirectory(dir=image_dir, prefix=".raster_") as scratch_dir:
+        rendered_paths = convert_from_path(
+            pdf_path,
+            dpi=dpi,
+            first_page=first_page,
+            last_page=last_page,
+            fmt='png',
+            output_folder=scratch_dir,
+            output_file="page",
+            paths_only=True
+        )
+        for rendered_path in rendered_paths:
+            # poppler names its output <prefix>-<page>.png
+            match = re.search(r'-(\d+)\.png$', rendered_path)
+            if not match:
+                print(f"Warning: Could not parse page number from rendered file {rendered_path}. Skipping.")
+                continue
+            page_num = int(match.group(1))
+            expected_img_path = get_page_image_path(image_dir, pdf_name, page_num)
+            os.replace(rendered_path, expected_img_path)
+            saved_pages.append((page_num, expected_img_path))
+    return saved_pages
+
+def open_run_state(config, pdf_name, resume=False):
+    """Opens the per-PDF run state database inside the PDF's OCR output folder."""
+    pdf_output_dir = os.path.join(config['paths']['ocr_output_dir'], pdf_name)
+    os.makedirs(pdf_output_dir, exist_ok=True)
+    return RunState(os.path.join(pdf_output_dir, "run_state.sqlite"), resume=resume)
+
+def get_stage_output_dir(config, pdf_name, stage):
+    """Returns the directory a stage writes its per-page outputs to, or None if it has none."""
+    if stage == 'extract_images':
+        image_dir = config['paths'].get('image_dir')
+        return os.path.join(image_dir, pdf_name) if image_dir else None
+    if stage == 'ocr_images':
+        return os.path.join(config['paths']['ocr_output_dir'], pdf_name, "json")
+    if stage == 'process_ocr_json':
+        return os.path.join(config['paths']['ocr_output_dir'], pdf_name, "raw_text")
+    return None
+
+def get_directory_mtime(directory):
+    """Returns a directory's modification time, which changes whenever a file is added to or removed from it."""
+    return os.path.getmtime(directory) if os.path.isdir(directory) else None
+
+def get_synced_stage_dirs(run_state, config, pdf_name, stages):
+    """Returns {stage: output directory} for the stages whose directory hasn't changed since
+    the run state last matched it. Call before running the stages, then mark_stage_dirs_synced.
+    """
+    synced_dirs = {}
+    if run_state is None:
+        return synced_dirs
+    for stage in stages:
+        directory = get_stage_output_dir(config, pdf_name, stage)
+        scanned_at = run_state.get_scanned_at(stage)
+        if directory is not None and scanned_at is not None and get_directory_mtime(directory) == scanned_at:
+            synced_dirs[stage] = directory
+    return synced_dirs
+
+def mark_stage_dirs_synced(run_state, synced_dirs):
+    """After the stages have run, every change to their directories came from writes they
+    recorded through run_tracked, so the run state still matches them and the next
+    get_stage_files needn't rescan. An untracked change made while the stages ran goes
+    unnoticed until the directory changes again.
+    """
+    for stage, directory in synced_dirs.items():
+        directory_mtime = get_directory_mtime(directory)
+        if directory_mtime is not None:
+            run_state.mark_scanned(stage, directory_mtime)
+
+def get_stage_files(run_state, stage, directory, pdf_name, start_page, end_page, extension):
+    """Returns a stage's output files for a page range from the run state.
+    The stage's directory is scanned the first time, to import outputs from earlier runs, and
+    again whenever it has changed since the last scan (files added by an untracked run or
+    deleted to force a redo), so the run state never disagrees with what is on disk. Writes
+    recorded by the stage itself don't count as changes (see mark_stage_dirs_synced).
+    """
+    if run_state is None:
+        return get_existing_files_for_pdf(directory, pdf_name, start_page, end_page, extension)
+    # The directory's modification time is taken before listing, so files written while scanning trigger another scan next time.
+    directory_mtime = get_directory_mtime(directory)
+    scanned_at = run_state.get_scanned_at(stage)
+    if scanned_at is None or (directory_mtime is not None and directory_mtime != scanned_at):
+        imported = run_state.import_outputs(stage, get_existing_files_for_pdf(directory, pdf_name, None, None, extension), directory_mtime)
+        print(f"Imported {imported} existing {stage} outputs into the run state")
+    return run_state.get_outputs(stage, start_page, end_page)
+
+def run_tracked(run_state, stage, input_path, func, *extra):
+    """Runs func for one page, recording its output in run_state if there is one.
+    extra holds any settings besides the input file that affect the output.
+    """
+    if run_state is None:
+        return func()
+    return run_state.run_item(stage, input_path, func, *extra)
+
+def get_llm_input_params(config):
+    """Settings besides the input text that change LLM cleanup output."""
+    return (config['llm_model_name'], get_prompt_hash(config), config['settings'].get('llm_max_chunk_chars'))
+
+def get_ocr_input_params(config):
+    """Settings besides the page image that change OCR output."""
+    return (OCR_REQUEST_OPTIONS, config['settings']['image_resize_width'], get_ocr_image_encoding(config))
+
 # --- Action Functions (will be called by main) ---
-def action_extract_images(config, pdf_path, start_page, end_page):
-    """Action: Extracts and caches PDF pages as images, only generating missing ones."""
+def action_extract_images(config, pdf_path, start_page, end_page, run_state=None):
+    """Action: Extracts and caches PDF pages as images, only generating missing ones.
+    Missing pages are grouped into contiguous ranges and rasterized by a pool of
+    settings.extract_workers workers, one poppler call per range.
+    """
     image_dir = config['paths'].get('image_dir')
     output_image_dir = image_dir or tempfile.mkdtemp()
     pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
@@ -348,202 +694,605 @@ def action_extract_images(config, pdf_path, start_page, end_page):
 
     print(f"Using image output directory: {pdf_image_output_dir}")
 
-    try:
-        for page_num in pages_to_convert:
-            expected_img_file = f"{pdf_name}_{str(page_num).zfill(6)}.png"
-            expected_img_path = os.path.join(pdf_image_output_dir, expected_img_file)
-
-            print(f"Checking for cached image: {expected_img_path}")
-            if os.path.exists(expected_img_path):
-                print(f"Found cached image for page {page_num}: {expected_img_file}")
-                image_paths.append(expected_img_path)
-            else:
-                print(f"Cached image NOT found for page {page_num}. Generating and saving...")
-                pages_list = convert_from_path(
-                    pdf_path,
-                    dpi=300,
-                    first_page=page_num,
-                    last_page=page_num,
-                    fmt='png'
-                )
-                
-                if pages_list:
-                    page_image = pages_list[0]
-                    page_image.save(expected_img_path, format="PNG")
+    missing_pages = []
+    for page_num in pages_to_convert:
+        expected_img_path = get_page_image_path(pdf_image_output_dir, pdf_name, page_num)
+        if os.path.exists(expected_img_path):
+            print(f"Found cached image for page {page_num}: {os.path.basename(expected_img_path)}")
+            image_paths.append(expected_img_path)
+        else:
+            missing_pages.append(page_num)
+
+    if missing_pages:
+        workers = max(1, int(config['settings'].get('extract_workers', 1)))
+        # Split the missing pages into roughly one range per worker so the pool stays busy
+        max_range_len = math.ceil(len(missing_pages) / workers)
+        page_ranges = group_page_ranges(missing_pages, max_range_len)
+        pdf_fingerprint = fingerprint_file(pdf_path)
+        print(f"Rasterizing {len(missing_pages)} missing pages in {len(page_ranges)} ranges using {workers} workers...")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(rasterize_page_range, pdf_path, pdf_name, pdf_image_output_dir, first_page, last_page): (first_page, last_page)
+                for first_page, last_page in page_ranges
+            }
+            for future in as_completed(futures):
+                first_page, last_page = futures[future]
+                try:
+                    saved_pages = future.result()
+                except Exception as e:
+                    print(f"❌ Failed to extract pages {first_page}-{last_page} from PDF {pdf_path}: {e}")
+                    continue
+                for page_num, expected_img_path in saved_pages:
                     print(f"Generated and saved image for page {page_num}: {expected_img_path}")
                     image_paths.append(expected_img_path)
-                else:
-                    print(f"Warning: Could not generate image for page {page_num}.")
-    except Exception as e:
-        print(f"❌ Failed to extract images from PDF {pdf_path}: {e}")
+                    if run_state is not None:
+                        run_state.record_success('extract_images', page_num, expected_img_path, pdf_fingerprint)
+                if len(saved_pages) < last_page - first_page + 1:
+                    print(f"Warning: Could not generate all images for pages {first_page}-{last_page}.")
     
     image_paths.sort(key=lambda f: int(os.path.basename(f).split(f'{pdf_name}_')[1].split('.png')[0]))
 
     return image_paths
 
-def action_ocr_images(config, image_paths):
-    """Action: Calls OCR endpoint for images and saves the raw JSON responses and associated images."""
+def ocr_image(config, img_path, session=None, ocr_cache=None):
+    """OCRs a single page image and saves the raw JSON and markdown responses.
+    If ocr_cache is given, results are looked up by a hash of the resized PNG and the
+    request options first, and the endpoint is only called on a miss.
+    Returns the path of the saved OCR JSON, or None on failure.
+    """
     base_ocr_output_dir = config['paths']['ocr_output_dir']
-    # ocr_marked_image_dir and doc_preprocessing_image_dir will now be created per PDF
 
+    file_name = os.path.basename(img_path)
+    pdf_name = os.path.splitext(file_name.split('_')[0])[0] # Assuming pdf_name_XXXXXX.png
+    page_number_from_filename = None
+    try:
+        match = re.search(r'(\d+)\.png$', file_name)
+        if match:
+            page_number_from_filename = int(match.group(1))
+        else:
+            raise ValueError("Filename does not match expected patterns.")
+    except (IndexError, ValueError) as e:
+        print(f"Warning: Could not parse page number from filename {file_name} (Error: {e}). Skipping for output naming.")
+        page_number_from_filename = "unknown"
+
+    # Create PDF-specific subfolders for JSON, Markdown, and marked images
+    pdf_ocr_json_dir = os.path.join(base_ocr_output_dir, pdf_name, "json")
+    pdf_ocr_markdown_dir = os.path.join(base_ocr_output_dir, pdf_name, "markdown")
+    pdf_ocr_marked_image_dir = os.path.join(base_ocr_output_dir, pdf_name, "marked_images")
+    pdf_doc_preprocessing_image_dir = os.path.join(base_ocr_output_dir, pdf_name, "doc_preprocessing_images")
+
+    os.makedirs(pdf_ocr_json_dir, exist_ok=True)
+    os.makedirs(pdf_ocr_markdown_dir, exist_ok=True)
+    os.makedirs(pdf_ocr_marked_image_dir, exist_ok=True)
+    os.makedirs(pdf_doc_preprocessing_image_dir, exist_ok=True)
+
+    output_file_base = f"{pdf_name}_pg{page_number_from_filename}"
+    ocr_json_path = os.path.join(pdf_ocr_json_dir, f"{output_file_base}.json")
+    ocr_image_path = os.path.join(pdf_ocr_marked_image_dir, f"{output_file_base}_ocr.jpeg")
+    doc_preprocessing_image_path = os.path.join(pdf_doc_preprocessing_image_dir, f"{output_file_base}_doc.jpeg")
+
+    try:
+        image_bytes, encode_seconds, from_cache = load_page_for_ocr(config, img_path)
+        new_width = config['settings']['image_resize_width']
+
+        ocr_result = None
+        cache_key = None
+        cache_source = f"{pdf_name}/{page_number_from_filename}"
+        if ocr_cache is not None:
+            cache_key = ocr_cache.make_key(image_bytes, OCR_REQUEST_OPTIONS, new_width)
+            ocr_result = ocr_cache.get(cache_key, cache_source)
+            if ocr_result is not None:
+                print(f"Found cached OCR result for {file_name}")
+
+        if ocr_result is None:
+            request_body = build_ocr_request_body(image_bytes)
+            encode_source = "cached resize" if from_cache else f"encoded in {encode_seconds * 1000:.0f}ms"
+            print(f"🧹 Calling OCR endpoint for {file_name} ({len(request_body)} bytes, {encode_source})...")
+            raw_ocr_response = call_ocr_endpoint(config, request_body, session)
+
+            if raw_ocr_response and "result" in raw_ocr_response and raw_ocr_response["result"] and "layoutParsingResults" in raw_ocr_response["result"]:
+                ocr_result = raw_ocr_response['result']['layoutParsingResults'][0] # Assuming always one result object
+                if ocr_cache is not None:
+                    # Only cache what we write out; the response also carries large rendered images
+                    ocr_cache.put(cache_key, {k: ocr_result[k] for k in ("prunedResult", "markdown") if k in ocr_result}, cache_source)
+
+        if ocr_result is not None:
+            if "markdown" in ocr_result:
+                with open(os.path.join(pdf_ocr_markdown_dir, f"{output_file_base}.md"), "w", encoding="utf-8") as f:
+                    f.write(ocr_result['markdown']['text'])
+
+            # Save prunedResult JSON
+            if "prunedResult" in ocr_result:
+                with open(ocr_json_path, "w", encoding="utf-8") as f:
+                    json.dump(ocr_result['prunedResult'], f, indent=2)
+                    print(f"✅ Saved prunedResult JSON to {ocr_json_path}")
+                return ocr_json_path
+            print(f"Warning: No 'prunedResult' found in OCR response for {file_name}.")
+        else:
+            print(f"Warning: No valid OCR response from endpoint for {file_name}.")
+    except Exception as e:
+        print(f"❌ Failed to OCR {file_name}: {e}")
+    return None
+
+def action_ocr_images(config, image_paths, run_state=None):
+    """Action: Calls OCR endpoint for images and saves the raw JSON responses and associated images.
+    Up to settings.ocr_concurrency requests are kept in flight over a shared keep-alive session.
+    """
     if not image_paths:
         print("No images provided for OCR.")
         return
 
-    for img_path in image_paths:
-        file_name = os.path.basename(img_path)
-        pdf_name = os.path.splitext(file_name.split('_')[0])[0] # Assuming pdf_name_XXXXXX.png
-        page_number_from_filename = None
-        try:
-            match = re.search(r'(\d+)\.png$', file_name)
-            if match:
-                page_number_from_filename = int(match.group(1))
-            else:
-                raise ValueError("Filename does not match expected patterns.")
-        except (IndexError, ValueError) as e:
-            print(f"Warning: Could not parse page number from filename {file_name} (Error: {e}). Skipping for output naming.")
-            page_number_from_filename = "unknown"
-
-        # Create PDF-specific subfolders for JSON, Markdown, and marked images
-        pdf_ocr_json_dir = os.path.join(base_ocr_output_dir, pdf_name, "json")
-        pdf_ocr_markdown_dir = os.path.join(base_ocr_output_dir, pdf_name, "markdown")
-        pdf_ocr_marked_image_dir = os.path.join(base_ocr_output_dir, pdf_name, "marked_images")
-        pdf_doc_preprocessing_image_dir = os.path.join(base_ocr_output_dir, pdf_name, "doc_preprocessing_images")
-
-        os.makedirs(pdf_ocr_json_dir, exist_ok=True)
-        os.makedirs(pdf_ocr_markdown_dir, exist_ok=True)
-        os.makedirs(pdf_ocr_marked_image_dir, exist_ok=True)
-        os.makedirs(pdf_doc_preprocessing_image_dir, exist_ok=True)
-
-        output_file_base = f"{pdf_name}_pg{page_number_from_filename}"
-        ocr_json_path = os.path.join(pdf_ocr_json_dir, f"{output_file_base}.json")
-        ocr_image_path = os.path.join(pdf_ocr_marked_image_dir, f"{output_file_base}_ocr.jpeg")
-        doc_preprocessing_image_path = os.path.join(pdf_doc_preprocessing_image_dir, f"{output_file_base}_doc.jpeg")
-
-        print(f"🧹 Calling OCR endpoint for {file_name}...")
-        try:
-            with Image.open(img_path) as page_image:
-                original_width, original_height = page_image.size
-                new_width = config['settings']['image_resize_width']
-                new_height = int(original_height * (new_width / original_width))
-                resized_image = page_image.resize((new_width, new_height), Image.LANCZOS)
-                page_np = np.array(resized_image)
-
-            image_base64 = encode_image_to_base64(page_np)
-            
-            raw_ocr_response = call_ocr_endpoint(image_base64)
-            
-            if raw_ocr_response and "result" in raw_ocr_response and raw_ocr_response["result"] and "layoutParsingResults" in raw_ocr_response["result"]:
-                ocr_result = raw_ocr_response['result']['layoutParsingResults'][0] # Assuming always one result object
+    concurrency = max(1, int(config['settings'].get('ocr_concurrency', 1)))
+    ocr_cache = ResultCache(get_ocr_cache_dir(config))
+    print(f"OCR'ing {len(image_paths)} images with up to {concurrency} requests in flight...")
 
-                # Save prunedResult JSON
-                if "prunedResult" in ocr_result:
-                    with open(ocr_json_path, "w", encoding="utf-8") as f:
-                        json.dump(ocr_result['prunedResult'], f, indent=2)
-                        print(f"✅ Saved prunedResult JSON to {ocr_json_path}")
-                else:
-                    print(f"Warning: No 'prunedResult' found in OCR response for {file_name}.")
+    with create_http_session(concurrency) as session:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(
+                lambda img_path: run_tracked(run_state, 'ocr_images', img_path, lambda: ocr_image(config, img_path, session, ocr_cache), *get_ocr_input_params(config)),
+                image_paths
+            ))
 
-                if "markdown" in ocr_result:
-                    with open(os.path.join(pdf_ocr_markdown_dir, f"{output_file_base}.md"), "w", encoding="utf-8") as f:
-                        f.write(ocr_result['markdown']['text'])
+    ocr_cache.save()
+    print(f"OCR cache: {ocr_cache.summary()}")
 
-            else:
-                print(f"Warning: No valid OCR response from endpoint for {file_name}.")
-        except Exception as e:
-            print(f"❌ Failed to OCR {file_name}: {e}")
+    failed = results.count(None)
+    if failed:
+        print(f"Warning: OCR failed for {failed} of {len(image_paths)} images.")
 
     # This action no longer returns current_ocr_json_paths as the next step will scan for them.
     return
 
-def action_process_ocr_json(config, ocr_json_paths):
-    """Action: Processes raw OCR JSON files into spatially ordered text blocks and saves them."""
+def action_prune_ocr_cache(config):
+    """Action: Removes OCR cache entries that no page resolves to any more."""
+    ocr_cache = ResultCache(get_ocr_cache_dir(config))
+    removed = ocr_cache.prune()
+    ocr_cache.save()
+    print(f"✅ Pruned {removed} orphaned OCR cache entries from {ocr_cache.cache_dir}")
+
+def process_ocr_json_page(config, json_path):
+    """Processes a single raw OCR JSON file into spatially ordered text and saves it.
+    Safe to run in a worker process. Returns a dict with the raw text path and text,
+    or an error message if nothing was saved.
+    """
     base_ocr_output_dir = config['paths']['ocr_output_dir']
-    raw_text_paths = []
+    file_name = os.path.basename(json_path)
+    # Extract pdf_name from the json_path (e.g., 'pdfname_pgXXXXXX.json' -> 'pdfname')
+    pdf_name = os.path.splitext(file_name.split('_')[0])[0]
+    page_number_from_filename = None
+    try:
+        match = re.search(r'(\d+)\.json$', file_name)
+        if match:
+            page_number_from_filename = int(match.group(1))
+        else:
+            raise ValueError("Filename does not match expected patterns.")
+    except (IndexError, ValueError) as e:
+        print(f"Warning: Could not parse page number from filename {file_name} (Error: {e}). Skipping for output naming.")
+        page_number_from_filename = "unknown"
 
+    # Create PDF-specific subfolder for raw text output within ocr_output_dir
+    pdf_raw_text_output_dir = os.path.join(base_ocr_output_dir, pdf_name, "raw_text")
+    os.makedirs(pdf_raw_text_output_dir, exist_ok=True)
+
+    output_file_name_base = f"{pdf_name}_pg{page_number_from_filename}"
+    raw_text_path = os.path.join(pdf_raw_text_output_dir, f"{output_file_name_base}.txt")
+
+    result = {'json_path': json_path, 'raw_text_path': None, 'text': None, 'error': None}
+    print(f"🧹 Processing raw OCR JSON from {file_name}...")
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            raw_ocr_data = json.load(f)
+        
+        ordered_text = process_ocr_blocks(raw_ocr_data)
+
+        if ordered_text:
+            # Remove multiple spaces with a single space
+            ordered_text = MULTIPLE_SPACES_RE.sub(' ', ordered_text)
+            # Remove empty lines (lines containing only whitespace)
+            ordered_text = EMPTY_LINES_RE.sub('', ordered_text)
+
+            with open(raw_text_path, "w", encoding="utf-8") as f:
+                f.write(ordered_text)
+                print(f"✅ Saved ordered text to {raw_text_path}")
+            result['raw_text_path'] = raw_text_path
+            result['text'] = ordered_text
+        else:
+            result['error'] = "no ordered text extracted"
+            print(f"Warning: No ordered text extracted from {file_name}.")
+    except Exception as e:
+        result['error'] = str(e)
+        print(f"❌ Failed to process OCR JSON from {file_name}: {e}")
+    return result
+
+def process_ocr_json_file(config, json_path):
+    """Processes a single raw OCR JSON file. Returns the saved text path, or None if nothing was extracted."""
+    return process_ocr_json_page(config, json_path)['raw_text_path']
+
+def get_combined_text_path(config, pdf_name):
+    """Returns the path of the page-ordered text of a whole PDF, next to its raw_text folder."""
+    return os.path.join(config['paths']['ocr_output_dir'], pdf_name, f"{pdf_name}_raw_text.txt")
+
+def action_process_ocr_json(config, ocr_json_paths, run_state=None, combined_text=False):
+    """Action: Processes raw OCR JSON files into spatially ordered text blocks and saves them.
+    With settings.process_workers > 1, pages are spread over a process pool; results are
+    still collected in page order. If combined_text is set, the page texts are also
+    written to a single page-ordered file for the whole PDF.
+    """
     if not ocr_json_paths:
         print("No raw OCR JSON files provided for processing.")
         return []
 
+    workers = max(1, int(config['settings'].get('process_workers', 1)))
+    results = {}
+    pending_paths = []
     for json_path in ocr_json_paths:
-        file_name = os.path.basename(json_path)
-        # Extract pdf_name from the json_path (e.g., 'pdfname_pgXXXXXX.json' -> 'pdfname')
-        pdf_name = os.path.splitext(file_name.split('_')[0])[0]
-        page_number_from_filename = None
-        try:
-            match = re.search(r'(\d+)\.json$', file_name)
-            if match:
-                page_number_from_filename = int(match.group(1))
-            else:
-                raise ValueError("Filename does not match expected patterns.")
-        except (IndexError, ValueError) as e:
-            print(f"Warning: Could not parse page number from filename {file_name} (Error: {e}). Skipping for output naming.")
-            page_number_from_filename = "unknown"
+        current_output = run_state.get_current_output('process_ocr_json', json_path) if run_state is not None else None
+        if current_output is not None:
+            results[json_path] = {'json_path': json_path, 'raw_text_path': current_output, 'text': None, 'error': None}
+        else:
+            pending_paths.append(json_path)
 
-        # Create PDF-specific subfolder for raw text output within ocr_output_dir
-        pdf_raw_text_output_dir = os.path.join(base_ocr_output_dir, pdf_name, "raw_text")
-        os.makedirs(pdf_raw_text_output_dir, exist_ok=True)
+    if workers > 1 and len(pending_paths) > 1:
+        print(f"Processing {len(pending_paths)} OCR JSON files with {workers} worker processes...")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(pending_paths) // (workers * 4))
+            page_results = executor.map(partial(process_ocr_json_page, config), pending_paths, chunksize=chunksize)
+            results.update((result['json_path'], result) for result in page_results)
+    else:
+        results.update((json_path, process_ocr_json_page(config, json_path)) for json_path in pending_paths)
 
-        output_file_name_base = f"{pdf_name}_pg{page_number_from_filename}"
-        raw_text_path = os.path.join(pdf_raw_text_output_dir, f"{output_file_name_base}.txt")
+    raw_text_paths = []
+    failures = []
+    for json_path in ocr_json_paths:
+        result = results[json_path]
+        if run_state is not None and json_path in pending_paths:
+            run_state.record_result('process_ocr_json', json_path, result['raw_text_path'], result['error'])
+        if result['raw_text_path']:
+            raw_text_paths.append(result['raw_text_path'])
+        else:
+            failures.append(result)
 
-        print(f"🧹 Processing raw OCR JSON from {file_name}...")
-        try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                raw_ocr_data = json.load(f)
-            
-            ordered_text = process_ocr_blocks(raw_ocr_data)
-
-            if ordered_text:
-                # Remove multiple spaces with a single space
-                ordered_text = re.sub(r' +', ' ', ordered_text)
-                # Remove empty lines (lines containing only whitespace)
-                ordered_text = re.sub(r'^\s*$\n', '', ordered_text, flags=re.MULTILINE)
-
-                with open(raw_text_path, "w", encoding="utf-8") as f:
-                    f.write(ordered_text)
-                    print(f"✅ Saved ordered text to {raw_text_path}")
-                raw_text_paths.append(raw_text_path)
-            else:
-                print(f"Warning: No ordered text extracted from {file_name}.")
-        except Exception as e:
-            print(f"❌ Failed to process OCR JSON from {file_name}: {e}")
+    if failures:
+        print(f"Warning: {len(failures)} of {len(ocr_json_paths)} OCR JSON files produced no text:")
+        for result in failures:
+            print(f"  {os.path.basename(result['json_path'])}: {result['error']}")
+
+    if combined_text and raw_text_paths:
+        pages = [(results[json_path]['raw_text_path'], results[json_path]['text']) for json_path in ocr_json_paths if results[json_path]['raw_text_path']]
+        write_combined_text(config, pages)
 
     return raw_text_paths
 
-def action_llm_cleanup_text(config, text_paths):
-    """Action: Sends raw text files to Ollama for markdown tagging and cleanup."""
+def write_combined_text(config, pages):
+    """Writes page texts, given as (raw text path, text or None to read it) in page order,
+    to the combined text file of their PDF.
+    """
+    pdf_name = os.path.basename(pages[0][0]).split('_pg')[0]
+    combined_text_path = get_combined_text_path(config, pdf_name)
+    with open(combined_text_path, "w", encoding="utf-8") as f:
+        for raw_text_path, text in pages:
+            if text is None:
+                with open(raw_text_path, "r", encoding="utf-8") as page_f:
+                    text = page_f.read()
+            f.write(text)
+            if not text.endswith("\n"):
+                f.write("\n")
+    print(f"✅ Saved combined text for {len(pages)} pages to {combined_text_path}")
+
+def llm_cleanup_file(config, text_path, session=None, llm_cache=None):
+    """Cleans a single raw text file with Ollama and saves the markdown output.
+    Pages longer than settings.llm_max_chunk_chars are cleaned in paragraph-aligned chunks
+    and stitched back together. Output is streamed to a .part file and renamed when complete.
+    Returns the output path, or None on failure.
+    """
     base_ocr_output_dir = config['paths']['ocr_output_dir']
+    file_name = os.path.basename(text_path)
+    # Assuming text_path is like pdfname_pgXXX.txt
+    # Extract pdf_name from the text_path (e.g., 'pdfname_pgXXXXXX.txt' -> 'pdfname')
+    pdf_name = os.path.splitext(file_name.split('_pg')[0])[0]
     
+    # Create PDF-specific subfolder for cleaned markdown output within ocr_output_dir
+    markdown_output_dir = os.path.join(base_ocr_output_dir, pdf_name, "cleaned_markdown")
+    os.makedirs(markdown_output_dir, exist_ok=True)
+
+    output_file_name_base = file_name.replace('.txt', '')
+    final_output_path = os.path.join(markdown_output_dir, f"{output_file_name_base}.md")
+    partial_output_path = f"{final_output_path}.part"
+
+    try:
+        with open(text_path, "r", encoding="utf-8") as f:
+            raw_text = f.read()
+
+        chunks = split_text_for_llm(raw_text, config['settings'].get('llm_max_chunk_chars'))
+        prompt_hash = get_prompt_hash(config)
+        cache_key = ResultCache.make_key(config['llm_model_name'], prompt_hash, *chunks)
+        cache_source = f"{pdf_name}/{output_file_name_base}"
+        cached = llm_cache.get(cache_key, cache_source) if llm_cache is not None else None
+        if cached is not None:
+            print(f"Found cached cleanup for {file_name}")
+            with open(final_output_path, "w", encoding="utf-8") as f:
+                f.write(cached['content'])
+            return final_output_path
+
+        print(f"🧹 Cleaning {file_name} with Ollama ({config['llm_model_name']}) for markdown tagging ({len(chunks)} chunks)...")
+        cleaned_chunks = []
+        ttfb = None
+        eval_count = 0
+        eval_seconds = 0.0
+        with open(partial_output_path, "w", encoding="utf-8") as f:
+            for chunk_index, chunk in enumerate(chunks):
+                if chunk_index > 0:
+                    f.write("\n\n")
+                cleaned_chunk, stats = clean_with_ollama(config, text_content=chunk, session=session, output_file=f)
+                cleaned_chunks.append(cleaned_chunk)
+                if ttfb is None:
+                    ttfb = stats['ttfb']
+                eval_count += stats['eval_count']
+                eval_seconds += stats['eval_seconds']
+        cleaned_markdown = "\n\n".join(cleaned_chunks)
+        os.replace(partial_output_path, final_output_path)
+
+        if llm_cache is not None:
+            llm_cache.put(cache_key, {'model': config['llm_model_name'], 'prompt_hash': prompt_hash, 'content': cleaned_markdown}, cache_source)
+
+        tokens_per_second = eval_count / eval_seconds if eval_seconds else 0.0
+        ttfb_text = f"{ttfb:.2f}s" if ttfb is not None else "n/a"
+        print(f"✅ Saved markdown output to {final_output_path} (ttfb {ttfb_text}, {eval_count} tokens, {tokens_per_second:.1f} tok/s)")
+        return final_output_path
+    except Exception as e:
+        print(f"❌ Failed to clean {file_name}: {e}")
+    return None
+
+def action_llm_cleanup_text(config, text_paths, run_state=None):
+    """Action: Sends raw text files to Ollama for markdown tagging and cleanup.
+    Up to settings.llm_concurrency pages are cleaned at once. Responses are cached by
+    (model, prompt hash, input text hash), so unchanged pages are not resent.
+    """
     if not text_paths:
         print("No text files provided for LLM cleanup.")
         return
 
-    for text_path in text_paths:
-        file_name = os.path.basename(text_path)
-        # Assuming text_path is like pdfname_pgXXX.txt
-        # Extract pdf_name from the text_path (e.g., 'pdfname_pgXXXXXX.txt' -> 'pdfname')
-        pdf_name = os.path.splitext(file_name.split('_pg')[0])[0]
-        
-        # Create PDF-specific subfolder for cleaned markdown output within ocr_output_dir
-        markdown_output_dir = os.path.join(base_ocr_output_dir, pdf_name, "cleaned_markdown")
-        os.makedirs(markdown_output_dir, exist_ok=True)
+    concurrency = max(1, int(config['settings'].get('llm_concurrency', 1)))
+    llm_cache = open_llm_cache(config)
+    print(f"Cleaning {len(text_paths)} text files with up to {concurrency} requests in flight...")
 
-        output_file_name_base = file_name.replace('.txt', '')
-        final_output_path = os.path.join(markdown_output_dir, f"{output_file_name_base}.md")
+    with create_http_session(concurrency) as session:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(
+                lambda text_path: run_tracked(run_state, 'llm_cleanup_text', text_path, lambda: llm_cleanup_file(config, text_path, session, llm_cache), *get_llm_input_params(config)),
+                text_paths
+            ))
 
-        print(f"🧹 Cleaning {file_name} with Ollama ({config['llm_model_name']}) for markdown tagging...")
-        try:
-            with open(text_path, "r", encoding="utf-8") as f:
-                raw_text = f.read()
+    llm_cache.save()
+    print(f"LLM cleanup cache: {llm_cache.summary()}")
 
-            cleaned_markdown = clean_with_ollama(config, text_content=raw_text)
-            
-            with open(final_output_path, "w", encoding="utf-8") as f:
-                f.write(cleaned_markdown)
-                print(f"✅ Saved markdown output to {final_output_path}")
+    failed = results.count(None)
+    if failed:
+        print(f"Warning: LLM cleanup failed for {failed} of {len(text_paths)} text files.")
+
+# --- Pipelined Execution ---
+# Stage actions in the order pages flow through them
+PIPELINE_STAGES = ['extract_images', 'ocr_images', 'process_ocr_json', 'llm_cleanup_text']
+
+def extract_page_range(pdf_path, pdf_name, image_dir, first_page, last_page, run_state=None):
+    """Returns image paths for a page range, rasterizing only the pages that aren't cached yet.
+    Like action_extract_images, a range poppler fails on is logged (and recorded as failed)
+    and the pages that did render are still returned.
+    """
+    image_paths = {}
+    missing_pages = []
+    for page_num in range(first_page, last_page + 1):
+        expected_img_path = get_page_image_path(image_dir, pdf_name, page_num)
+        if os.path.exists(expected_img_path):
+            image_paths[page_num] = expected_img_path
+        else:
+            missing_pages.append(page_num)
+    for missing_first, missing_last in group_page_ranges(missing_pages):
+        try:
+            saved_pages = rasterize_page_range(pdf_path, pdf_name, image_dir, missing_first, missing_last)
         except Exception as e:
-            print(f"❌ Failed to clean {file_name}: {e}")
+            print(f"❌ Failed to extract pages {missing_first}-{missing_last} from PDF {pdf_path}: {e}")
+            if run_state is not None:
+                for page_num in range(missing_first, missing_last + 1):
+                    run_state.record_failure('extract_images', page_num, error=str(e))
+            continue
+        for page_num, expected_img_path in saved_pages:
+            print(f"Generated and saved image for page {page_num}: {expected_img_path}")
+            image_paths[page_num] = expected_img_path
+            if run_state is not None:
+                run_state.record_success('extract_images', page_num, expected_img_path, fingerprint_file(pdf_path))
+    return [image_paths[page_num] for page_num in sorted(image_paths)]
+
+class PipelineStage:
+    """One stage of the page pipeline: a pool of worker threads reading items from an
+    input queue, calling func on each, and pushing the results to the next stage.
+    func may return a single item, a list of items, or None to drop the item (a failed page).
+    An exception from func stops the whole pipeline: stop_event, shared by every stage,
+    is set and the stages drain their queues without processing what is left.
+    """
+    def __init__(self, name, func, workers, queue_size, stop_event=None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.input_queue = queue.Queue(maxsize=queue_size)
+        self.next_stage = None
+        self.stop_event = stop_event or threading.Event()
+        self.lock = threading.Lock()
+        self.running_workers = self.workers
+        self.processed = 0
+        self.failed = 0
+        self.error = None
+        self.busy_seconds = 0.0
+
+    def start(self):
+        threads = [threading.Thread(target=self.run_worker, name=f"{self.name}-{i}", daemon=True) for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def close_input(self):
+        """Tells every worker of this stage that no more input is coming."""
+        for _ in range(self.workers):
+            self.input_queue.put(None)
+
+    def run_worker(self):
+        try:
+            while True:
+                item = self.input_queue.get()
+                if item is None:
+                    break
+                if self.stop_event.is_set():
+                    continue # drain, so upstream stages never block on a full queue
+                start_time = time.perf_counter()
+                try:
+                    result = self.func(item)
+                except Exception as e:
+                    print(f"❌ Pipeline stage {self.name} failed on {item}: {e}. Stopping the pipeline.")
+                    with self.lock:
+                        self.processed += 1
+                        self.failed += 1
+                        self.error = self.error or e
+                    self.stop_event.set()
+                    continue
+                elapsed = time.perf_counter() - start_time
+
+                outputs = result if isinstance(result, list) else ([] if result is None else [result])
+                with self.lock:
+                    self.busy_seconds += elapsed
+                    self.processed += 1
+                    if not outputs:
+                        self.failed += 1
+                if self.next_stage is not None:
+                    for output in outputs:
+                        self.next_stage.input_queue.put(output)
+        finally:
+            # The last worker out closes the next stage so shutdown cascades down the pipeline
+            with self.lock:
+                self.running_workers -= 1
+                is_last_worker = self.running_workers == 0
+            if is_last_worker and self.next_stage is not None:
+                self.next_stage.close_input()
+
+    def summary(self):
+        return f"{self.name}: {self.processed} items ({self.failed} failed), {self.busy_seconds:.1f}s busy across {self.workers} workers"
+
+def run_stages(stages, source_items):
+    """Links the stages in order, feeds source_items to the first one and waits until every
+    item has flowed through or the pipeline has stopped on an error. Returns the wall time.
+    """
+    stop_event = threading.Event()
+    for stage in stages:
+        stage.stop_event = stop_event
+    for stage, next_stage in zip(stages, stages[1:]):
+        stage.next_stage = next_stage
+
+    start_time = time.perf_counter()
+    threads = []
+    for stage in stages:
+        threads.extend(stage.start())
+    for item in source_items:
+        if stop_event.is_set():
+            break
+        stages[0].input_queue.put(item)
+    stages[0].close_input()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start_time
+
+def run_pipeline(config, pdf_path, stage_names, start_page, end_page, run_state=None, combined_text=False):
+    """Runs the given stage actions as a streaming pipeline.
+    Each page moves on to the next stage as soon as it is done with the previous one,
+    with bounded queues between stages and a separate worker count per stage, so
+    rasterization, OCR and LLM cleanup overlap instead of running back to back.
+    As in action_process_ocr_json, OCR JSON parsing runs in a pool of settings.process_workers
+    processes; the stage's threads only hand pages to it. If combined_text is set, the
+    page texts are written to the PDF's combined text file once the pipeline has finished.
+    """
+    stage_indexes = [PIPELINE_STAGES.index(name) for name in stage_names]
+    if stage_indexes != list(range(stage_indexes[0], stage_indexes[-1] + 1)):
+        print(f"Error: Pipelined actions must be consecutive steps of {' -> '.join(PIPELINE_STAGES)}.")
+        return
+
+    pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    settings = config['settings']
+    queue_size = settings.get('pipeline_queue_size', 8)
+    ocr_concurrency = max(1, int(settings.get('ocr_concurrency', 1)))
+    llm_concurrency = max(1, int(settings.get('llm_concurrency', 1)))
+
+    ocr_cache = ResultCache(get_ocr_cache_dir(config)) if 'ocr_images' in stage_names else None
+    llm_cache = open_llm_cache(config) if 'llm_cleanup_text' in stage_names else None
+    process_workers = max(1, int(settings.get('process_workers', 1)))
+    ocr_session = create_http_session(ocr_concurrency)
+    llm_session = create_http_session(llm_concurrency)
+
+    image_dir = os.path.join(config['paths'].get('image_dir') or tempfile.mkdtemp(), pdf_name)
+    os.makedirs(image_dir, exist_ok=True)
+
+    available_stages = {
+        'extract_images': lambda page_range: extract_page_range(pdf_path, pdf_name, image_dir, *page_range, run_state=run_state),
+        'ocr_images': lambda img_path: run_tracked(
+            run_state, 'ocr_images', img_path, lambda: ocr_image(config, img_path, ocr_session, ocr_cache), *get_ocr_input_params(config)),
+        'process_ocr_json': lambda json_path: run_tracked(
+            run_state, 'process_ocr_json', json_path,
+            lambda: process_pool.submit(process_ocr_json_file, config, json_path).result() if process_pool is not None else process_ocr_json_file(config, json_path)),
+        'llm_cleanup_text': lambda text_path: run_tracked(
+            run_state, 'llm_cleanup_text', text_path, lambda: llm_cleanup_file(config, text_path, llm_session, llm_cache), *get_llm_input_params(config))
+    }
+    stage_workers = {
+        'extract_images': settings.get('extract_workers', 1),
+        'ocr_images': ocr_concurrency,
+        'process_ocr_json': process_workers,
+        'llm_cleanup_text': llm_concurrency
+    }
+    stages = [PipelineStage(name, available_stages[name], stage_workers[name], queue_size) for name in stage_names]
+
+    # Work for the first stage comes from the page range or from files cached by earlier runs
+    first_stage = stage_names[0]
+    if first_stage == 'extract_images':
+        pages = get_pdf_page_range(pdf_path, start_page, end_page)
+        source_items = group_page_ranges(pages, settings.get('pipeline_extract_chunk', 4))
+    elif first_stage == 'ocr_images':
+        source_items = get_stage_files(run_state, 'extract_images', image_dir, pdf_name, start_page, end_page, 'png')
+    elif first_stage == 'process_ocr_json':
+        source_items = get_stage_files(run_state, 'ocr_images', get_stage_output_dir(config, pdf_name, 'ocr_images'), pdf_name, start_page, end_page, 'json')
+    else:
+        source_items = get_stage_files(run_state, 'process_ocr_json', get_stage_output_dir(config, pdf_name, 'process_ocr_json'), pdf_name, start_page, end_page, 'txt')
+
+    if not source_items:
+        print(f"No input found for pipeline stage '{first_stage}'. Nothing to do.")
+        return
+
+    print(f"Running pipeline {' -> '.join(stage_names)} over {len(source_items)} work items...")
+    # OCR JSON parsing is CPU-bound, so threads alone would serialize on the GIL
+    process_pool = ProcessPoolExecutor(max_workers=process_workers) if 'process_ocr_json' in stage_names and process_workers > 1 else None
+    synced_dirs = get_synced_stage_dirs(run_state, config, pdf_name, stage_names)
+    wall_seconds = run_stages(stages, source_items)
+    mark_stage_dirs_synced(run_state, synced_dirs)
+
+    ocr_session.close()
+    llm_session.close()
+    if process_pool is not None:
+        process_pool.shutdown()
+    if ocr_cache is not None:
+        ocr_cache.save()
+        print(f"OCR cache: {ocr_cache.summary()}")
+    if llm_cache is not None:
+        llm_cache.save()
+        print(f"LLM cleanup cache: {llm_cache.summary()}")
+
+    failed_stage = next((stage for stage in stages if stage.error is not None), None)
+    if failed_stage is not None:
+        print(f"❌ Pipeline stopped after {wall_seconds:.1f}s: stage {failed_stage.name} failed ({failed_stage.error})")
+    else:
+        print(f"✅ Pipeline finished in {wall_seconds:.1f}s")
+    for stage in stages:
+        print(f"  {stage.summary()}")
+
+    if combined_text and 'process_ocr_json' in stage_names and failed_stage is None:
+        raw_text_paths = get_stage_files(run_state, 'process_ocr_json', get_stage_output_dir(config, pdf_name, 'process_ocr_json'), pdf_name, start_page, end_page, 'txt')
+        if raw_text_paths:
+            write_combined_text(config, [(raw_text_path, None) for raw_text_path in raw_text_paths])
 
 def main():
     global config
@@ -561,16 +1310,16 @@ def main():
     parser.add_argument(
         "--pdf_file",
         type=str,
-        required=True,
-        help="Path to the PDF file to process. Can be a full path or a filename within pdf_dir."
+        default=None,
+        help="Path to the PDF file to process. Can be a full path or a filename within pdf_dir.\nRequired by every action except prune_ocr_cache."
     )
     parser.add_argument(
         "--actions",
         type=str,
         nargs='+',
-        choices=['extract_images', 'ocr_images', 'llm_cleanup_text', 'process_ocr_json'],
+        choices=['extract_images', 'ocr_images', 'llm_cleanup_text', 'process_ocr_json', 'prune_ocr_cache'],
         required=True,
-        help="List of actions to perform (e.g., --actions extract_images ocr_images llm_cleanup_text).\nAvailable actions:\n  - extract_images: Converts PDF pages to images and caches them.\n  - ocr_images: Performs OCR on images and saves the raw text output.\n  - llm_cleanup_text: Cleans and formats raw text files into markdown using an LLM.\n  - process_ocr_json: Processes raw OCR JSON files into ordered text blocks."
+        help="List of actions to perform (e.g., --actions extract_images ocr_images llm_cleanup_text).\nAvailable actions:\n  - extract_images: Converts PDF pages to images and caches them.\n  - ocr_images: Performs OCR on images and saves the raw text output.\n  - llm_cleanup_text: Cleans and formats raw text files into markdown using an LLM.\n  - process_ocr_json: Processes raw OCR JSON files into ordered text blocks.\n  - prune_ocr_cache: Removes OCR cache entries no longer referenced by any page."
     )
     parser.add_argument(
         "--start_page",
@@ -584,6 +1333,39 @@ def main():
         default=None,
         help="Ending page number for PDF processing (inclusive)."
     )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Stream pages through the selected actions concurrently instead of running each action over all pages in turn."
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip pages whose recorded output for an action is still current, redoing only changed or failed pages."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of parallel workers for extract_images and process_ocr_json. Overrides settings.extract_workers and settings.process_workers in the config file."
+    )
+    parser.add_argument(
+        "--combined_text",
+        action="store_true",
+        help="With process_ocr_json, also write all page texts in page order to <pdf>/<pdf>_raw_text.txt."
+    )
+    parser.add_argument(
+        "--ocr_concurrency",
+        type=int,
+        default=None,
+        help="Number of OCR requests kept in flight by ocr_images. Overrides settings.ocr_concurrency in the config file."
+    )
+    parser.add_argument(
+        "--llm_concurrency",
+        type=int,
+        default=None,
+        help="Number of pages cleaned at once by llm_cleanup_text. Overrides settings.llm_concurrency in the config file."
+    )
 
     args = parser.parse_args()
 
@@ -597,6 +1379,21 @@ def main():
         print(f"Configuration error: Missing key in config file - {e}")
         sys.exit(1)
 
+    if args.workers is not None:
+        config['settings']['extract_workers'] = args.workers
+        config['settings']['process_workers'] = args.workers
+    if args.ocr_concurrency is not None:
+        config['settings']['ocr_concurrency'] = args.ocr_concurrency
+    if args.llm_concurrency is not None:
+        config['settings']['llm_concurrency'] = args.llm_concurrency
+
+    # The OCR cache is shared by all PDFs, so pruning it alone needs no PDF
+    if set(args.actions) == {'prune_ocr_cache'}:
+        action_prune_ocr_cache(config)
+        return
+    if args.pdf_file is None:
+        parser.error("--pdf_file is required for actions other than prune_ocr_cache")
+
     # Resolve pdf_path: if not absolute, use pdf_dir from config
     pdf_path = args.pdf_file
     if not os.path.isabs(pdf_path):
@@ -624,9 +1421,21 @@ def main():
     # os.makedirs(config['paths']['ocr_marked_image_dir'], exist_ok=True) # Removed as it's now created per PDF
     # os.makedirs(config['paths']['doc_preprocessing_image_dir'], exist_ok=True) # Removed as it's now created per PDF
 
+    run_state = open_run_state(config, pdf_name, resume=args.resume)
+
+    if args.pipeline:
+        stage_names = [action for action in PIPELINE_STAGES if action in actions]
+        if stage_names:
+            run_pipeline(config, pdf_path, stage_names, args.start_page, args.end_page, run_state, args.combined_text)
+        # Anything that isn't a page stage still runs afterwards
+        actions = [action for action in actions if action not in PIPELINE_STAGES]
+
     for action in actions:
+        # Directories the run state matches before the action still match after its recorded writes
+        synced_dirs = get_synced_stage_dirs(run_state, config, pdf_name, [action])
         if action == "extract_images":
-            current_image_paths = action_extract_images(config, pdf_path, args.start_page, args.end_page)
+            current_image_paths = action_extract_images(config, pdf_path, args.start_page, args.end_page, run_state)
+            mark_stage_dirs_synced(run_state, synced_dirs)
             if not current_image_paths:
                 print(f"Action '{action}' resulted in no images. Stopping further actions.")
                 break
@@ -635,11 +1444,12 @@ def main():
                 print(f"Action '{action}' requires images from a previous step (e.g., 'extract_images').")
                 print(f"Attempting to load existing images from {config['paths']['image_dir']}...")
                 image_load_path = os.path.join(config['paths']['image_dir'], pdf_name)
-                current_image_paths = get_existing_files_for_pdf(image_load_path, pdf_name, args.start_page, args.end_page, 'png')
+                current_image_paths = get_stage_files(run_state, 'extract_images', image_load_path, pdf_name, args.start_page, args.end_page, 'png')
                 if not current_image_paths:
                     print(f"No existing images found. Skipping action '{action}'.")
                     continue
-            action_ocr_images(config, current_image_paths) # This action no longer returns paths
+            action_ocr_images(config, current_image_paths, run_state) # This action no longer returns paths
+            mark_stage_dirs_synced(run_state, synced_dirs)
             # The next step (process_ocr_json) will scan for the JSON files itself
             current_ocr_json_paths = [] # Clear for explicit scanning by next action
 
@@ -649,11 +1459,12 @@ def main():
                 print(f"Attempting to load existing OCR JSON files from {config['paths']['ocr_output_dir']}...")
                 # When loading OCR JSON files, we need to specify the correct subdirectory
                 ocr_json_load_path = os.path.join(config['paths']['ocr_output_dir'], pdf_name, "json")
-                current_ocr_json_paths = get_existing_files_for_pdf(ocr_json_load_path, pdf_name, args.start_page, args.end_page, 'json')
+                current_ocr_json_paths = get_stage_files(run_state, 'ocr_images', ocr_json_load_path, pdf_name, args.start_page, args.end_page, 'json')
                 if not current_ocr_json_paths:
                     print(f"No existing OCR JSON files found. Skipping action '{action}'.")
                     continue
-            current_raw_text_paths = action_process_ocr_json(config, current_ocr_json_paths)
+            current_raw_text_paths = action_process_ocr_json(config, current_ocr_json_paths, run_state, args.combined_text)
+            mark_stage_dirs_synced(run_state, synced_dirs)
             if not current_raw_text_paths:
                 print(f"Action '{action}' resulted in no ordered text files. Stopping further actions.")
                 break
@@ -663,13 +1474,18 @@ def main():
                 # Update this path to reflect the new structure
                 raw_text_load_path = os.path.join(config['paths']['ocr_output_dir'], pdf_name, "raw_text")
                 print(f"Attempting to load existing raw text files from {raw_text_load_path}...")
-                current_raw_text_paths = get_existing_files_for_pdf(raw_text_load_path, pdf_name, args.start_page, args.end_page, 'txt')
+                current_raw_text_paths = get_stage_files(run_state, 'process_ocr_json', raw_text_load_path, pdf_name, args.start_page, args.end_page, 'txt')
                 if not current_raw_text_paths:
                     print(f"No existing raw text files found. Skipping action '{action}'.")
                     continue
-            action_llm_cleanup_text(config, current_raw_text_paths)
+            action_llm_cleanup_text(config, current_raw_text_paths, run_state)
+        elif action == "prune_ocr_cache":
+            action_prune_ocr_cache(config)
         else:
             print(f"Unknown action: {action}. Skipping.")
 
+    print(f"Run state: {run_state.summary()}")
+    run_state.close()
+
 if __name__ == "__main__":
     main()
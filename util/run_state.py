@@ -0,0 +1,207 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stage_outputs (
+    stage TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    output_path TEXT,
+    input_hash TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (stage, page)
+);
+CREATE TABLE IF NOT EXISTS scanned_stages (
+    stage TEXT PRIMARY KEY,
+    scanned_at REAL NOT NULL
+);
+"""
+
+def hash_file(path, *extra):
+    """Hashes a file's contents together with any extra parameters that affect its output."""
+    digest = hashlib.sha256()
+    for part in extra:
+        digest.update(repr(part).encode("utf-8"))
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def fingerprint_file(path):
+    """Cheap stand-in for a content hash of large inputs: size and modification time."""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+def get_page_number(path):
+    """Parses the page number from a cached file name (pdfname_XXXXXX.ext or pdfname_pgN.ext)."""
+    match = re.search(r'(\d+)\.\w+$', os.path.basename(path))
+    return int(match.group(1)) if match else None
+
+class RunState:
+    """SQLite-backed record of what each stage produced for each page of one PDF.
+
+    Every stage output is stored with the hash of the input it was produced from, so a
+    resumed run can skip pages whose output is still current and redo only changed or
+    failed ones. Looking up a stage's outputs for a page range is an index query instead
+    of a directory listing.
+    """
+    def __init__(self, db_path, resume=False):
+        self.db_path = db_path
+        self.resume = resume
+        self.lock = threading.Lock()
+        self.skipped = 0
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def is_scanned(self, stage):
+        """True once the stage's existing files have been imported from disk."""
+        return self.get_scanned_at(stage) is not None
+
+    def get_scanned_at(self, stage):
+        """Returns the scanned_at recorded by the stage's last import_outputs, or None if never scanned."""
+        with self.lock:
+            row = self.conn.execute("SELECT scanned_at FROM scanned_stages WHERE stage = ?", (stage,)).fetchone()
+        return row[0] if row is not None else None
+
+    def mark_scanned(self, stage, scanned_at):
+        """Records that the stage's outputs match its directory as of scanned_at, without
+        listing it, e.g. after a run whose every write was recorded.
+        """
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO scanned_stages (stage, scanned_at) VALUES (?, ?)", (stage, scanned_at))
+            self.conn.commit()
+
+    def import_outputs(self, stage, output_paths, scanned_at=None):
+        """Syncs a stage's recorded outputs with the files found on disk: backfills outputs
+        made before the state database existed or by untracked runs, and forgets recorded
+        outputs that have since been deleted. scanned_at (by default the current time) marks
+        the state of the directory that was listed, e.g. its modification time before listing.
+        Returns the number of outputs newly recorded.
+        """
+        now = time.time()
+        rows = [(stage, get_page_number(path), path, now) for path in output_paths if get_page_number(path) is not None]
+        with self.lock:
+            recorded = self.conn.execute(
+                "SELECT page, output_path FROM stage_outputs WHERE stage = ? AND status = 'done'", (stage,)
+            ).fetchall()
+            vanished = [(stage, page) for page, output_path in recorded if not output_path or not os.path.exists(output_path)]
+            self.conn.executemany("DELETE FROM stage_outputs WHERE stage = ? AND page = ?", vanished)
+            changes = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO stage_outputs (stage, page, output_path, status, updated_at) VALUES (?, ?, ?, 'done', ?)",
+                rows
+            )
+            imported = self.conn.total_changes - changes
+            self.conn.execute("INSERT OR REPLACE INTO scanned_stages (stage, scanned_at) VALUES (?, ?)", (stage, now if scanned_at is None else scanned_at))
+            self.conn.commit()
+        return imported
+
+    def get_outputs(self, stage, start_page=None, end_page=None):
+        """Returns the recorded output paths of a stage for a page range, ordered by page.
+        Outputs deleted since they were recorded are only forgotten by import_outputs.
+        """
+        query = "SELECT output_path FROM stage_outputs WHERE stage = ? AND status = 'done' AND page >= ? AND page <= ? ORDER BY page"
+        with self.lock:
+            rows = self.conn.execute(query, (stage, start_page or 0, end_page or 2**31)).fetchall()
+        return [row[0] for row in rows if row[0]]
+
+    def get_failed_pages(self, stage):
+        with self.lock:
+            rows = self.conn.execute("SELECT page, error FROM stage_outputs WHERE stage = ? AND status = 'failed' ORDER BY page", (stage,)).fetchall()
+        return rows
+
+    def is_current(self, stage, page, input_path, input_hash):
+        """True if the stage already has an output for page made from this exact input."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT output_path, input_hash, status FROM stage_outputs WHERE stage = ? AND page = ?",
+                (stage, page)
+            ).fetchone()
+        if row is None:
+            return False
+        output_path, recorded_hash, status = row
+        if status != 'done' or not output_path or not os.path.exists(output_path):
+            return False
+        if recorded_hash is None:
+            # Imported output with unknown provenance: trust it if it is newer than its input
+            if os.path.getmtime(output_path) < os.path.getmtime(input_path):
+                return False
+            self.record_success(stage, page, output_path, input_hash)
+            return True
+        return recorded_hash == input_hash
+
+    def record_success(self, stage, page, output_path, input_hash=None):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO stage_outputs (stage, page, output_path, input_hash, status, error, updated_at) VALUES (?, ?, ?, ?, 'done', NULL, ?)",
+                (stage, page, output_path, input_hash, time.time())
+            )
+            self.conn.commit()
+
+    def record_failure(self, stage, page, input_hash=None, error=None):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO stage_outputs (stage, page, output_path, input_hash, status, error, updated_at) VALUES (?, ?, NULL, ?, 'failed', ?, ?)",
+                (stage, page, input_hash, error, time.time())
+            )
+            self.conn.commit()
+
+    def get_current_output(self, stage, input_path, *extra):
+        """When resuming, returns the recorded output for input_path's page if it was made
+        from this exact input and still exists. Returns None otherwise.
+        """
+        page = get_page_number(input_path)
+        if not self.resume or page is None:
+            return None
+        if not self.is_current(stage, page, input_path, hash_file(input_path, *extra)):
+            return None
+        with self.lock:
+            self.skipped += 1
+            row = self.conn.execute("SELECT output_path FROM stage_outputs WHERE stage = ? AND page = ?", (stage, page)).fetchone()
+        print(f"Skipping {stage} for page {page}: output is up to date")
+        return row[0]
+
+    def record_result(self, stage, input_path, output_path, error=None, extra=()):
+        """Records the outcome of producing a stage's output for the page in input_path."""
+        page = get_page_number(input_path)
+        if page is None:
+            return
+        input_hash = hash_file(input_path, *extra)
+        if output_path:
+            self.record_success(stage, page, output_path, input_hash)
+        else:
+            self.record_failure(stage, page, input_hash, error or "no output produced")
+
+    def run_item(self, stage, input_path, func, *extra):
+        """Runs func to produce a stage's output for the page in input_path and records the result.
+        When resuming, pages whose recorded output is current are skipped and their output returned.
+        """
+        current_output = self.get_current_output(stage, input_path, *extra)
+        if current_output is not None:
+            return current_output
+
+        try:
+            output_path = func()
+        except Exception as e:
+            self.record_result(stage, input_path, None, str(e), extra)
+            raise
+        self.record_result(stage, input_path, output_path, extra=extra)
+        return output_path
+
+    def summary(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT stage, status, COUNT(*) FROM stage_outputs GROUP BY stage, status ORDER BY stage, status").fetchall()
+        counts = ", ".join(f"{stage} {status}: {count}" for stage, status, count in rows)
+        return f"{counts or 'empty'} ({self.skipped} pages skipped as up to date)"
@@ -0,0 +1,144 @@
+import argparse
+import csv
+import json
+import os
+import sys
+
+from spell_csv import iter_spell_rows, make_projection
+from spell_data_analyzer import SchoolValidator
+from spell_dumper import SPELL_CLASSES
+from spell_field_size import KEYS_TO_COUNT
+from spell_parser import parse_full_refer
+
+class FieldLengthReport:
+    """Longest non-blank value of each field, as spell_field_size prints it."""
+    name = 'field_lengths'
+    extension = 'json'
+
+    def __init__(self, columns=KEYS_TO_COUNT):
+        self.columns = list(columns)
+        self.max_lengths = {}
+
+    def add(self, values):
+        for column, value in zip(self.columns, values):
+            if value and value.strip() and len(value) > self.max_lengths.get(column, -1):
+                self.max_lengths[column] = len(value)
+
+    def result(self):
+        return self.max_lengths
+
+    def write(self, output):
+        json.dump(self.result(), output, indent=2)
+
+class SchoolReport:
+    """Distinct School values with unknown schools, subschools or descriptors and how many
+    rows have each, from a SchoolValidator.
+    """
+    name = 'schools'
+    extension = 'json'
+    columns = ['School']
+
+    def __init__(self):
+        self.validator = SchoolValidator()
+
+    def add(self, values):
+        if values[0] is not None:
+            self.validator.add(values[0])
+
+    def result(self):
+        return self.validator.report()
+
+    def write(self, output):
+        json.dump(self.result(), output, indent=2)
+
+class ClassLevelReport:
+    """One [spell, class, level] row per class that has the spell, as spell_dumper writes them."""
+    name = 'class_levels'
+    extension = 'csv'
+
+    def __init__(self, classes=SPELL_CLASSES):
+        self.classes = list(classes)
+        self.columns = ['Spell Name', *self.classes]
+        self.rows = []
+
+    def add(self, values):
+        name = values[0]
+        for c, level in zip(self.classes, values[1:]):
+            if level and level.strip():
+                self.rows.append([name, c, level])
+
+    def result(self):
+        return self.rows
+
+    def write(self, output):
+        csv.writer(output, quoting=csv.QUOTE_ALL).writerows(self.rows)
+
+class SourceBookReport:
+    """Number of spells referencing each source book in Full Refer, most referenced first."""
+    name = 'source_books'
+    extension = 'json'
+    columns = ['Full Refer']
+
+    def __init__(self):
+        self.counts = {}
+
+    def add(self, values):
+        if not values[0]:
+            return
+        for book in {source['Book'] for source in parse_full_refer(values[0])}:
+            self.counts[book] = self.counts.get(book, 0) + 1
+
+    def result(self):
+        return dict(sorted(self.counts.items(), key=lambda item: (-item[1], item[0])))
+
+    def write(self, output):
+        json.dump(self.result(), output, indent=2)
+
+REPORTS = {report.name: report for report in (FieldLengthReport, SchoolReport, ClassLevelReport, SourceBookReport)}
+
+def run_reports(file_path, reports):
+    """Feeds every row of a spell CSV export to every report in one pass over the file.
+    The CSV is read once for the union of the reports' columns; each report gets a tuple of
+    its own columns. Returns the number of rows read.
+    """
+    columns = list(dict.fromkeys(column for report in reports for column in report.columns))
+    # The rows below never miss a column, so the projections never reach their padding slot
+    projections = [(report, make_projection(columns, report.columns)) for report in reports]
+    row_count = 0
+    for row in iter_spell_rows(file_path, columns):
+        for report, project in projections:
+            report.add(project(row))
+        row_count += 1
+    return row_count
+
+def main():
+    parser = argparse.ArgumentParser(description='Audit a spell CSV export: read it once and build every requested report.')
+    parser.add_argument('-f', '--file', help='Path to the CSV file', required=True)
+    parser.add_argument('-r', '--reports', nargs='+', choices=list(REPORTS), default=list(REPORTS), help='Reports to build (default: all)')
+    parser.add_argument('-o', '--output_dir', help='Write each report to <name>.json or <name>.csv in this directory')
+    parser.add_argument('--bundle', help='Write all reports as one JSON object to this path; without it or --output_dir the bundle goes to stdout')
+    args = parser.parse_args()
+
+    reports = [REPORTS[name]() for name in args.reports]
+    row_count = run_reports(args.file, reports)
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        for report in reports:
+            path = os.path.join(args.output_dir, f'{report.name}.{report.extension}')
+            with open(path, 'w', newline='', encoding='utf-8') as output:
+                report.write(output)
+            print(f'Report {report.name} saved to {path}', file=sys.stderr)
+    if args.bundle or not args.output_dir:
+        bundle = {'rows': row_count, **{report.name: report.result() for report in reports}}
+        if args.bundle:
+            with open(args.bundle, 'w', encoding='utf-8') as output:
+                json.dump(bundle, output, indent=2)
+            print(f'Reports saved to {args.bundle}', file=sys.stderr)
+        else:
+            json.dump(bundle, sys.stdout, indent=2)
+            print()
+    print(f'Audited {row_count} rows in one pass', file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
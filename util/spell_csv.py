@@ -0,0 +1,74 @@
+"""Streaming reader for the all_spells.csv spreadsheet export used by the spell CSV tools."""
+import csv
+from collections import defaultdict
+from operator import itemgetter
+
+SPELL_CSV_ENCODING = 'cp1252'
+
+def make_unique_headers(headers):
+    """Renames repeated headers by appending how often they were seen before: Level, Level1, Level2."""
+    counter = defaultdict(int)
+    unique_headers = []
+
+    for h in headers:
+        if counter[h] == 0:
+            unique_headers.append(h)
+        else:
+            unique_headers.append(f"{h}{counter[h]}")
+        counter[h] += 1
+    return unique_headers
+
+def make_projection(headers, columns):
+    """Returns a function taking a row padded to len(headers) + 1 values (the last one None)
+    to a tuple of its values for columns. Columns missing from headers project to None.
+    """
+    positions = {header: index for index, header in enumerate(headers)}
+    indexes = [positions.get(column, len(headers)) for column in columns]
+    if len(indexes) == 1:
+        index = indexes[0]
+        return lambda row: (row[index],)
+    return itemgetter(*indexes)
+
+def read_spell_csv_headers(file_path, encoding=SPELL_CSV_ENCODING):
+    """Returns the unique headers of a spell CSV export."""
+    with open(file_path, newline='', encoding=encoding) as csvfile:
+        return make_unique_headers(next(csv.reader(csvfile), []))
+
+def header_ordered(file_path, columns, encoding=SPELL_CSV_ENCODING):
+    """Returns columns sorted by where they appear in a spell CSV export's header, with
+    columns it lacks last. If the file cannot be read, columns come back as given.
+    """
+    try:
+        headers = read_spell_csv_headers(file_path, encoding)
+    except OSError:
+        # iter_spell_rows reports the error when the rows are read
+        return list(columns)
+    positions = {header: index for index, header in enumerate(headers)}
+    return sorted(columns, key=lambda column: positions.get(column, len(positions)))
+
+def iter_spell_rows(file_path, columns, encoding=SPELL_CSV_ENCODING):
+    """Yields a tuple of the values of columns, in that order, for each row of a spell CSV export.
+
+    Rows are read one at a time and projected through column indexes computed once from the
+    header, so memory stays flat and no per-row dict is built. Repeated headers are renamed
+    as by make_unique_headers. Columns the file does not have, and values missing from short
+    rows, are None. Errors opening or reading the file are printed and end the rows.
+    """
+    try:
+        with open(file_path, newline='', encoding=encoding) as csvfile:
+            reader = csv.reader(csvfile)
+            headers = make_unique_headers(next(reader, []))
+            width = len(headers)
+            project = make_projection(headers, columns)
+
+            for row in reader:
+                if len(row) < width:
+                    row.extend([None] * (width - len(row)))
+                elif len(row) > width:
+                    del row[width:]
+                row.append(None)
+                yield project(row)
+    except FileNotFoundError:
+        print(f"Error: File '{file_path}' not found.")
+    except Exception as e:
+        print(f'An error occurred: {e}')
@@ -1,41 +1,12 @@
-import csv
-import argparse, re
-from collections import defaultdict
+import argparse, json, re
 
-def make_unique_headers(headers):
-    counter = defaultdict(int)
-    unique_headers = []
-    
-    for h in headers:
-        if counter[h] == 0:
-            unique_headers.append(h)
-        else:
-            unique_headers.append(f"{h}{counter[h]}")
-        counter[h] += 1
-    return unique_headers
+from spell_csv import iter_spell_rows
 
-def parse_csv_to_dicts(file_path):
-    data = []
-    try:
-        with open(file_path, newline='', encoding='cp1252') as csvfile:
-            reader = csv.reader(csvfile)
-            raw_headers = next(reader)
-            headers = make_unique_headers(raw_headers)
-            
-            for row in reader:
-                row_dict = dict(zip(headers, row))
-                data.append(row_dict)
-        return data
-    except FileNotFoundError:
-        print(f"Error: File '{file_path}' not found.")
-        return []
-    except Exception as e:
-        print(f'An error occurred: {e}')
-        return []
+# school[/school...][subschool][descriptor,descriptor...] with optional trailing asterisks
+SCHOOL_STRING_RE = re.compile(r'^([^\[\]]+)(?:\[([^\[\]]*)\])?(?:\[([^\[\]]*)\])?\**$')
 
 def parse_school_string(val):
-    pattern = r'^([^\[\]]+)(?:\[([^\[\]]*)\])?(?:\[([^\[\]]*)\])?\**$'
-    match = re.match(pattern, val)
+    match = SCHOOL_STRING_RE.match(val)
     if match:
         school = match.group(1)
         subschool = match.group(2)
@@ -45,108 +16,150 @@ def parse_school_string(val):
         print(f'ERROR: Invalid Format: "{val}"')
         return ['','','']
 
-def main():
-    spell_descriptors = ['acid', 'air', 'chaotic', 'cold', 'darkness', 'death', 'earth', 'electricity', 'evil', 'fear', 'fire', 'force', 'good', 'language-dependent', 'lawful', 'light', 'mind-affecting', 'sonic', 'water', 'see text']
-    spell_desc_indx = {desc: i for i, desc in enumerate(spell_descriptors)}
-    spell_schools = {
-        'uni': {
-            'school': 'universal',
-            'id': 9
-        },
-        'inv': {
-            'school': 'invocation',
-            'subschools': {'least': 14, 'lesser': 15, 'greater': 16, 'dark': 17},
-            'id': 10
-        },
-        'eld': {
-            'school': 'invocation',
-            'subschools': {'least': 14, 'lesser': 15, 'greater': 16, 'dark': 17},
-            'descriptor': {'eldritch essence': 21},
-            'id': 10
-        },
-        'bla': {
-            'school': 'invocation',
-            'subschools': {'least': 14, 'lesser': 15, 'greater': 16, 'dark': 17},
-            'descriptor': {'blast shape': 22},
-            'id': 10
-        },
-        'abj': {
-            'school': 'abjuration',
-            'id': 1
-        },
-        'con': {
-            'school': 'conjuration',
-            'id': 2,
-            'subschools': {'calling': 1, 'creation': 2, 'healing': 3, 'summoning': 4, 'teleportation': 5}
-        },
-        'div': {
-            'school': 'divination',
-            'id': 3,
-            'subschools': {'scrying': 6}
-        },
-        'en': {
-            'school': 'enchantment',
-            'id': 4,
-            'subschools': {'charm': 7, 'compulsion': 8}
-        },
-        'evo': {
-            'school': 'evocation',
-            'id': 5
-        },
-        'ill': {
-            'school': 'illusion',
-            'id': 6,
-            'subschools': {'figment': 9, 'glamer': 10, 'pattern': 11, 'phantasm': 12, 'shadow': 13}
-        },
-        'nec': {
-            'school': 'necromancy',
-            'id': 7
-        },
-        'tra': {
-            'school': 'transmutation',
-            'id': 8
-        }
+SPELL_DESCRIPTORS = ['acid', 'air', 'chaotic', 'cold', 'darkness', 'death', 'earth', 'electricity', 'evil', 'fear', 'fire', 'force', 'good', 'language-dependent', 'lawful', 'light', 'mind-affecting', 'sonic', 'water', 'see text']
+SPELL_SCHOOLS = {
+    'uni': {
+        'school': 'universal',
+        'id': 9
+    },
+    'inv': {
+        'school': 'invocation',
+        'subschools': {'least': 14, 'lesser': 15, 'greater': 16, 'dark': 17},
+        'id': 10
+    },
+    'eld': {
+        'school': 'invocation',
+        'subschools': {'least': 14, 'lesser': 15, 'greater': 16, 'dark': 17},
+        'descriptor': {'eldritch essence': 21},
+        'id': 10
+    },
+    'bla': {
+        'school': 'invocation',
+        'subschools': {'least': 14, 'lesser': 15, 'greater': 16, 'dark': 17},
+        'descriptor': {'blast shape': 22},
+        'id': 10
+    },
+    'abj': {
+        'school': 'abjuration',
+        'id': 1
+    },
+    'con': {
+        'school': 'conjuration',
+        'id': 2,
+        'subschools': {'calling': 1, 'creation': 2, 'healing': 3, 'summoning': 4, 'teleportation': 5}
+    },
+    'div': {
+        'school': 'divination',
+        'id': 3,
+        'subschools': {'scrying': 6}
+    },
+    'en': {
+        'school': 'enchantment',
+        'id': 4,
+        'subschools': {'charm': 7, 'compulsion': 8}
+    },
+    'evo': {
+        'school': 'evocation',
+        'id': 5
+    },
+    'ill': {
+        'school': 'illusion',
+        'id': 6,
+        'subschools': {'figment': 9, 'glamer': 10, 'pattern': 11, 'phantasm': 12, 'shadow': 13}
+    },
+    'nec': {
+        'school': 'necromancy',
+        'id': 7
+    },
+    'tra': {
+        'school': 'transmutation',
+        'id': 8
+    }
+}
+
+class SchoolValidator:
+    """Validates School values against the known schools, subschools and descriptors.
+
+    The grammar is compiled once and the lookups are sets and dicts. The spreadsheet has
+    thousands of rows but only a few hundred distinct School values, so each distinct value
+    is parsed and validated once and the result reused. add() counts rows per distinct
+    invalid value; report() summarizes them.
+    """
+    def __init__(self, schools=None, descriptors=None):
+        self.schools = SPELL_SCHOOLS if schools is None else schools
+        self.descriptors = frozenset(SPELL_DESCRIPTORS if descriptors is None else descriptors)
+        self.subschools = {abbr: frozenset(school.get('subschools', ())) for abbr, school in self.schools.items() if 'subschools' in school}
+        self.validated = {}  # value -> unknown parts, empty when valid
+        self.rows = 0
+        self.invalid_counts = {}
+
+    def validate(self, val):
+        """Returns the unknown parts of a School value, e.g. {'school': 'xyz'} or
+        {'descriptor': ['zzz']}; empty when the value is valid. The result is shared
+        between calls for the same value and must not be modified.
+        """
+        invalid = self.validated.get(val)
+        if invalid is not None:
+            return invalid
+        invalid = {}
+        [schools, subschool, descriptor] = parse_school_string(val)
+        for school in schools.split('/'):
+            if school in self.schools:
+                subschools = self.subschools.get(school)
+                if subschool and subschools is not None and subschool not in subschools:
+                    if not descriptor:
+                        # a single bracket may hold descriptors instead of a subschool
+                        descriptor = subschool
+                    else:
+                        invalid['subschool'] = subschool
+                if descriptor:
+                    invalid_desc = [desc for desc in descriptor.split(',') if desc not in self.descriptors]
+                    if invalid_desc:
+                        invalid['descriptor'] = invalid_desc
+            else:
+                invalid['school'] = school
+        self.validated[val] = invalid
+        return invalid
+
+    def add(self, val):
+        """Validates one row's School value and counts it. Returns its unknown parts."""
+        self.rows += 1
+        invalid = self.validate(val)
+        if invalid:
+            self.invalid_counts[val] = self.invalid_counts.get(val, 0) + 1
+        return invalid
+
+    def report(self):
+        """Row and distinct value counts, and each distinct invalid value with its unknown
+        parts and row count, most frequent first.
+        """
+        invalid_values = sorted(self.invalid_counts.items(), key=lambda item: (-item[1], item[0]))
+        return {
+            'rows': self.rows,
+            'distinct_values': len(self.validated),
+            'invalid_rows': sum(self.invalid_counts.values()),
+            'invalid_values': {val: {'count': count, 'invalid': self.validated[val]} for val, count in invalid_values},
         }
 
+def main():
     parser = argparse.ArgumentParser(description='Parse a CSV file.')
     parser.add_argument('-f', '--file', help='Path to the CSV file', required=True)
+    parser.add_argument('-o', '--output', help='Write the JSON report to this path instead of stdout')
     args = parser.parse_args()
-    
+
     check_column = 'School'
-    value_list = []
-    records = parse_csv_to_dicts(args.file)
-    for record in records:
-        if check_column in record:
-            not_found = False
-            invalid = {}
-            val = record[check_column]
-            [schools, subschool, descriptor] = parse_school_string(val)
-            school_list = schools.split('/')
-            for school in school_list:
-                if school in spell_schools:
-                    if subschool and 'subschools' in spell_schools[school]:
-                        if subschool not in spell_schools[school]['subschools']:
-                            if not descriptor:
-                                descriptor = subschool
-                            else:
-                                invalid['subschool'] = subschool
-                                not_found = True
-                    if descriptor:
-                        input_desc = descriptor.split(',')
-                        invalid_desc = [desc for desc in input_desc if desc not in spell_descriptors]
-                        if bool(invalid_desc):
-                            invalid['descriptor'] = invalid_desc
-                            not_found = True
-                else:
-                    invalid['school'] = school
-                    not_found = True
+    validator = SchoolValidator()
+    for (val,) in iter_spell_rows(args.file, [check_column]):
+        if val is not None:
+            validator.add(val)
 
-            if not_found:
-                if val not in value_list:
-                    value_list.append({val: invalid})
-    if value_list:
-        for v in value_list:
-            print(v)
+    report = validator.report()
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"{len(report['invalid_values'])} invalid School values in {report['invalid_rows']} of {report['rows']} rows. Report saved to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
 
 if __name__ == '__main__':
     main()
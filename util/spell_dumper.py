@@ -1,131 +1,189 @@
-import csv, sys, re
+import csv, sys
 import argparse
-from collections import defaultdict
-
-def make_unique_headers(headers):
-    counter = defaultdict(int)
-    unique_headers = []
-    
-    for h in headers:
-        if counter[h] == 0:
-            unique_headers.append(h)
+import contextlib
+import os
+
+from spell_csv import iter_spell_rows
+from spell_matcher import db_name_key
+
+SPELL_CLASSES = ['Adept', 'Apostle of Peace', 'Archivist', 'Artificer', 'Assassin', 'Bard', 'Beguiler', 'Beloved of Valarian', 'Blackguard', 'Blighter', 'Champion of Gwynharwyf', 'Cleric', 'Consecrated Harrier', 'Corrupt Avenger', 'Death Delver', 'Demonologist', 'Disciple of Thrym', 'Divine Crusader', 'Dread Necromancer', 'Druid', 'Duskblade', 'Emissary of Barachiel', 'Fatemaker', 'Favored Soul', 'Friar', 'Gnome Artificer', 'Healer', 'Hexblade', 'Hoardstealer', 'Holy Liberator', 'Hunter of the Dead', 'Knight of the Chalice', 'Mortal Hunter', 'Ocular Adept', 'Paladin', 'Pious Templar', 'Ranger', 'Shugenja', 'Slayer of Domiel', 'Sorcerer', 'Spellthief', 'Spirit Shaman', 'Sublime Chord', 'Suel Arcanamach', 'Temple Raider of Olidammara', 'Ur-Priest', 'Vassal of Bahamut', 'Vigilante', 'Warlock', 'Warmage', 'Wizard', 'Wu Jen']
+
+def iter_class_levels(file_path, classes=SPELL_CLASSES):
+    """Yields a (spell name, class, level) tuple for every class column with a level in each
+    row of a spell CSV export. The class columns are resolved to row positions once.
+    Rows without a spell name are skipped, since their levels can't be attached to a spell.
+    """
+    for name, *levels in iter_spell_rows(file_path, ['Spell Name', *classes]):
+        if not name:
+            continue
+        for c, level in zip(classes, levels):
+            if level and level.strip():
+                yield name, c, level
+
+class ClassLevelCsvWriter:
+    """Writes (spell, class, level) rows as fully quoted CSV."""
+    def __init__(self, output):
+        self.writer = csv.writer(output, quoting=csv.QUOTE_ALL)
+
+    def write(self, row):
+        self.writer.writerow(row)
+
+    def close(self):
+        pass
+
+# MySQL's LOAD DATA defaults: tab separated, newline terminated, backslash escaped
+TSV_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'})
+
+# Loads the TSV through a staging table, since it holds names rather than ids. Like
+# SpellLevelLoader it only resolves names of one edition when given one, skips names shared
+# by several rows and levels that are not plain numbers; names compare under the collation.
+LOAD_DATA_SQL = """CREATE TEMPORARY TABLE SpellLevelStaging (spellName VARCHAR(255), className VARCHAR(255), level VARCHAR(16));
+LOAD DATA LOCAL INFILE '{path}' INTO TABLE SpellLevelStaging (spellName, className, level);
+INSERT INTO SpellLevelMap (classId, spellId, level)
+    SELECT c.id, s.id, CAST(TRIM(st.level) AS UNSIGNED) FROM SpellLevelStaging st
+    JOIN (SELECT MIN(id) AS id, name FROM Class{edition_filter} GROUP BY name HAVING COUNT(*) = 1) c ON c.name = st.className
+    JOIN (SELECT MIN(id) AS id, name FROM Spell{edition_filter} GROUP BY name HAVING COUNT(*) = 1) s ON s.name = st.spellName
+    WHERE TRIM(st.level) REGEXP '^[0-9]+$'
+    ON DUPLICATE KEY UPDATE level = VALUES(level);"""
+
+def load_data_sql(path, edition_id=None):
+    """Returns the statements loading a TSV written by ClassLevelTsvWriter into SpellLevelMap."""
+    edition_filter = f" WHERE editionId = {int(edition_id)}" if edition_id is not None else ""
+    return LOAD_DATA_SQL.format(path=path, edition_filter=edition_filter)
+
+def parse_level(level):
+    """Returns a class level cell as an int, or None unless it is a plain number like '3'."""
+    level = level.strip()
+    return int(level) if level.isascii() and level.isdigit() else None
+
+class ClassLevelTsvWriter:
+    """Writes (spell, class, level) rows as a TSV that LOAD DATA reads with its default options."""
+    def __init__(self, output):
+        self.output = output
+
+    def write(self, row):
+        self.output.write('\t'.join(value.translate(TSV_ESCAPES) for value in row))
+        self.output.write('\n')
+
+    def close(self):
+        pass
+
+class SpellLevelLoader:
+    """Batch-inserts (spell, class, level) rows into SpellLevelMap.
+
+    Spell and class names are resolved to ids with one query per table up front, limited to
+    edition_id when given, and compared with db_name_key as the database compares them. Rows whose spell or class is unknown, whose name matches several
+    ids, or whose level is not a number are skipped and counted. Rows are sent with
+    executemany every batch_size rows and committed on close().
+    """
+    INSERT_SQL = "INSERT INTO SpellLevelMap (classId, spellId, level) VALUES (%s, %s, %s) ON DUPLICATE KEY UPDATE level = VALUES(level)"
+
+    def __init__(self, conn, batch_size=1000, edition_id=None):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.batch_size = batch_size
+        self.class_ids = self.load_ids('Class', edition_id)
+        self.spell_ids = self.load_ids('Spell', edition_id)
+        self.batch = []
+        self.inserted = 0
+        self.skipped = {'unknown_spell': set(), 'unknown_class': set(), 'ambiguous': set(), 'invalid_level': set()}
+
+    def load_ids(self, table, edition_id):
+        """Returns {name key: id} for a table; names shared by several rows map to None."""
+        if edition_id is None:
+            self.cursor.execute(f"SELECT id, name FROM {table}")
+        else:
+            self.cursor.execute(f"SELECT id, name FROM {table} WHERE editionId = %s", (edition_id,))
+        ids = {}
+        for row_id, name in self.cursor.fetchall():
+            key = db_name_key(name)
+            ids[key] = row_id if key not in ids else None
+        return ids
+
+    def write(self, row):
+        name, c, level = row
+        spell_id = self.spell_ids.get(db_name_key(name), 0)
+        class_id = self.class_ids.get(db_name_key(c), 0)
+        level_value = parse_level(level)
+        if spell_id == 0:
+            self.skipped['unknown_spell'].add(name)
+        elif class_id == 0:
+            self.skipped['unknown_class'].add(c)
+        elif spell_id is None or class_id is None:
+            self.skipped['ambiguous'].add(name if spell_id is None else c)
+        elif level_value is None:
+            self.skipped['invalid_level'].add(f'{name}: {c} {level}')
         else:
-            unique_headers.append(f"{h}{counter[h]}")
-        counter[h] += 1
-    return unique_headers
-
-def parse_csv_to_dicts(file_path):
-    data = []
-    try:
-        with open(file_path, newline='', encoding='cp1252') as csvfile:
-            reader = csv.reader(csvfile)
-            raw_headers = next(reader)
-            headers = make_unique_headers(raw_headers)
-            
-            for row in reader:
-                row_dict = dict(zip(headers, row))
-                data.append(row_dict)
-        return data
-    except FileNotFoundError:
-        print(f"Error: File '{file_path}' not found.")
-        return []
-    except Exception as e:
-        print(f'An error occurred: {e}')
-        return []
-
-def parse_school_string(val):
-    pattern = r'^([^\[\]]+)(?:\[([^\[\]]*)\])?(?:\[([^\[\]]*)\])?\**$'
-    match = re.match(pattern, val)
-    if match:
-        school = match.group(1)
-        subschool = match.group(2)
-        descriptor = match.group(3)
-        return school, subschool, descriptor
-    else:
-        print(f'ERROR: Invalid Format: "{val}"')
-        return ['','','']
+            self.batch.append((class_id, spell_id, level_value))
+            if len(self.batch) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        if self.batch:
+            self.cursor.executemany(self.INSERT_SQL, self.batch)
+            self.inserted += len(self.batch)
+            self.batch = []
+
+    def close(self):
+        self.flush()
+        self.conn.commit()
+        self.cursor.close()
+
+def write_class_levels(rows, writers):
+    """Writes every row to every writer, then closes the writers. Returns the number of rows."""
+    written = 0
+    for row in rows:
+        for writer in writers:
+            writer.write(row)
+        written += 1
+    for writer in writers:
+        writer.close()
+    return written
+
+def connect_database():
+    """Connects to the database named by DB_HOST, DB_USER, DB_PASS and DB_NAME in the environment or .env."""
+    # Only needed with --db, so the CSV and TSV outputs work without the MySQL packages
+    import mysql.connector
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return mysql.connector.connect(
+        host=os.getenv('DB_HOST'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASS'),
+        database=os.getenv('DB_NAME')
+    )
 
 def main():
-    spell_descriptors = ['acid', 'air', 'chaotic', 'cold', 'darkness', 'death', 'earth', 'electricity', 'evil', 'fear', 'fire', 'force', 'good', 'language-dependent', 'lawful', 'light', 'mind-affecting', 'sonic', 'water', 'see text']
-    spell_desc_indx = {desc: i for i, desc in enumerate(spell_descriptors, start=1)}
-    spell_schools = {
-        'uni': {
-            'school': 'universal',
-            'id': 9
-        },
-        'inv': {
-            'school': 'invocation',
-            'subschools': {'least': 14, 'lesser': 15, 'greater': 16, 'dark': 17},
-            'id': 10
-        },
-        'eld': {
-            'school': 'invocation',
-            'subschools': {'least': 14, 'lesser': 15, 'greater': 16, 'dark': 17},
-            'descriptor': {'eldritch essence': 21},
-            'id': 10
-        },
-        'bla': {
-            'school': 'invocation',
-            'subschools': {'least': 14, 'lesser': 15, 'greater': 16, 'dark': 17},
-            'descriptor': {'blast shape': 22},
-            'id': 10
-        },
-        'abj': {
-            'school': 'abjuration',
-            'id': 1
-        },
-        'con': {
-            'school': 'conjuration',
-            'id': 2,
-            'subschools': {'calling': 1, 'creation': 2, 'healing': 3, 'summoning': 4, 'teleportation': 5}
-        },
-        'div': {
-            'school': 'divination',
-            'id': 3,
-            'subschools': {'scrying': 6}
-        },
-        'en': {
-            'school': 'enchantment',
-            'id': 4,
-            'subschools': {'charm': 7, 'compulsion': 8}
-        },
-        'evo': {
-            'school': 'evocation',
-            'id': 5
-        },
-        'ill': {
-            'school': 'illusion',
-            'id': 6,
-            'subschools': {'figment': 9, 'glamer': 10, 'pattern': 11, 'phantasm': 12, 'shadow': 13}
-        },
-        'nec': {
-            'school': 'necromancy',
-            'id': 7
-        },
-        'tra': {
-            'school': 'transmutation',
-            'id': 8
-        }
-        }
-    keys = ['Spell Name', 'Adept', 'Apostle of Peace', 'Archivist', 'Artificer', 'Assassin', 'Bard', 'Beguiler', 'Beloved of Valarian', 'Blackguard', 'Blighter', 'Champion of Gwynharwyf', 'Cleric', 'Consecrated Harrier', 'Corrupt Avenger', 'Death Delver', 'Demonologist', 'Disciple of Thrym', 'Divine Crusader', 'Dread Necromancer', 'Druid', 'Duskblade', 'Emissary of Barachiel', 'Fatemaker', 'Favored Soul', 'Friar', 'Gnome Artificer', 'Healer', 'Hexblade', 'Hoardstealer', 'Holy Liberator', 'Hunter of the Dead', 'Knight of the Chalice', 'Mortal Hunter', 'Ocular Adept', 'Paladin', 'Pious Templar', 'Ranger', 'Shugenja', 'Slayer of Domiel', 'Sorcerer', 'Spellthief', 'Spirit Shaman', 'Sublime Chord', 'Suel Arcanamach', 'Temple Raider of Olidammara', 'Ur-Priest', 'Vassal of Bahamut', 'Vigilante', 'Warlock', 'Warmage', 'Wizard', 'Wu Jen']
-    class_list = ['Adept', 'Apostle of Peace', 'Archivist', 'Artificer', 'Assassin', 'Bard', 'Beguiler', 'Beloved of Valarian', 'Blackguard', 'Blighter', 'Champion of Gwynharwyf', 'Cleric', 'Consecrated Harrier', 'Corrupt Avenger', 'Death Delver', 'Demonologist', 'Disciple of Thrym', 'Divine Crusader', 'Dread Necromancer', 'Druid', 'Duskblade', 'Emissary of Barachiel', 'Fatemaker', 'Favored Soul', 'Friar', 'Gnome Artificer', 'Healer', 'Hexblade', 'Hoardstealer', 'Holy Liberator', 'Hunter of the Dead', 'Knight of the Chalice', 'Mortal Hunter', 'Ocular Adept', 'Paladin', 'Pious Templar', 'Ranger', 'Shugenja', 'Slayer of Domiel', 'Sorcerer', 'Spellthief', 'Spirit Shaman', 'Sublime Chord', 'Suel Arcanamach', 'Temple Raider of Olidammara', 'Ur-Priest', 'Vassal of Bahamut', 'Vigilante', 'Warlock', 'Warmage', 'Wizard', 'Wu Jen']
-    parser = argparse.ArgumentParser(description='Parse a CSV file.')
+    parser = argparse.ArgumentParser(description='Unpivot the class level columns of a spell CSV into (spell, class, level) rows.')
     parser.add_argument('-f', '--file', help='Path to the CSV file', required=True)
+    parser.add_argument('-o', '--output', default='data_extracts/spell_class_list.csv', help='Path of the quoted CSV output')
+    parser.add_argument('--tsv', help='Also write a LOAD DATA-ready TSV to this path')
+    parser.add_argument('--db', action='store_true', help='Also insert the rows into SpellLevelMap, using the DB_* settings from the environment or .env')
+    parser.add_argument('--edition_id', type=int, help='Only match spells and classes of this edition when inserting')
+    parser.add_argument('--batch_size', type=int, default=1000, help='Rows per executemany batch when inserting')
     args = parser.parse_args()
 
-    spell_class_list = []
-
-    records = parse_csv_to_dicts(args.file)
-    for record in records:
-        filtered = {k: v for k, v in record.items() if k in keys and v and str(v).strip()}
-        if filtered:
-            for c in class_list:
-                if c in filtered:
-                    spell_class_list.append([filtered['Spell Name'], c, filtered[c]])
+    with contextlib.ExitStack() as stack:
+        writers = [ClassLevelCsvWriter(stack.enter_context(open(args.output, 'w', newline='')))]
+        if args.tsv:
+            writers.append(ClassLevelTsvWriter(stack.enter_context(open(args.tsv, 'w', newline='', encoding='utf-8'))))
+        loader = None
+        if args.db:
+            conn = connect_database()
+            stack.callback(conn.close)
+            loader = SpellLevelLoader(conn, args.batch_size, args.edition_id)
+            writers.append(loader)
+        written = write_class_levels(iter_class_levels(args.file), writers)
 
-    with open('data_extracts/spell_class_list.csv', 'w') as source_f:
-        school_w = csv.writer(source_f, quoting=csv.QUOTE_ALL)
-        school_w.writerows(spell_class_list)
+    print(f"Wrote {written} spell class levels to {args.output}", file=sys.stderr)
+    if args.tsv:
+        print(f"Load {args.tsv} with:\n" + load_data_sql(os.path.abspath(args.tsv), args.edition_id), file=sys.stderr)
+    if loader is not None:
+        print(f"Inserted {loader.inserted} rows into SpellLevelMap", file=sys.stderr)
+        for reason, values in loader.skipped.items():
+            if values:
+                print(f"Skipped {reason}: {', '.join(sorted(values))}", file=sys.stderr)
 
 if __name__ == '__main__':
     main()
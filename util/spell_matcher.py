@@ -0,0 +1,211 @@
+"""Spell name matching shared by the spell text tools."""
+import csv
+import itertools
+import re
+from collections import Counter, deque
+
+def lower_preserving_offsets(text):
+    """Lowercases text without changing its length, so offsets still index the original.
+    Characters whose lowercase form is longer (e.g. 'İ') are left as they are.
+    """
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(char if len(char.lower()) != 1 else char.lower() for char in text)
+
+class AhoCorasick:
+    """Aho–Corasick automaton: finds every occurrence of any of a set of patterns,
+    overlapping ones included, in a single pass over the text.
+    """
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = next_state
+            if pattern:
+                self.output[state].append(index)
+
+        # Breadth-first, so every failure target is complete before the states that use it
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def iter_matches(self, text):
+        """Yields (start, pattern_index) for every occurrence in text, ordered by end position."""
+        goto, fail, output, patterns = self.goto, self.fail, self.output, self.patterns
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in output[state]:
+                yield position - len(patterns[index]) + 1, index
+
+class NameMatcher:
+    """Case-insensitive exact matcher for a list of names."""
+    def __init__(self, names):
+        self.names = list(names)
+        self.automaton = AhoCorasick(lower_preserving_offsets(name) for name in self.names)
+
+    def find_all(self, text):
+        """Returns {name index: [start offsets]} for every occurrence of every name in text."""
+        occurrences = {}
+        for start, index in self.automaton.iter_matches(lower_preserving_offsets(text)):
+            occurrences.setdefault(index, []).append(start)
+        return occurrences
+
+def db_name_key(name):
+    """Folds a name the way the database's case-insensitive collation compares names,
+    so lookups keyed in Python agree with WHERE name = %s and JOIN ... ON name.
+    """
+    return name.casefold().strip()
+
+def read_canonical_names(path):
+    """Reads canonical spell names from a spells.tsv export (name column) or a CSV whose first column is the name."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.tsv'):
+            return [row['name'] for row in csv.DictReader(f, delimiter='\t')]
+        return [row[0] for row in csv.reader(f) if row]
+
+# OCR misreads folded to a single character before matching, so they cost nothing
+OCR_FOLD = str.maketrans({'1': 'l', '|': 'l', '!': 'l', '0': 'o', '’': "'", '‘': "'", '`': "'"})
+# A word broken across lines by a hyphen, after whitespace has been collapsed: "mis- sile"
+HYPHEN_BREAK_RE = re.compile(r"(?<=\w)-\s+(?=\w)")
+
+def fold_ocr_text(text):
+    """Lowercases text, folds OCR misreads (1/l, 0/o), rejoins hyphen-broken words and collapses whitespace."""
+    return " ".join(HYPHEN_BREAK_RE.sub("", text.lower().translate(OCR_FOLD)).split())
+
+# Substitutions and merges OCR commonly makes, cheaper than an arbitrary edit
+OCR_CONFUSION_COST = 0.5
+OCR_CONFUSIONS = [('l', 'i'), ('c', 'e'), ('u', 'v'), ('h', 'b'), ('rn', 'm'), ('vv', 'w'), ('cl', 'd')]
+OCR_SUBSTITUTIONS = {pair for a, b in OCR_CONFUSIONS if len(a) == len(b) for pair in ((a, b), (b, a))}
+OCR_MERGES = {pair for a, b in OCR_CONFUSIONS if len(a) != len(b) for pair in ((a, b), (b, a))}
+OCR_MERGE_PAIRS = {a for a, b in OCR_MERGES if len(a) == 2}
+# Characters OCR drops or adds between words: merged or split words, lost apostrophes
+OCR_GAP_CHARACTERS = " '-"
+INF = float('inf')
+
+def ocr_edit_distance(a, b, max_distance=INF):
+    """Edit distance between two folded strings where OCR confusions and gaps cost
+    OCR_CONFUSION_COST and other edits cost 1. Returns inf once it must exceed max_distance.
+
+    Every step off the diagonal costs at least OCR_CONFUSION_COST, so only a band of
+    max_distance / OCR_CONFUSION_COST cells either side of it is computed.
+    """
+    band = len(a) + len(b) if max_distance == INF else int(max_distance / OCR_CONFUSION_COST)
+    if abs(len(a) - len(b)) > band:
+        return INF
+    gaps_a = [OCR_CONFUSION_COST if char in OCR_GAP_CHARACTERS else 1.0 for char in a]
+    gaps_b = [OCR_CONFUSION_COST if char in OCR_GAP_CHARACTERS else 1.0 for char in b]
+    # The two-character side of a merge ("rn" for "m") ending at each position, if any
+    pairs_a = [None, None] + [a[i - 2:i] if a[i - 2:i] in OCR_MERGE_PAIRS else None for i in range(2, len(a) + 1)]
+    pairs_b = [None, None] + [b[j - 2:j] if b[j - 2:j] in OCR_MERGE_PAIRS else None for j in range(2, len(b) + 1)]
+
+    previous2 = None
+    previous_min = 0.0
+    previous = [0.0] + [INF] * len(b)
+    for j in range(1, min(len(b), band) + 1):
+        previous[j] = previous[j - 1] + gaps_b[j - 1]
+    for i in range(1, len(a) + 1):
+        char_a, gap_a, pair_a = a[i - 1], gaps_a[i - 1], pairs_a[i]
+        low, high = max(1, i - band), min(len(b), i + band)
+        current = [INF] * (len(b) + 1)
+        if i <= band:
+            current[0] = previous[0] + gap_a
+        for j in range(low, high + 1):
+            char_b = b[j - 1]
+            if char_a == char_b:
+                cost = previous[j - 1]
+            elif (char_a, char_b) in OCR_SUBSTITUTIONS:
+                cost = previous[j - 1] + OCR_CONFUSION_COST
+            else:
+                cost = previous[j - 1] + 1.0
+            cost = min(cost, previous[j] + gap_a, current[j - 1] + gaps_b[j - 1])
+            if pair_a is not None and (pair_a, char_b) in OCR_MERGES:
+                cost = min(cost, previous2[j - 1] + OCR_CONFUSION_COST)
+            if pairs_b[j] is not None and (char_a, pairs_b[j]) in OCR_MERGES:
+                cost = min(cost, previous[j - 2] + OCR_CONFUSION_COST)
+            current[j] = cost
+        # A merge can reach back two rows, so both must be out of range to stop early
+        current_min = min(current[low - 1:high + 1])
+        if current_min > max_distance and previous_min > max_distance:
+            return INF
+        previous2, previous, previous_min = previous, current, current_min
+    return previous[-1] if previous[-1] <= max_distance else INF
+
+class ApproximateNameIndex:
+    """OCR-tolerant lookup of canonical names.
+
+    Names are folded with fold_ocr_text and indexed by character trigrams. A lookup folds the
+    query and returns an exact folded match directly. Otherwise it counts the trigrams each
+    name shares with the query, drops names that differ too much in length or share too few
+    trigrams to be within range, and scores the `candidates` names sharing the most with
+    ocr_edit_distance. A match must be within max_ratio of the query's length (at least 1).
+    """
+    def __init__(self, names, max_ratio=0.15, candidates=5, n=3):
+        self.names = list(names)
+        self.max_ratio = max_ratio
+        self.candidates = candidates
+        self.n = n
+        self.folded = [fold_ocr_text(name) for name in self.names]
+        self.lengths = [len(folded) for folded in self.folded]
+        self.exact = {}
+        self.postings = {}
+        for index, folded in enumerate(self.folded):
+            self.exact.setdefault(folded, index)
+            for gram in self.ngrams(folded):
+                self.postings.setdefault(gram, []).append(index)
+
+    def ngrams(self, folded):
+        padded = f" {folded} "
+        return {padded[i:i + self.n] for i in range(len(padded) - self.n + 1)}
+
+    def lookup(self, text, max_distance=None):
+        """Returns (canonical name, distance) for the closest name to text, or None if none is close enough."""
+        folded = fold_ocr_text(text)
+        index = self.exact.get(folded)
+        if index is not None:
+            return self.names[index], 0.0
+        if max_distance is None:
+            max_distance = max(1.0, self.max_ratio * len(folded))
+
+        grams = self.ngrams(folded)
+        shared = Counter(itertools.chain.from_iterable(self.postings.get(gram, ()) for gram in grams))
+        # Every edit costs at least OCR_CONFUSION_COST, changes the length by at most one and
+        # touches at most n + 1 trigrams (a merge replaces two characters)
+        max_edits = int(max_distance / OCR_CONFUSION_COST)
+        min_shared = len(grams) - (self.n + 1) * max_edits
+        length = len(folded)
+        ranked = []
+        for index, count in shared.most_common():
+            if count < min_shared or len(ranked) == self.candidates:
+                break
+            if abs(self.lengths[index] - length) <= max_edits:
+                ranked.append(index)
+
+        best = None
+        for index in ranked:
+            distance = ocr_edit_distance(folded, self.folded[index], max_distance)
+            if distance != INF and (best is None or distance < best[1]):
+                best = (self.names[index], distance)
+                max_distance = distance
+        return best
@@ -1,37 +1,14 @@
-import csv
 import argparse
-from collections import defaultdict
 
-def make_unique_headers(headers):
-    counter = defaultdict(int)
-    unique_headers = []
-    
-    for h in headers:
-        if counter[h] == 0:
-            unique_headers.append(h)
-        else:
-            unique_headers.append(f"{h}{counter[h]}")
-        counter[h] += 1
-    return unique_headers
+from spell_csv import header_ordered, iter_spell_rows
 
-def parse_csv_to_dicts(file_path):
-    data = []
-    try:
-        with open(file_path, newline='', encoding='cp1252') as csvfile:
-            reader = csv.reader(csvfile)
-            raw_headers = next(reader)
-            headers = make_unique_headers(raw_headers)
-            
-            for row in reader:
-                row_dict = dict(zip(headers, row))
-                data.append(row_dict)
-        return data
-    except FileNotFoundError:
-        print(f"Error: File '{file_path}' not found.")
-        return []
-    except Exception as e:
-        print(f'An error occurred: {e}')
-        return []
+def parse_full_refer(full_refer):
+    """Splits a Full Refer value, e.g. "PH: pg 231, SC: pg 9", into [{'Book': 'PH', 'Page': '231'}, ...]."""
+    book_info = []
+    books = full_refer.split(',')
+    for b in books:
+        book_info.append(dict(zip(['Book','Page'],[x.strip() for x in b.split(': pg')])))
+    return book_info
 
 def main():
     classes = ['Adept','Apostle of Peace','Archivist','Artificer','Assassin','Bard','Beguiler','Beloved of Valarian','Blackguard','Blighter','Champion of Gwynharwyf','Cleric','Consecrated Harrier','Corrupt Avenger','Death Delver','Demonologist','Disciple of Thrym','Divine Crusader','Dread Necromancer','Druid','Duskblade','Emissary of Barachiel','Fatemaker','Favored Soul','Friar','Gnome Artificer','Healer','Hexblade','Hoardstealer','Holy Liberator','Hunter of the Dead','Knight of the Chalice','Mortal Hunter','Ocular Adept','Paladin','Pious Templar','Ranger','Shugenja','Slayer of Domiel','Sorcerer','Spellthief','Spirit Shaman','Sublime Chord','Suel Arcanamach','Temple Raider of Olidammara','Universal Caster','Ur-Priest','Vassal of Bahamut','Vigilante','Warlock','Warmage','Wizard','Wu Jen']
@@ -42,20 +19,17 @@ def main():
     parser.add_argument('-f', '--file', help='Path to the CSV file', required=True)
     args = parser.parse_args()
 
-    spell_list = []
-    records = parse_csv_to_dicts(args.file)
-    for record in records:
-        filtered = {k: v for k, v in record.items() if k in classes and v and str(v).strip()}
-        if filtered:
-            book_info = []
-            books = record['Full Refer'].split(',')
-            for b in books:
-                book_info.append(dict(zip(['Book','Page'],[x.strip() for x in b.split(': pg')])))
-            class_list = [{'Class': class_map[k], 'Level': v} for k, v in filtered.items()]
-            spell_list.append({key: record[key] for key in keys_to_print if key in record}|{'Source': book_info, 'Classes': class_list})
-
-    for index, spell in enumerate(spell_list):
-        print(index, spell)
+    # Classes are listed in the CSV's column order, as reading each row as a dict did
+    row_classes = header_ordered(args.file, classes)
+    index = 0
+    for row in iter_spell_rows(args.file, [*keys_to_print, 'Full Refer', *row_classes]):
+        levels = row[len(keys_to_print) + 1:]
+        class_list = [{'Class': class_map[c], 'Level': v} for c, v in zip(row_classes, levels) if v and v.strip()]
+        if class_list:
+            book_info = parse_full_refer(row[len(keys_to_print)])
+            spell = {key: value for key, value in zip(keys_to_print, row) if value is not None}
+            print(index, spell|{'Source': book_info, 'Classes': class_list})
+            index += 1
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+
+import pytest
+
+# The util scripts are run directly rather than installed, so make them importable from the tests
+UTIL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if UTIL_DIR not in sys.path:
+    sys.path.insert(0, UTIL_DIR)
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+THROUGHPUT_KEY = pytest.StashKey[list]()
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--update-golden", action="store_true", default=False,
+        help="Rewrite the files in tests/golden from the current implementation instead of comparing against them",
+    )
+
+def pytest_configure(config):
+    config.stash[THROUGHPUT_KEY] = []
+
+class Golden:
+    """Compares outputs byte for byte against the files in tests/golden, or rewrites them."""
+    def __init__(self, update):
+        self.update = update
+
+    def check(self, name, text):
+        path = os.path.join(GOLDEN_DIR, name)
+        data = text.encode("utf-8")
+        if self.update:
+            os.makedirs(GOLDEN_DIR, exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+            return
+        with open(path, "rb") as f:
+            expected = f.read()
+        if data != expected:
+            actual_lines, expected_lines = data.splitlines(), expected.splitlines()
+            line = next((i for i, (a, e) in enumerate(zip(actual_lines, expected_lines)) if a != e), min(len(actual_lines), len(expected_lines)))
+            pytest.fail(
+                f"{name} differs from the golden file at line {line + 1}:\n"
+                f"  expected: {expected_lines[line] if line < len(expected_lines) else '<end of file>'!r}\n"
+                f"  actual:   {actual_lines[line] if line < len(actual_lines) else '<end of file>'!r}\n"
+                f"Run pytest --update-golden if the change is intended."
+            )
+
+@pytest.fixture
+def golden(request):
+    return Golden(request.config.getoption("--update-golden"))
+
+@pytest.fixture
+def throughput(request):
+    """Times func() over a corpus of count items (best of repeat runs), records items/s for
+    the end-of-run summary and returns func's result.
+    """
+    def measure(name, count, unit, func, repeat=3):
+        best = float("inf")
+        result = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - start)
+        request.config.stash[THROUGHPUT_KEY].append((name, count, unit, best))
+        return result
+    return measure
+
+def pytest_terminal_summary(terminalreporter, config):
+    results = config.stash.get(THROUGHPUT_KEY, [])
+    if not results:
+        return
+    terminalreporter.section("throughput")
+    for name, count, unit, seconds in results:
+        terminalreporter.write_line(f"{name}: {count / seconds:,.0f} {unit}/s ({count} {unit} in {seconds * 1000:.1f} ms)")
+    # Kept in the pytest cache so runs can be compared: pytest --cache-show 'throughput/*'
+    config.cache.set("throughput/last_run", {name: round(count / seconds, 1) for name, count, unit, seconds in results})
@@ -0,0 +1,151 @@
+"""Builds the checked-in golden corpus inputs.
+
+The corpus is synthetic but shaped like real OCR output: spell text for every name in
+apps/backend/scripts/spells.tsv, and PaddleX-style layout JSON pages. Generation is seeded,
+so rerunning this script reproduces the same files; after changing it, rerun it and then
+pytest --update-golden to refresh the expected outputs.
+"""
+import csv
+import json
+import os
+import random
+
+FIXTURES_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(FIXTURES_DIR)))
+SPELLS_TSV = os.path.join(REPO_ROOT, "apps", "backend", "scripts", "spells.tsv")
+
+SPELLS_TEXT = os.path.join(FIXTURES_DIR, "spells.txt")
+TARGET_TEXTS = os.path.join(FIXTURES_DIR, "target_texts.json")
+LAYOUT_PAGES = os.path.join(FIXTURES_DIR, "layout_pages.json")
+
+SCHOOLS = [
+    "Abjuration", "Conjuration (Creation)", "Conjuration (Healing)", "Divination", "Enchantment (Compulsion) [Mind-Affecting]",
+    "Evocation [Fire]", "Evocation [Force]", "Illusion (Glamer)", "Necromancy [Evil]", "Transmutation", "Universal",
+]
+LEVEL_TYPES = ["Brd", "Clr", "Drd", "Pal", "Rgr", "Sor/Wiz", "Air", "Chaos", "Death", "Fire", "Good", "Law", "Luck", "Magic", "Sun", "War", "Water", "Trickery"]
+FIELD_VALUES = {
+    "Components": ["V, S", "V, S, M", "V, S, F/DF", "V, S, M/DF", "V, S, DF", "V, S, M, XP", "S", "V", "see text"],
+    "Casting Time": ["1 standard action", "1 round", "10 minutes", "1 swift action", "1 hour"],
+    "Range": ["Close (25 ft. + 5 ft./2 levels)", "Medium (100 ft. + 10 ft./level)", "Long (400 ft. + 40 ft./level)", "Touch", "Personal", "60 ft."],
+    "Area": ["20-ft.-radius spread", "Cone-shaped burst", "One 10-ft. cube/level"],
+    "Effect": ["Ray", "One summoned creature", "Wall up to 20 ft. long/level"],
+    "Target": ["Creature touched", "You", "One creature", "Object touched"],
+    "Targets": ["Up to one creature/level, no two of which can be more than 30 ft. apart", "One or more creatures"],
+    "Duration": ["1 round/level", "10 min./level (D)", "Instantaneous", "Concentration", "Permanent", "1 hour/level", "24 hours", "1 min./level"],
+    "Saving Throw": ["None", "Will negates", "Reflex half", "Fortitude partial", "Will negates (harmless)", "Will disbelief (if interacted with)", "Fortitude negates; see text"],
+    "Spell Resistance": ["Yes", "No", "Yes (harmless)", "Yes (harmless, object)", "No or Yes (harmless)", "See text", "Yes; see text"],
+}
+DESCRIPTION_SENTENCES = [
+    "This spell creates a shimmering field of force around the subject.",
+    "You call forth a burst of energy that strikes every creature in the area.",
+    "The subject gains a +2 bonus on saving throws against fear effects.",
+    "A creature that fails its save is dazed for 1 round.",
+    "It functions like the spell of the same name, except as noted here.",
+    "An affected creature can attempt a new save each round.",
+    "Mass versions of this spell affect every ally within range.",
+    "The Range of the effect doubles if the caster is standing on holy ground.",
+    "Material Component: A pinch of powdered silver.",
+    "Focus: A small crystal prism worth at least 50 gp.",
+]
+
+def wrap_lines(text, rng):
+    """Breaks text into OCR-like lines of 30-60 characters."""
+    lines = []
+    words = text.split(" ")
+    line = []
+    width = rng.randint(30, 60)
+    for word in words:
+        line.append(word)
+        if sum(len(w) + 1 for w in line) >= width:
+            lines.append(" ".join(line))
+            line = []
+            width = rng.randint(30, 60)
+    if line:
+        lines.append(" ".join(line))
+    return "\n".join(lines)
+
+def make_spell_block(name, rng):
+    parts = [name, rng.choice(SCHOOLS)]
+    kind = rng.random()
+    if kind > 0.03:
+        levels = rng.sample(LEVEL_TYPES, rng.randint(1, 3))
+        if kind > 0.06:
+            levels.sort()
+        parts.append("Level " + ", ".join(f"{level_type} {rng.randint(0, 9)}" for level_type in levels))
+    labels = [label for label in FIELD_VALUES if rng.random() < 0.8]
+    if "Target" in labels and "Targets" in labels:
+        labels.remove(rng.choice(["Target", "Targets"]))
+    if rng.random() < 0.05:
+        rng.shuffle(labels)
+    for label in labels:
+        parts.append(f"{label} {rng.choice(FIELD_VALUES[label])}")
+    parts.append(" ".join(rng.sample(DESCRIPTION_SENTENCES, rng.randint(1, 2))))
+    return wrap_lines(" ".join(parts), rng)
+
+def read_spell_names():
+    with open(SPELLS_TSV, newline="", encoding="utf-8") as f:
+        return [row["name"] for row in csv.DictReader(f, delimiter="\t")]
+
+def build_spells_text(names, rng):
+    return "\n---\n".join(make_spell_block(name, rng) for name in names) + "\n---\n"
+
+def build_target_texts(rng):
+    texts = []
+    for _ in range(300):
+        target = rng.choice(FIELD_VALUES["Target"] + FIELD_VALUES["Targets"])
+        separator = rng.choice([". ", "; ", " ", "! "])
+        texts.append(target + separator + " ".join(rng.sample(DESCRIPTION_SENTENCES, rng.randint(0, 3))))
+    return texts
+
+def make_layout_page(rng, words):
+    """A page of PaddleX layout blocks: one to three text columns plus titles, page numbers and noise."""
+    column_count = rng.choice([1, 2, 2, 2, 3])
+    column_width = 700 // column_count
+    blocks = []
+    for column in range(column_count):
+        x = 40 + column * (column_width + 10) + rng.uniform(-8, 8)
+        y = rng.uniform(60, 90)
+        while y < 980:
+            height = rng.uniform(20, 160)
+            label = rng.choices(["text", "paragraph_title", "list_item", "table", "figure_title", "image", "header"], [70, 10, 6, 3, 3, 4, 4])[0]
+            indent = rng.choice([0, 0, 0, 12, 25])
+            content = " ".join(rng.choice(words) for _ in range(int(height / 10)))
+            bbox = [round(x + indent, 2), round(y, 2), round(x + column_width - rng.uniform(0, 40), 2), round(y + height, 2)]
+            blocks.append({"block_label": label, "block_content": content, "block_bbox": bbox})
+            y += height + rng.uniform(5, 25)
+    if rng.random() < 0.5:
+        blocks.append({"block_label": "paragraph_title", "block_content": " ".join(rng.sample(words, 3)), "block_bbox": [60.0, 20.0, 700.0, 50.0]})
+    page_number = str(rng.randint(1, 320))
+    if rng.random() < 0.5:
+        blocks.append({"block_label": "number", "block_content": page_number, "block_bbox": [700.0, 1000.0, 720.0, 1015.0]})
+    else:
+        blocks.append({"block_label": "number", "block_content": page_number, "block_bbox": [20.0, 1000.0, 40.0, 1015.0]})
+    if rng.random() < 0.3:
+        blocks.append({"block_label": "number", "block_content": str(rng.randint(1, 9)), "block_bbox": [300.0, 500.0, 320.0, 515.0]})
+    if rng.random() < 0.3:
+        blocks.append({"block_label": "aside_text", "block_content": "Order #123456", "block_bbox": [5.0, 300.0, 25.0, 700.0]})
+    if rng.random() < 0.1:
+        blocks.append({"block_label": "text", "block_content": "bad bbox", "block_bbox": [1.0, 2.0]})
+    rng.shuffle(blocks)
+    return {"parsing_res_list": blocks}
+
+def build_layout_pages(rng, words, count=100):
+    pages = [make_layout_page(rng, words) for _ in range(count)]
+    pages.append({"parsing_res_list": []})
+    pages.append({})
+    return pages
+
+def main():
+    rng = random.Random(20250101)
+    names = read_spell_names()
+    with open(SPELLS_TEXT, "w", encoding="utf-8", newline="\n") as f:
+        f.write(build_spells_text(names, rng))
+    with open(TARGET_TEXTS, "w", encoding="utf-8", newline="\n") as f:
+        json.dump(build_target_texts(rng), f, indent=0, ensure_ascii=False)
+    words = " ".join(DESCRIPTION_SENTENCES).split()
+    with open(LAYOUT_PAGES, "w", encoding="utf-8", newline="\n") as f:
+        json.dump(build_layout_pages(rng, words), f, separators=(",", ":"))
+    print(f"Wrote {len(names)} spells, target texts and layout pages to {FIXTURES_DIR}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import csv
+import io
+import json
+import sys
+
+import all_spells_cleanup
+
+# The class columns are deliberately not in class_name_abbr order
+HEADERS = ["Spell Name", "Wizard", "School", "Description", "Bard", "Full Refer", "Cleric"]
+ROWS = [
+    ["Fireball", "3", "evo[fire]", "Boom.", "", "PH: pg 231", ""],
+    ["Bless", "", "en", "Courage.", "1", "PH: pg 205", "1*"],
+    ["Wish", "²", "uni", "Anything.", "200", "PH: pg 302", ""],
+]
+
+def test_cleanup_writes_fixed_order_rows_and_level_matrix(tmp_path, monkeypatch, capsys):
+    spells_csv = tmp_path / "all_spells.csv"
+    with open(spells_csv, "w", newline="", encoding="cp1252") as f:
+        csv.writer(f).writerows([HEADERS, *ROWS])
+    columnar = tmp_path / "levels.json"
+    monkeypatch.setattr(sys, "argv", ["all_spells_cleanup.py", "-f", str(spells_csv), "--columnar", str(columnar)])
+
+    all_spells_cleanup.main()
+
+    rows = list(csv.reader(io.StringIO(capsys.readouterr().out)))
+    assert rows[0] == all_spells_cleanup.columns_to_keep
+    assert [dict(zip(rows[0], row)) for row in rows[1:]] == [
+        {**dict.fromkeys(rows[0], ""), "Spell Name": "Fireball", "School": "evo[fire]", "Description": "Boom.", "Full Refer": "PH: pg 231", "LevelStr": "Wiz 3"},
+        {**dict.fromkeys(rows[0], ""), "Spell Name": "Bless", "School": "en", "Description": "Courage.", "Full Refer": "PH: pg 205", "LevelStr": "Brd 1, Clr 1*"},
+        # LevelStr lists the classes in the CSV's column order
+        {**dict.fromkeys(rows[0], ""), "Spell Name": "Wish", "School": "uni", "Description": "Anything.", "Full Refer": "PH: pg 302", "LevelStr": "Wiz ², Brd 200"},
+    ]
+
+    with open(columnar) as f:
+        matrix = json.load(f)
+    classes = matrix["classes"]
+    assert classes[:3] == ["Wiz", "Brd", "Clr"]
+    assert matrix["spells"] == ["Fireball", "Bless", "Wish"]
+    assert {classes[i]: level for i, level in enumerate(matrix["levels"][0]) if level != -1} == {"Wiz": 3}
+    assert {classes[i]: level for i, level in enumerate(matrix["levels"][1]) if level != -1} == {"Brd": 1}
+    assert set(matrix["levels"][2]) == {-1}
+    # Superscripts and levels too large for a byte cell are listed rather than crashing the run
+    assert matrix["unparsed"] == [["Bless", "Clr", "1*"], ["Wish", "Wiz", "²"], ["Wish", "Brd", "200"]]
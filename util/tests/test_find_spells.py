@@ -0,0 +1,69 @@
+import csv
+import os
+
+import find_spells
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+# The names the corpus in fixtures/spells.txt was built from, in corpus order
+SPELLS_TSV = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "apps", "backend", "scripts", "spells.tsv")
+
+def test_insert_delimiters_splits_confident_headers_without_prompting():
+    text = (
+        "Daylight\nEvocation [Light]\nLevel Clr 3\nLike light, but brighter.\n"
+        "Light\nEvocation [Light]\nLevel Brd 0\nThe object shines.\n"
+        "Some text. Magic Missile Evocation [Force]\nLevel Sor/Wiz 1\n"
+    )
+    prompts = []
+    def confirm(text, start, name, score):
+        prompts.append((name, text[start:start + len(name)], score))
+        return True
+
+    updated, found, unresolved = find_spells.insert_delimiters(["Daylight", "Light", "Magic Missile"], text, confirm=confirm)
+
+    # Mid-line headers are only low-confidence, so they are the only ones asked about
+    assert prompts == [("Magic Missile", "Magic Missile", 4)]
+    assert found == ["Daylight", "Light", "Magic Missile"]
+    assert unresolved == []
+    assert updated == (
+        "Daylight\nEvocation [Light]\nLevel Clr 3\nLike light, but brighter.\n"
+        "---\nLight\nEvocation [Light]\nLevel Brd 0\nThe object shines.\n"
+        "Some text.\n---\nMagic Missile Evocation [Force]\nLevel Sor/Wiz 1\n"
+    )
+
+def test_insert_delimiters_batch_mode_leaves_low_confidence_for_review(capsys):
+    text = "Shield\nAbjuration [Force]\nUnlike a shield of faith, this is force.\n"
+    updated, found, unresolved = find_spells.insert_delimiters(["Shield", "Shield of Faith", "Wish"], text, confirm=None)
+    assert updated == text
+    assert found == ["Shield"]
+    assert unresolved == ["Shield of Faith"]
+    assert "Spell not found: Wish" in capsys.readouterr().out
+
+def test_insert_delimiters_restores_delimiters_in_corpus(throughput):
+    with open(os.path.join(FIXTURES_DIR, "spells.txt"), encoding="utf-8", newline="") as f:
+        text = f.read()
+    with open(SPELLS_TSV, newline="", encoding="utf-8") as f:
+        names = [row["name"] for row in csv.DictReader(f, delimiter="\t")]
+    stripped = text.replace("\n---\n", "\n")
+
+    updated, found, unresolved = throughput(
+        "find_spells.insert_delimiters", len(names), "names",
+        lambda: find_spells.insert_delimiters(names, stripped, confirm=None), repeat=1,
+    )
+    assert found == names
+    assert unresolved == []
+    assert updated + "---\n" == text
+
+def test_insert_delimiters_finds_ocr_damaged_headers():
+    text = (
+        "Daylight\nEvocation [Light]\nLike light, but brighter.\n"
+        "Ca11 Light-\nning\nEvocation [Electricity]\nBolts of lightning.\n"
+        "Fireball Evocation [Fire]\nA burst of flame.\n"
+    )
+    updated, found, unresolved = find_spells.insert_delimiters(["Daylight", "Call Lightning", "Fireball"], text, confirm=None)
+    assert found == ["Daylight", "Call Lightning", "Fireball"]
+    assert unresolved == []
+    assert updated == (
+        "Daylight\nEvocation [Light]\nLike light, but brighter.\n"
+        "---\nCa11 Light-\nning\nEvocation [Electricity]\nBolts of lightning.\n"
+        "---\nFireball Evocation [Fire]\nA burst of flame.\n"
+    )
@@ -0,0 +1,78 @@
+"""Golden-corpus regression and throughput tests.
+
+The inputs in tests/fixtures are built by tests/fixtures/build_corpus.py; the expected
+outputs in tests/golden are compared byte for byte. Everything runs offline. Throughput
+for each corpus is printed at the end of the run.
+"""
+import io
+import json
+import os
+
+import pytest
+
+import ocr_spell_cleaner
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8", newline="") as f:
+        return f.read()
+
+@pytest.fixture(scope="module")
+def spells_text():
+    return read_fixture("spells.txt")
+
+@pytest.fixture(scope="module")
+def spell_blocks(spells_text):
+    return [block for block in spells_text.split("---") if block.strip()]
+
+def to_json(value):
+    return json.dumps(value, indent=1, ensure_ascii=False) + "\n"
+
+def test_format_spell_block_golden(spell_blocks, golden, throughput, capsys):
+    formatted = throughput(
+        "format_spell_block", len(spell_blocks), "blocks",
+        lambda: "".join(ocr_spell_cleaner.format_spell_block(block) + "\n---\n" for block in spell_blocks),
+    )
+    golden.check("spells.md", formatted)
+
+# The generated corpus only has single-digit levels; OCR and some books write "Brd 03"
+PADDED_LEVEL_BLOCKS = [
+    "Light\nEvocation [Light]\nLevel Brd 00, Clr 03, Sun 0\nComponents V, M/DF\nRange Touch\nThe object shines.\n",
+    "Heal\nConjuration (Healing)\nLevel Clr 06, Drd 7, Healing 006\nRange Touch\nIt channels energy.\n",
+]
+
+def test_padded_levels_golden(golden, capsys):
+    formatted = "".join(ocr_spell_cleaner.format_spell_block(block) + "\n---\n" for block in PADDED_LEVEL_BLOCKS)
+    golden.check("padded_levels.md", formatted)
+
+def test_parse_quality_golden(spells_text, golden, capsys):
+    metrics = ocr_spell_cleaner.ParseMetrics()
+    for _ in ocr_spell_cleaner.iter_spell_records(io.StringIO(spells_text), metrics=metrics):
+        pass
+    report = metrics.report()
+    quality = {key: report[key] for key in ("blocks", "empty_blocks", "parsed", "unparsed", "failures_by_kind", "failures_by_field", "fields_filled")}
+    golden.check("spells_quality.json", to_json(quality))
+
+def test_validate_and_segment_golden(spells_text, spell_blocks, golden, throughput):
+    validations = [ocr_spell_cleaner.validate_spell_block(block) for block in spell_blocks]
+    segmenter = ocr_spell_cleaner.SpellBlockSegmenter("---")
+    segments = throughput("SpellBlockSegmenter.segment", len(spell_blocks), "blocks", lambda: list(segmenter.segment(spells_text)))
+    golden.check("spells_segments.json", to_json({
+        "valid_blocks": "".join("1" if valid else "0" for valid in validations),
+        "segment_lengths": [len(segment) for segment in segments],
+    }))
+
+def test_split_targets_and_description_golden(golden, throughput):
+    texts = json.loads(read_fixture("target_texts.json"))
+    splits = throughput(
+        "split_targets_and_description", len(texts), "texts",
+        lambda: [list(ocr_spell_cleaner.split_targets_and_description(text)) for text in texts],
+    )
+    golden.check("target_splits.json", to_json(splits))
+
+def test_process_ocr_blocks_golden(golden, throughput):
+    pdf_processor = pytest.importorskip("pdf_processor")
+    pages = json.loads(read_fixture("layout_pages.json"))
+    texts = throughput("process_ocr_blocks", len(pages), "pages", lambda: [pdf_processor.process_ocr_blocks(page) for page in pages])
+    golden.check("layout.txt", "".join(f"=== page {number} ===\n{text}\n" for number, text in enumerate(texts, start=1)))
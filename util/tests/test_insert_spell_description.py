@@ -0,0 +1,130 @@
+import pytest
+
+insert_spell_description = pytest.importorskip("insert_spell_description")
+
+class FakeCursor:
+    """Runs the statements import_descriptions sends against an in-memory Spell table of
+    [name, description, editionId] rows, comparing names case-insensitively like MySQL.
+    """
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+        self.staged = None
+        self.result = []
+        self.rowcount = 0
+
+    @staticmethod
+    def key(name):
+        return name.casefold().strip()
+
+    def matches(self, row, name, edition):
+        return self.key(row[0]) == self.key(name) and (edition is None or row[2] == edition)
+
+    def update(self, name, description, edition):
+        count = 0
+        for row in self.rows:
+            if self.matches(row, name, edition) and row[1] != description:
+                row[1] = description
+                count += 1
+        return count
+
+    def execute(self, query, params=()):
+        self.statements.append((query, params))
+        edition = params[0] if params else None
+        self.rowcount = 0
+        if query.startswith("SELECT"):
+            self.result = [(name, description) for name, description, row_edition in self.rows if edition is None or row_edition == edition]
+        elif query.startswith("CREATE TEMPORARY"):
+            self.staged = {}
+        elif query.startswith("UPDATE"):
+            self.rowcount = sum(self.update(name, description, edition) for name, description in self.staged.values())
+
+    def executemany(self, query, rows):
+        rows = list(rows)
+        self.statements.append((query, rows))
+        if query.startswith("INSERT INTO spell_description_import"):
+            for description, name in rows:
+                if self.key(name) in self.staged:
+                    raise RuntimeError(f"Duplicate entry '{name}' for key 'PRIMARY'")
+                self.staged[self.key(name)] = (name, description)
+            self.rowcount = len(rows)
+        else:
+            self.rowcount = sum(self.update(name, description, edition[0] if edition else None) for description, name, *edition in rows)
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.cursor_ = FakeCursor(rows)
+        self.committed = False
+        self.rolled_back = False
+
+    def cursor(self):
+        return self.cursor_
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+def stored_rows():
+    return [["Fireball", "Boom.", 1], ["Light", "Old light.", 1], ["Daze", None, 1], ["Bless", "Courage.", 1]]
+
+SPELLS = [
+    {"name": "Fireball", "description": "Boom."},
+    {"name": "Light", "description": "New light."},
+    {"name": "Daze", "description": "Dazed."},
+    {"name": "Wish", "description": "Anything."},
+    {"name": "Bless", "description": "Courage."},
+]
+
+def test_import_descriptions_writes_only_changed_rows_in_batches():
+    conn = FakeConnection(stored_rows())
+    report = insert_spell_description.import_descriptions(conn, SPELLS, batch_size=1)
+
+    updates = [statement for statement in conn.cursor_.statements if statement[0].startswith("UPDATE")]
+    assert updates == [
+        ("UPDATE `spells` SET `desc` = %s WHERE name = %s", [("New light.", "Light")]),
+        ("UPDATE `spells` SET `desc` = %s WHERE name = %s", [("Dazed.", "Daze")]),
+    ]
+    assert conn.committed
+    assert report == {"spells": 5, "matched": 4, "changed": 2, "unchanged": 2, "missing": ["Wish"], "rows_updated": 2}
+
+def test_import_descriptions_join_mode_uses_one_update():
+    conn = FakeConnection(stored_rows())
+    report = insert_spell_description.import_descriptions(conn, SPELLS, mode="join", table="Spell", column="description")
+
+    queries = [query for query, _ in conn.cursor_.statements]
+    assert queries[1].startswith("CREATE TEMPORARY TABLE spell_description_import")
+    assert conn.cursor_.statements[2] == ("INSERT INTO spell_description_import (description, name) VALUES (%s, %s)", [("New light.", "Light"), ("Dazed.", "Daze")])
+    assert [query for query in queries if query.startswith("UPDATE")] == ["UPDATE `Spell` s JOIN spell_description_import i ON s.name = i.name SET s.`description` = i.description"]
+    assert report["changed"] == 2 and report["rows_updated"] == 2
+
+@pytest.mark.parametrize("mode", ["executemany", "join"])
+def test_import_descriptions_leaves_other_editions_alone(mode):
+    rows = [["Light", "3.5 light.", 1], ["Light", "3.0 light.", 2], ["Daze", "3.0 daze.", 2]]
+    conn = FakeConnection(rows)
+    spells = [{"name": "Light", "description": "New light."}, {"name": "Daze", "description": "Dazed."}]
+
+    report = insert_spell_description.import_descriptions(conn, spells, mode=mode, table="Spell", column="description", edition_id=1)
+
+    assert rows == [["Light", "New light.", 1], ["Light", "3.0 light.", 2], ["Daze", "3.0 daze.", 2]]
+    assert report == {"spells": 2, "matched": 1, "changed": 1, "unchanged": 0, "missing": ["Daze"], "rows_updated": 1}
+    assert conn.cursor_.statements[0] == ("SELECT name, `description` FROM `Spell` WHERE editionId = %s", (1,))
+
+@pytest.mark.parametrize("mode", ["executemany", "join"])
+def test_import_descriptions_compares_names_like_the_database(mode):
+    rows = [["Light", "Old light.", 1], ["Bless", "Courage.", 1]]
+    conn = FakeConnection(rows)
+    spells = [{"name": "light", "description": "Stale."}, {"name": "Light ", "description": "New light."}, {"name": "BLESS", "description": "Courage."}]
+
+    report = insert_spell_description.import_descriptions(conn, spells, mode=mode)
+
+    assert not conn.rolled_back
+    assert rows == [["Light", "New light.", 1], ["Bless", "Courage.", 1]]
+    assert report == {"spells": 2, "matched": 2, "changed": 1, "unchanged": 1, "missing": [], "rows_updated": 1}
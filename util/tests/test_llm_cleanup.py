@@ -0,0 +1,250 @@
+import io
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+import pdf_processor
+
+PROMPT = "Fix the OCR errors.\n"
+
+def cleaned(text):
+    """What the mock model answers for a chunk of text."""
+    return text.upper()
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    """Mimics Ollama's streaming /api/chat endpoint: one NDJSON message per few characters of
+    the cleaned text, then a done message with token stats.
+    """
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        prompt = payload['messages'][0]['content']
+        text = prompt.split("```markdown\n", 1)[1].rsplit("\n```", 1)[0]
+        with self.server.lock:
+            self.server.requests.append((payload['model'], prompt))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        answer = cleaned(text)
+        pieces = [answer[i:i + 4] for i in range(0, len(answer), 4)]
+        for piece in pieces:
+            self.wfile.write(json.dumps({"message": {"role": "assistant", "content": piece}, "done": False}).encode("utf-8") + b"\n")
+        self.wfile.write(json.dumps({"done": True, "eval_count": len(pieces), "eval_duration": 2_000_000}).encode("utf-8") + b"\n")
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def ollama_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockOllamaHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def raw_texts(tmp_path):
+    raw_text_dir = tmp_path / "ocr_output" / "book" / "raw_text"
+    raw_text_dir.mkdir(parents=True)
+    paths = []
+    for page_num in range(1, 4):
+        path = raw_text_dir / f"book_pg{page_num}.txt"
+        path.write_text(f"page {page_num} first paragraph\n\npage {page_num} second paragraph", encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+def make_config(tmp_path, server):
+    return {
+        "ollama_url": f"http://127.0.0.1:{server.server_address[1]}/api/chat",
+        "llm_model_name": "cleaner:1",
+        "prompts": {"text_cleanup_prompt": PROMPT},
+        "paths": {"ocr_output_dir": str(tmp_path / "ocr_output")},
+        "settings": {"llm_concurrency": 2, "llm_max_chunk_chars": None, "llm_retries": 0},
+    }
+
+def cleaned_markdown(text_path):
+    markdown_path = text_path.replace("raw_text", "cleaned_markdown").replace(".txt", ".md")
+    with open(markdown_path, encoding="utf-8") as f:
+        return f.read()
+
+def test_llm_cache_hit_skips_ollama(tmp_path, ollama_server, raw_texts, capsys):
+    config = make_config(tmp_path, ollama_server)
+    pdf_processor.action_llm_cleanup_text(config, raw_texts)
+    assert len(ollama_server.requests) == len(raw_texts)
+    first_run = [cleaned_markdown(path) for path in raw_texts]
+    assert first_run[0] == "PAGE 1 FIRST PARAGRAPH\n\nPAGE 1 SECOND PARAGRAPH"
+
+    os.remove(raw_texts[0].replace("raw_text", "cleaned_markdown").replace(".txt", ".md"))
+    pdf_processor.action_llm_cleanup_text(config, raw_texts)
+    assert len(ollama_server.requests) == len(raw_texts)
+    assert [cleaned_markdown(path) for path in raw_texts] == first_run
+    assert "LLM cleanup cache: 3 hits, 0 misses" in capsys.readouterr().out
+
+@pytest.mark.parametrize("change", [
+    lambda config: config.update(llm_model_name="cleaner:2"),
+    lambda config: config['prompts'].update(text_cleanup_prompt="Fix the OCR errors, carefully.\n"),
+    lambda config: config['settings'].update(llm_max_chunk_chars=25),
+], ids=["model", "prompt", "chunk_size"])
+def test_llm_cache_is_invalidated_by_model_prompt_and_options(tmp_path, ollama_server, raw_texts, change, capsys):
+    config = make_config(tmp_path, ollama_server)
+    pdf_processor.action_llm_cleanup_text(config, raw_texts)
+    requests_before = len(ollama_server.requests)
+
+    change(config)
+    pdf_processor.action_llm_cleanup_text(config, raw_texts)
+
+    new_requests = ollama_server.requests[requests_before:]
+    assert len(new_requests) >= len(raw_texts)
+    assert all(model == config['llm_model_name'] and prompt.startswith(config['prompts']['text_cleanup_prompt']) for model, prompt in new_requests)
+    assert "0 hits" in capsys.readouterr().out.split("LLM cleanup cache:")[-1]
+
+@pytest.mark.parametrize("text, max_chars, expected", [
+    ("short page", 100, ["short page"]),
+    ("any length", None, ["any length"]),
+    # Paragraphs are packed into chunks up to max_chars
+    ("aaaa\n\nbbbb\n\ncccc", 10, ["aaaa\n\nbbbb", "cccc"]),
+    ("aaaa\n\nbbbb\n\ncccc", 9, ["aaaa", "bbbb", "cccc"]),
+    # An oversized paragraph is split at its lines, then inside a line as a last resort
+    ("aa\n\nbbbb\nbbbb\nbbbb\n\ncc", 9, ["aa", "bbbb\nbbbb", "bbbb", "cc"]),
+    ("aa\n\nbbbbbbbbbbbb\n\ncc", 5, ["aa", "bbbbb", "bbbbb", "bb", "cc"]),
+])
+def test_split_text_for_llm(text, max_chars, expected):
+    assert pdf_processor.split_text_for_llm(text, max_chars) == expected
+
+def test_split_text_for_llm_keeps_order_and_limit():
+    paragraphs = [" ".join(f"p{p}w{w}" for w in range(p % 7 * 9 + 1)) for p in range(60)]
+    text = "\n\n".join(paragraphs)
+    chunks = pdf_processor.split_text_for_llm(text, 120)
+    assert all(len(chunk) <= 120 for chunk in chunks)
+    # Splitting only drops separators, so the text comes back in page order
+    assert "".join("".join(chunks).split()) == "".join(text.split())
+    # and a page whose paragraphs all fit in a chunk is restored exactly by joining at paragraphs
+    fitting = "\n\n".join(paragraph for paragraph in paragraphs if len(paragraph) <= 120)
+    assert "\n\n".join(pdf_processor.split_text_for_llm(fitting, 120)) == fitting
+
+class CannedResponse:
+    """A streamed requests response replaying canned NDJSON lines."""
+    def __init__(self, lines):
+        self.lines = lines
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self):
+        for line in self.lines:
+            yield line.encode("utf-8") if isinstance(line, str) else line
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+class CannedSession:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.payloads = []
+
+    def post(self, url, json=None, **kwargs):
+        self.payloads.append(json)
+        return CannedResponse(self.responses.pop(0))
+
+def ndjson(*messages):
+    return [json.dumps(message) for message in messages]
+
+STREAM_CONFIG = {
+    "ollama_url": "http://ollama.invalid/api/chat",
+    "llm_model_name": "cleaner:1",
+    "prompts": {"text_cleanup_prompt": PROMPT},
+    "settings": {"llm_retries": 0},
+}
+
+def test_clean_with_ollama_concatenates_streamed_chunks():
+    session = CannedSession(ndjson(
+        {"message": {"content": "# Fire"}, "done": False},
+        {"message": {"content": ""}, "done": False},
+        {"message": {"content": "ball\n"}, "done": False},
+        {"message": {"content": "Boom."}, "done": False},
+        {"done": True, "eval_count": 7, "eval_duration": 3_500_000_000},
+        {"message": {"content": "after done"}, "done": False},
+    ) + [""])
+    streamed = io.StringIO()
+
+    content, stats = pdf_processor.clean_with_ollama(STREAM_CONFIG, "# Flre\nBoom.", session=session, output_file=streamed)
+
+    assert content == streamed.getvalue() == "# Fireball\nBoom."
+    assert stats["eval_count"] == 7 and stats["eval_seconds"] == 3.5 and stats["ttfb"] is not None
+    assert session.payloads[0]["stream"] is True
+    assert session.payloads[0]["messages"][0]["content"] == PROMPT + "```markdown\n# Flre\nBoom.\n```"
+
+def test_clean_with_ollama_raises_on_error_mid_stream():
+    session = CannedSession(ndjson(
+        {"message": {"content": "half a "}, "done": False},
+        {"error": "model runner crashed"},
+        {"message": {"content": "never read"}, "done": False},
+    ))
+    streamed = io.StringIO()
+    with pytest.raises(RuntimeError, match="model runner crashed"):
+        pdf_processor.clean_with_ollama(STREAM_CONFIG, "text", session=session, output_file=streamed)
+    assert streamed.getvalue() == "half a "
+
+def test_llm_cleanup_file_reassembles_chunks_in_order(tmp_path, capsys):
+    text_path = tmp_path / "ocr_output" / "book" / "raw_text" / "book_pg4.txt"
+    text_path.parent.mkdir(parents=True)
+    text_path.write_text("first paragraph\n\nsecond paragraph\n\nthird", encoding="utf-8")
+    config = {**STREAM_CONFIG, "paths": {"ocr_output_dir": str(tmp_path / "ocr_output")}, "settings": {"llm_retries": 0, "llm_max_chunk_chars": 20}}
+    session = CannedSession(
+        ndjson({"message": {"content": "FIRST "}, "done": False}, {"message": {"content": "PARAGRAPH"}, "done": False}, {"done": True}),
+        ndjson({"message": {"content": "SECOND PARAGRAPH"}, "done": False}, {"done": True}),
+        ndjson({"message": {"content": "THIRD"}, "done": False}, {"done": True}),
+    )
+
+    output_path = pdf_processor.llm_cleanup_file(config, str(text_path), session)
+
+    assert [payload["messages"][0]["content"].split("```markdown\n")[1] for payload in session.payloads] == [
+        "first paragraph\n```", "second paragraph\n```", "third\n```",
+    ]
+    with open(output_path, encoding="utf-8") as f:
+        assert f.read() == "FIRST PARAGRAPH\n\nSECOND PARAGRAPH\n\nTHIRD"
+    assert not os.path.exists(output_path + ".part")
+
+def test_llm_cleanup_file_keeps_partial_output_when_the_stream_fails(tmp_path, capsys):
+    text_path = tmp_path / "ocr_output" / "book" / "raw_text" / "book_pg4.txt"
+    text_path.parent.mkdir(parents=True)
+    text_path.write_text("first\n\nsecond", encoding="utf-8")
+    config = {**STREAM_CONFIG, "paths": {"ocr_output_dir": str(tmp_path / "ocr_output")}, "settings": {"llm_retries": 0, "llm_max_chunk_chars": 6}}
+    session = CannedSession(
+        ndjson({"message": {"content": "FIRST"}, "done": False}, {"done": True}),
+        ndjson({"message": {"content": "SEC"}, "done": False}, {"error": "out of memory"}),
+    )
+
+    assert pdf_processor.llm_cleanup_file(config, str(text_path), session) is None
+
+    markdown_path = tmp_path / "ocr_output" / "book" / "cleaned_markdown" / "book_pg4.md"
+    assert not markdown_path.exists()
+    assert (tmp_path / "ocr_output" / "book" / "cleaned_markdown" / "book_pg4.md.part").read_text(encoding="utf-8") == "FIRST\n\nSEC"
+    assert "Ollama error: out of memory" in capsys.readouterr().out
+
+def test_llm_cleanup_file_does_not_save_or_cache_a_stream_cut_short(tmp_path, capsys):
+    text_path = tmp_path / "ocr_output" / "book" / "raw_text" / "book_pg4.txt"
+    text_path.parent.mkdir(parents=True)
+    text_path.write_text("first", encoding="utf-8")
+    config = {**STREAM_CONFIG, "paths": {"ocr_output_dir": str(tmp_path / "ocr_output")}, "settings": {"llm_retries": 0}}
+    llm_cache = pdf_processor.ResultCache(str(tmp_path / "llm_cache"))
+    # The connection drops before Ollama sends its done message
+    session = CannedSession(ndjson({"message": {"content": "FIR"}, "done": False}))
+
+    assert pdf_processor.llm_cleanup_file(config, str(text_path), session, llm_cache) is None
+
+    assert not (tmp_path / "ocr_output" / "book" / "cleaned_markdown" / "book_pg4.md").exists()
+    assert llm_cache.manifest['sources'] == {}
+    assert [path.name for path in (tmp_path / "llm_cache").rglob("*.json")] == []
+    assert "Ollama stream ended before done" in capsys.readouterr().out
@@ -0,0 +1,182 @@
+import base64
+import io
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+pytest.importorskip("requests")
+pytest.importorskip("pdf2image")
+
+import numpy as np
+from PIL import Image
+
+import pdf_processor
+
+OCR_DELAY = 0.25
+PAGE_COUNT = 8
+
+class MockOcrHandler(BaseHTTPRequestHandler):
+    """Mimics the PaddleX /layout-parsing endpoint with a fixed per-request delay."""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        payload = json.loads(body)
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+            fail = server.failures_remaining > 0
+            if fail:
+                server.failures_remaining -= 1
+
+        if fail:
+            self.send_error(503)
+            return
+
+        time.sleep(OCR_DELAY)
+        response = json.dumps({
+            "result": {
+                "layoutParsingResults": [{
+                    "prunedResult": {"parsing_res_list": [], "file_size": len(payload['file'])},
+                    "markdown": {"text": "# Page"}
+                }]
+            }
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def ocr_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockOcrHandler)
+    server.lock = threading.Lock()
+    server.request_count = 0
+    server.failures_remaining = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def page_images(tmp_path):
+    image_dir = tmp_path / "page_images" / "book"
+    image_dir.mkdir(parents=True)
+    paths = []
+    for page_num in range(1, PAGE_COUNT + 1):
+        path = image_dir / f"book_{str(page_num).zfill(6)}.png"
+        # Give every page distinct content so the OCR cache can't dedupe them
+        Image.new("RGB", (200, 260), (255, 255, 255 - page_num)).save(path)
+        paths.append(str(path))
+    return paths
+
+def make_config(tmp_path, server, concurrency):
+    return {
+        "ocr_endpoint_url": f"http://127.0.0.1:{server.server_address[1]}",
+        "paths": {"ocr_output_dir": str(tmp_path / f"ocr_output_{concurrency}")},
+        "settings": {
+            "image_resize_width": 100,
+            "ocr_concurrency": concurrency,
+            "ocr_timeout": 10,
+            "ocr_retries": 2,
+            "ocr_retry_backoff": 0.01
+        }
+    }
+
+def timed_ocr(config, image_paths):
+    start = time.perf_counter()
+    pdf_processor.action_ocr_images(config, image_paths)
+    return time.perf_counter() - start
+
+def test_concurrent_ocr_writes_same_outputs_faster(tmp_path, ocr_server, page_images):
+    serial_config = make_config(tmp_path, ocr_server, 1)
+    concurrent_config = make_config(tmp_path, ocr_server, 8)
+
+    serial_time = timed_ocr(serial_config, page_images)
+    concurrent_time = timed_ocr(concurrent_config, page_images)
+
+    for config in (serial_config, concurrent_config):
+        book_dir = os.path.join(config['paths']['ocr_output_dir'], "book")
+        assert sorted(os.listdir(os.path.join(book_dir, "json"))) == [f"book_pg{n}.json" for n in range(1, PAGE_COUNT + 1)]
+        assert len(os.listdir(os.path.join(book_dir, "markdown"))) == PAGE_COUNT
+
+    assert serial_time >= PAGE_COUNT * OCR_DELAY
+    assert concurrent_time < serial_time / 3
+
+def test_ocr_retries_server_errors(tmp_path, ocr_server, page_images):
+    ocr_server.failures_remaining = 2
+    config = make_config(tmp_path, ocr_server, 1)
+
+    assert pdf_processor.ocr_image(config, page_images[0]).endswith("book_pg1.json")
+    assert ocr_server.request_count == 3
+
+def test_ocr_cache_skips_network_for_unchanged_pages(tmp_path, ocr_server, page_images):
+    config = make_config(tmp_path, ocr_server, 4)
+    pdf_processor.action_ocr_images(config, page_images)
+    assert ocr_server.request_count == PAGE_COUNT
+
+    pdf_processor.action_ocr_images(config, page_images)
+    assert ocr_server.request_count == PAGE_COUNT
+
+    # Changing a request parameter invalidates the cached results
+    config['settings']['image_resize_width'] = 120
+    pdf_processor.action_ocr_images(config, page_images[:2])
+    assert ocr_server.request_count == PAGE_COUNT + 2
+
+    ocr_cache = pdf_processor.ResultCache(pdf_processor.get_ocr_cache_dir(config))
+    assert ocr_cache.manifest['runs'][-1]['stale'] == 2
+    assert ocr_cache.prune() == 2
+
+def legacy_ocr_payload(config, img_path):
+    """The request body and cache key as built before encoding moved in memory: the resized
+    page went through a numpy array, was saved as PNG and sent with requests' json=.
+    """
+    with Image.open(img_path) as page_image:
+        original_width, original_height = page_image.size
+        new_width = config['settings']['image_resize_width']
+        new_height = int(original_height * (new_width / original_width))
+        page_np = np.array(page_image.resize((new_width, new_height), Image.LANCZOS))
+    buffered = io.BytesIO()
+    Image.fromarray(page_np).save(buffered, format="PNG")
+    png_bytes = buffered.getvalue()
+    payload = {"file": base64.b64encode(png_bytes).decode("utf-8"), **pdf_processor.OCR_REQUEST_OPTIONS}
+    return json.dumps(payload).encode("utf-8"), pdf_processor.ResultCache.make_key(png_bytes, pdf_processor.OCR_REQUEST_OPTIONS, new_width)
+
+def test_in_memory_encoding_matches_legacy_request_body(tmp_path):
+    img_path = tmp_path / "book_000001.png"
+    # A gradient, so the resize and PNG filters have real work to do
+    pixels = np.fromfunction(lambda y, x, c: (x * 3 + y * 5 + c * 70) % 256, (260, 200, 3)).astype(np.uint8)
+    Image.fromarray(pixels).save(img_path)
+    config = {"settings": {"image_resize_width": 100}}
+
+    image_bytes, _, from_cache = pdf_processor.load_page_for_ocr(config, str(img_path))
+    legacy_body, legacy_key = legacy_ocr_payload(config, str(img_path))
+
+    assert not from_cache
+    assert pdf_processor.build_ocr_request_body(image_bytes) == legacy_body
+    assert pdf_processor.ResultCache.make_key(image_bytes, pdf_processor.OCR_REQUEST_OPTIONS, 100) == legacy_key
+
+def test_ocr_cache_key_is_stable_across_runs(tmp_path):
+    img_path = tmp_path / "book_000001.png"
+    Image.new("RGB", (200, 260), (250, 240, 230)).save(img_path)
+    config = {"settings": {"image_resize_width": 100, "resized_image_cache": True}}
+
+    encoded, _, first_from_cache = pdf_processor.load_page_for_ocr(config, str(img_path))
+    cached, _, second_from_cache = pdf_processor.load_page_for_ocr(config, str(img_path))
+    assert (first_from_cache, second_from_cache) == (False, True)
+    assert bytes(encoded) == cached
+
+    # The key only depends on the bytes and canonical JSON of the options, never on dict order or the process
+    key = pdf_processor.ResultCache.make_key(b"page bytes", dict(reversed(pdf_processor.OCR_REQUEST_OPTIONS.items())), 100)
+    assert key == "dbb44759d55e377f142c47b6dcc1930cd24f58a31f4f700eaffb02b914fa4a9a"
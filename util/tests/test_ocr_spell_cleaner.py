@@ -0,0 +1,192 @@
+import io
+import json
+import os
+import sys
+
+import pytest
+
+import ocr_spell_cleaner
+from spell_matcher import ApproximateNameIndex
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+import legacy
+
+FIREBALL = """Fireball
+Evocation [Fire]
+Level Sor/Wiz 3
+Components V, S, M
+Casting Time 1 standard action
+Range Long (400 ft. + 40 ft./level)
+Area 20-ft.-radius spread
+Duration Instantaneous
+Saving Throw Reflex half
+Spell Resistance Yes
+A fireball spell is an explosion of flame.
+"""
+
+# Blocks that exercise the order-dependent corners of the parser
+TRICKY_BLOCKS = [
+    FIREBALL,
+    "Bless Enchantment (Compulsion) Level: Sor/Wiz 3, Brd 2, Clr 1 Components: V, S, DF Range: 50 ft. Duration: 1 min./level The spell fills allies with courage.",
+    "Aid Enchantment Level: Clr 2, Good 2, Luck 2 Components: V, S, F DF Target: Living creature touched Targets: Up to one creature/level Saving Throw: None This spell grants aid.",
+    "Heal Conjuration (Healing) Level: Clr 6, Drd 7, Healing 6 Duration: Instantaneous Target: Creature touched Range: Touch It channels energy.",
+    "Alarm Abjuration Level: Brd 1, Rgr 1 Components: V, S, F/DF Spell Resistance: Maybe Alarm sounds. Conjuration effects stack.",
+    "Mending Transmutation Level: Components: V, S The object is repaired.",
+    "Nameless Level: Wiz 1 Duration: 1 round/level Nothing happens.",
+    "Wish Universal Components: V, XP Wish does anything.",
+    "Daze Enchantment Level: Sor/Wiz 0 Saving Throw: Will negates You daze the target.",
+    "Light Evocation [Light] Level: Brd 00, Clr 03 Components: V, M/DF Range: Touch The object shines.",
+]
+
+def test_formats_spell_block_as_markdown(capsys):
+    assert ocr_spell_cleaner.format_spell_block(FIREBALL) == (
+        "## Fireball\n"
+        "Evocation [Fire]\n"
+        "**Level:** Sor/Wiz 3\n"
+        "**Components:** V, S, M\n"
+        "**Casting Time:** 1 standard action\n"
+        "**Range:** Long (400 ft. + 40 ft./level)\n"
+        "**Area:** 20-ft.-radius spread\n"
+        "**Duration:** Instantaneous\n"
+        "**Saving Throw:** Reflex half\n"
+        "**Spell Resistance:** Yes\n"
+        "A fireball spell is an explosion of flame."
+    )
+
+@pytest.mark.parametrize("block", TRICKY_BLOCKS)
+def test_matches_legacy_formatter(block, capsys):
+    formatted = ocr_spell_cleaner.format_spell_block(block)
+    warnings = capsys.readouterr().out
+    assert formatted == legacy.format_spell_block(block)
+    assert warnings == capsys.readouterr().out
+
+@pytest.mark.parametrize("block", ["", "\n", "  \n\t "])
+def test_empty_block_formats_to_empty_string(block):
+    assert ocr_spell_cleaner.format_spell_block(block) == ""
+
+def legacy_segment(text, end_token):
+    blocks = []
+    start = 0
+    while (block_end := legacy.find_block_end(end_token, text[start:])) != -1:
+        blocks.append(text[start:start + block_end])
+        start += block_end + len(end_token)
+    if text[start:].strip():
+        blocks.append(text[start:])
+    return blocks
+
+def test_block_end_counts_keyword_cut_off_by_end_token():
+    # "Target" only stands alone once the block is cut before the "s" of the end token
+    buffer = "x" * 100 + " Level Target" + "sx rest"
+    assert ocr_spell_cleaner.find_block_end("s", buffer) == legacy.find_block_end("s", buffer) == buffer.index("sx rest")
+    assert not ocr_spell_cleaner.validate_spell_block(buffer)
+
+@pytest.mark.parametrize("end_token", ["---", "-", ".", "Target"])
+def test_segmenter_matches_legacy_find_block_end(end_token):
+    text = "---".join(TRICKY_BLOCKS * 3) + "--- trailing notes"
+    segmenter = ocr_spell_cleaner.SpellBlockSegmenter(end_token)
+    assert list(segmenter.segment(text)) == legacy_segment(text, end_token)
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1 << 20])
+def test_delimited_blocks_match_split_across_chunk_boundaries(chunk_size):
+    text = "a---b----c--\n---" + "---".join(TRICKY_BLOCKS) + "--"
+    assert list(ocr_spell_cleaner.iter_delimited_blocks(io.StringIO(text), chunk_size=chunk_size)) == text.split("---")
+
+def test_format_spell_stream_writes_blocks_in_order(capsys):
+    source = io.StringIO("---".join(TRICKY_BLOCKS) + "---\n")
+    output = io.StringIO()
+    assert ocr_spell_cleaner.format_spell_stream(source, output) == len(TRICKY_BLOCKS)
+    assert output.getvalue() == "".join(legacy.format_spell_block(block) + "\n---\n" for block in TRICKY_BLOCKS)
+
+def test_worker_pool_keeps_order_and_groups_warnings(capsys):
+    text = "---".join(TRICKY_BLOCKS * 20)
+    serial_output = io.StringIO()
+    ocr_spell_cleaner.format_spell_stream(io.StringIO(text), serial_output)
+    serial_warnings = capsys.readouterr().out
+
+    parallel_output = io.StringIO()
+    written = ocr_spell_cleaner.format_spell_stream(io.StringIO(text), parallel_output, workers=2)
+    assert written == len(TRICKY_BLOCKS) * 20
+    assert parallel_output.getvalue() == serial_output.getvalue()
+    assert capsys.readouterr().out == serial_warnings
+    assert "[block 5] Invalid spell resistance value for Alarm: : Maybe" in serial_warnings.splitlines()[8]
+
+def test_parse_spell_block_returns_typed_record(capsys):
+    record = ocr_spell_cleaner.parse_spell_block(FIREBALL)
+    assert record == {
+        "name": "Fireball",
+        "parsed": True,
+        "school": "Evocation [Fire]",
+        "levels": [{"type": "Sor/Wiz", "level": 3, "level_text": "3"}],
+        "components": ["V", "S", "M"],
+        "casting_time": "1 standard action",
+        "range": "Long (400 ft. + 40 ft./level)",
+        "area": "20-ft.-radius spread",
+        "effect": None,
+        "target": None,
+        "targets": None,
+        "duration": "Instantaneous",
+        "saving_throw": "Reflex half",
+        "spell_resistance": "Yes",
+        "description": "A fireball spell is an explosion of flame.",
+    }
+    assert list(record) == ocr_spell_cleaner.SPELL_RECORD_FIELDS
+
+def test_record_writers_share_one_parse(capsys):
+    source = io.StringIO("---".join(TRICKY_BLOCKS) + "---\n")
+    jsonl, markdown, columnar = io.StringIO(), io.StringIO(), io.StringIO()
+    writers = [
+        ocr_spell_cleaner.JsonlSpellWriter(jsonl),
+        ocr_spell_cleaner.MarkdownSpellWriter(markdown),
+        ocr_spell_cleaner.ColumnarSpellWriter(columnar),
+    ]
+    assert ocr_spell_cleaner.write_spell_records(ocr_spell_cleaner.iter_spell_records(source), writers) == len(TRICKY_BLOCKS)
+
+    records = [json.loads(line) for line in jsonl.getvalue().splitlines()]
+    assert [record["name"] for record in records][:2] == ["Fireball", "Bless"]
+    assert markdown.getvalue() == "".join(legacy.format_spell_block(block) + "\n---\n" for block in TRICKY_BLOCKS)
+
+    table = json.loads(columnar.getvalue())
+    assert table["row_count"] == len(records)
+    assert table["columns"]["name"] == [record["name"] for record in records]
+    assert table["columns"]["text"] == [record.get("text") for record in records]
+
+def test_insert_reads_parsed_records(tmp_path, capsys):
+    insert_spell_description = pytest.importorskip("insert_spell_description")
+    records_path = tmp_path / "spells.jsonl"
+    with open(records_path, "w", encoding="utf-8") as output:
+        ocr_spell_cleaner.write_spell_records(
+            ocr_spell_cleaner.iter_spell_records(io.StringIO("---".join(TRICKY_BLOCKS))),
+            [ocr_spell_cleaner.JsonlSpellWriter(output)],
+        )
+    spells = list(insert_spell_description.read_spell_records(records_path))
+    assert spells[0] == {"name": "Fireball", "description": "A fireball spell is an explosion of flame."}
+    assert "Wish" not in [spell["name"] for spell in spells]
+
+def test_parse_metrics_count_failures_and_time_stages(capsys):
+    metrics = ocr_spell_cleaner.ParseMetrics(slowest_count=3)
+    records = list(ocr_spell_cleaner.iter_spell_records(io.StringIO("---".join(TRICKY_BLOCKS) + "---"), metrics=metrics))
+    report = json.loads(json.dumps(metrics.report()))
+
+    assert report["blocks"] == len(TRICKY_BLOCKS) + 1
+    assert report["empty_blocks"] == 1
+    assert report["parsed"] + report["unparsed"] == len(records)
+    assert report["failures_by_kind"]["missing_level"] == 1  # Wish
+    assert report["failures_by_kind"]["unparsed_levels"] == 1  # Mending
+    assert report["failures_by_field"]["levels"] == 2
+    assert report["fields_filled"]["components"] >= 1
+    assert report["stage_timings"]["normalize"]["count"] == len(TRICKY_BLOCKS) + 1
+    assert {"school_split", "level_scan", "label_scan", "spell_resistance", "duration", "components", "saving_throw"} <= set(report["stage_timings"])
+    assert len(report["slowest_blocks"]) == 3
+    assert report["slowest_blocks"][0]["us"] >= report["slowest_blocks"][-1]["us"]
+
+def test_spell_records_canonicalize_names_with_name_index(capsys):
+    name_index = ApproximateNameIndex(["Fireball", "Bless", "Daze", "Heal"])
+    blocks = [FIREBALL.replace("Fireball", "Firebal1", 1), TRICKY_BLOCKS[1], TRICKY_BLOCKS[2]]
+    metrics = ocr_spell_cleaner.ParseMetrics()
+    records = list(ocr_spell_cleaner.iter_spell_records(io.StringIO("---".join(blocks)), metrics=metrics, name_index=name_index))
+
+    assert [record["name"] for record in records] == ["Fireball", "Bless", "Aid"]
+    assert metrics.report()["failures_by_kind"]["unknown_name"] == 1
+    output = capsys.readouterr().out
+    assert "[block 1] Canonicalized spell name 'Firebal1' to 'Fireball'" in output
+    assert "[block 3] Unknown spell name Aid" in output
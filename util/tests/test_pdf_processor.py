@@ -0,0 +1,227 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+pdf_processor = pytest.importorskip("pdf_processor")
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Generous bound on how long a pipeline test may take; a hang fails instead of blocking the run
+PIPELINE_TIMEOUT = 10
+
+def run_with_timeout(func):
+    """Runs func in a thread and fails the test if it has not returned within PIPELINE_TIMEOUT."""
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault("value", func()), daemon=True)
+    thread.start()
+    thread.join(PIPELINE_TIMEOUT)
+    assert not thread.is_alive(), "pipeline did not shut down"
+    return result["value"]
+
+def collector():
+    """A last pipeline stage that records the items reaching it."""
+    items = []
+    lock = threading.Lock()
+    def collect(item):
+        with lock:
+            items.append(item)
+        return item
+    return collect, items
+
+def test_pipeline_keeps_order_with_one_worker_per_stage(capsys):
+    collect, collected = collector()
+    stages = [
+        pdf_processor.PipelineStage("split", lambda page_range: list(range(page_range[0], page_range[1] + 1)), 1, 2),
+        pdf_processor.PipelineStage("double", lambda page: page * 2 if page != 5 else None, 1, 2),
+        pdf_processor.PipelineStage("collect", collect, 1, 2),
+    ]
+    run_with_timeout(lambda: pdf_processor.run_stages(stages, [(1, 3), (4, 6), (7, 7)]))
+
+    # Page 5 is dropped as a failed page without stopping the others
+    assert collected == [2, 4, 6, 8, 12, 14]
+    assert [(stage.processed, stage.failed, stage.error) for stage in stages] == [(3, 0, None), (7, 1, None), (6, 0, None)]
+
+def test_pipeline_with_many_workers_delivers_every_item(capsys):
+    collect, collected = collector()
+    def slow_square(item):
+        time.sleep(0.001 * (item % 3))
+        return item * item
+    stages = [pdf_processor.PipelineStage("square", slow_square, 4, 3), pdf_processor.PipelineStage("collect", collect, 2, 3)]
+    run_with_timeout(lambda: pdf_processor.run_stages(stages, range(50)))
+    assert sorted(collected) == [item * item for item in range(50)]
+
+def test_pipeline_queues_bound_work_ahead_of_a_slow_stage(capsys):
+    release = threading.Event()
+    collect, collected = collector()
+    stages = [
+        pdf_processor.PipelineStage("produce", lambda item: item, 1, 2),
+        pdf_processor.PipelineStage("wait", lambda item: release.wait() and item, 1, 2),
+        pdf_processor.PipelineStage("collect", collect, 1, 2),
+    ]
+    runner = threading.Thread(target=pdf_processor.run_stages, args=(stages, range(20)), daemon=True)
+    runner.start()
+    time.sleep(0.2)
+    # One item held by the waiting worker, two in its queue and one blocked on putting the next
+    assert stages[0].processed <= 4
+    release.set()
+    runner.join(PIPELINE_TIMEOUT)
+    assert not runner.is_alive()
+    assert collected == list(range(20))
+
+def test_pipeline_stops_every_stage_when_one_raises(capsys):
+    collect, collected = collector()
+    def fail_on_three(item):
+        if item == 3:
+            raise RuntimeError("poppler crashed")
+        return item
+    stages = [
+        pdf_processor.PipelineStage("produce", lambda item: item, 2, 1),
+        pdf_processor.PipelineStage("fail", fail_on_three, 1, 1),
+        pdf_processor.PipelineStage("collect", collect, 1, 1),
+    ]
+    run_with_timeout(lambda: pdf_processor.run_stages(stages, range(1000)))
+
+    assert str(stages[1].error) == "poppler crashed"
+    assert 3 not in collected
+    assert len(collected) < 10
+    assert stages[0].processed < 1000
+    assert "Stopping the pipeline" in capsys.readouterr().out
+
+@pytest.mark.parametrize("pages, max_range_len, expected", [
+    ([], None, []),
+    ([5], None, [(5, 5)]),
+    ([1, 2, 3, 4], None, [(1, 4)]),
+    ([7, 3, 1, 2, 9, 8], None, [(1, 3), (7, 9)]),
+    ([2, 4, 6], None, [(2, 2), (4, 4), (6, 6)]),
+    ([1, 2, 3, 4, 5, 6, 7], 3, [(1, 3), (4, 6), (7, 7)]),
+    ([1, 2, 3, 10, 11, 12, 13], 2, [(1, 2), (3, 3), (10, 11), (12, 13)]),
+    ([1, 2, 3], 1, [(1, 1), (2, 2), (3, 3)]),
+])
+def test_group_page_ranges(pages, max_range_len, expected):
+    assert pdf_processor.group_page_ranges(pages, max_range_len) == expected
+
+def test_extract_images_rasterizes_missing_pages_in_parallel_ranges(tmp_path, monkeypatch, capsys):
+    image_dir = tmp_path / "page_images"
+    book_dir = image_dir / "book"
+    book_dir.mkdir(parents=True)
+    for page_num in (3, 4):
+        (book_dir / f"book_{page_num:06d}.png").write_bytes(b"cached")
+    calls = []
+    def fake_convert_from_path(pdf_path, first_page, last_page, output_folder, output_file, **options):
+        calls.append((first_page, last_page))
+        paths = []
+        for page_num in range(first_page, last_page + 1):
+            # poppler names its output <prefix>-<page>.png
+            path = f"{output_folder}/{output_file}-{page_num:02d}.png"
+            with open(path, "wb") as f:
+                f.write(b"page %d" % page_num)
+            paths.append(path)
+        return paths
+    monkeypatch.setattr(pdf_processor, "pdfinfo_from_path", lambda pdf_path: {"Pages": 12})
+    monkeypatch.setattr(pdf_processor, "convert_from_path", fake_convert_from_path)
+    config = {"paths": {"image_dir": str(image_dir)}, "settings": {"extract_workers": 3}}
+    pdf_path = tmp_path / "book.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4")
+
+    image_paths = pdf_processor.action_extract_images(config, str(pdf_path), 1, 10)
+
+    # Pages 1-2 and 5-10 are missing: eight pages split into ranges of at most ceil(8 / 3)
+    assert sorted(calls) == [(1, 2), (5, 7), (8, 10)]
+    assert image_paths == [str(book_dir / f"book_{page_num:06d}.png") for page_num in range(1, 11)]
+    assert (book_dir / "book_000006.png").read_bytes() == b"page 6"
+    assert not [name for name in book_dir.iterdir() if name.name.startswith(".raster_")]
+
+def test_extract_page_range_keeps_pages_from_ranges_that_rendered(tmp_path, monkeypatch, capsys):
+    from run_state import RunState
+    def fake_convert_from_path(pdf_path, first_page, last_page, output_folder, output_file, **options):
+        if first_page == 4:
+            raise RuntimeError("poppler crashed")
+        path = f"{output_folder}/{output_file}-{first_page:02d}.png"
+        with open(path, "wb") as f:
+            f.write(b"page")
+        return [path]
+    monkeypatch.setattr(pdf_processor, "convert_from_path", fake_convert_from_path)
+    pdf_path = tmp_path / "book.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4")
+    image_dir = tmp_path / "book"
+    image_dir.mkdir()
+    (image_dir / "book_000003.png").write_bytes(b"cached")
+    run_state = RunState(str(tmp_path / "state.sqlite"))
+
+    # Pages 2 and 4 are separate ranges around the cached page 3
+    image_paths = pdf_processor.extract_page_range(str(pdf_path), "book", str(image_dir), 2, 4, run_state)
+
+    assert image_paths == [str(image_dir / "book_000002.png"), str(image_dir / "book_000003.png")]
+    assert run_state.get_failed_pages("extract_images") == [(4, "poppler crashed")]
+    assert "Failed to extract pages 4-4" in capsys.readouterr().out
+    run_state.close()
+
+def read_text(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+def write_ocr_pages(tmp_path, pages):
+    json_dir = tmp_path / "ocr_output" / "book" / "json"
+    json_dir.mkdir(parents=True)
+    paths = []
+    for page_num, page in enumerate(pages, start=1):
+        path = json_dir / f"book_pg{page_num}.json"
+        path.write_text(json.dumps(page), encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+def process_pages(tmp_path, name, json_paths, workers):
+    config = {"paths": {"ocr_output_dir": str(tmp_path / name)}, "settings": {"process_workers": workers}}
+    raw_text_paths = pdf_processor.action_process_ocr_json(config, json_paths, combined_text=True)
+    pages = {os.path.basename(path): read_text(path) for path in raw_text_paths}
+    combined = read_text(pdf_processor.get_combined_text_path(config, "book"))
+    return [os.path.basename(path) for path in raw_text_paths], pages, combined
+
+def test_process_pool_matches_serial_processing(tmp_path, capsys):
+    with open(os.path.join(FIXTURES_DIR, "layout_pages.json"), encoding="utf-8") as f:
+        layout_pages = json.load(f)
+    # Eleven pages, so pages 10 and 11 must come after 9, and an empty page that yields no text
+    json_paths = write_ocr_pages(tmp_path, [*layout_pages[:5], {"parsing_res_list": []}, *layout_pages[5:10]])
+
+    serial = process_pages(tmp_path, "serial", json_paths, 1)
+    pooled = process_pages(tmp_path, "pooled", json_paths, 3)
+
+    assert pooled == serial
+    names, pages, combined = serial
+    assert names == [f"book_pg{page_num}.txt" for page_num in range(1, 12) if page_num != 6]
+    assert combined == "".join(pages[name] + "\n" for name in names)
+    assert "book_pg6.json: no ordered text extracted" in capsys.readouterr().out
+
+def test_pipeline_processes_ocr_json_in_a_process_pool_and_combines_text(tmp_path, capsys):
+    with open(os.path.join(FIXTURES_DIR, "layout_pages.json"), encoding="utf-8") as f:
+        layout_pages = json.load(f)
+    json_paths = write_ocr_pages(tmp_path, layout_pages[:4])
+    serial = process_pages(tmp_path, "serial", json_paths, 1)
+    pdf_path = tmp_path / "book.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4")
+    config = {"paths": {"ocr_output_dir": str(tmp_path / "ocr_output")}, "settings": {"process_workers": 2}}
+
+    pdf_processor.run_pipeline(config, str(pdf_path), ["process_ocr_json"], None, None, combined_text=True)
+
+    raw_text_dir = tmp_path / "ocr_output" / "book" / "raw_text"
+    names, pages, combined = serial
+    assert sorted(path.name for path in raw_text_dir.iterdir()) == sorted(names)
+    assert read_text(pdf_processor.get_combined_text_path(config, "book")) == combined
+    # Only stages that OCR open the OCR cache
+    assert not (tmp_path / "ocr_output" / ".ocr_cache").exists()
+
+def test_prune_ocr_cache_needs_no_pdf(tmp_path, monkeypatch, capsys):
+    config_path = tmp_path / "ocr.json"
+    config_path.write_text(json.dumps({"paths": {"ocr_output_dir": str(tmp_path / "ocr_output")}, "settings": {}}), encoding="utf-8")
+
+    monkeypatch.setattr("sys.argv", ["pdf_processor.py", "--config_file", str(config_path), "--actions", "prune_ocr_cache"])
+    pdf_processor.main()
+    assert "Pruned 0 orphaned OCR cache entries" in capsys.readouterr().out
+
+    monkeypatch.setattr("sys.argv", ["pdf_processor.py", "--config_file", str(config_path), "--actions", "prune_ocr_cache", "ocr_images"])
+    with pytest.raises(SystemExit):
+        pdf_processor.main()
+    assert "--pdf_file is required" in capsys.readouterr().err
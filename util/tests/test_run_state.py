@@ -0,0 +1,164 @@
+import os
+
+import pytest
+
+from run_state import RunState
+
+def write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+@pytest.fixture
+def pages(tmp_path):
+    """A run folder with the OCR JSON inputs and the raw text outputs of process_ocr_json."""
+    (tmp_path / "json").mkdir()
+    (tmp_path / "raw_text").mkdir()
+    return tmp_path
+
+def make_stage(pages):
+    """Returns a stage function for run_item that writes the page's output and counts its runs."""
+    runs = []
+    def produce(input_path):
+        output_path = str(pages / "raw_text" / os.path.basename(input_path).replace(".json", ".txt"))
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write("text of " + os.path.basename(input_path))
+        runs.append(input_path)
+        return output_path
+    return produce, runs
+
+def test_resume_skips_pages_whose_input_is_unchanged(pages, capsys):
+    input_path = write(pages / "json" / "book_pg7.json", "{}")
+    produce, runs = make_stage(pages)
+
+    with_state = RunState(str(pages / "state.sqlite"), resume=True)
+    first = with_state.run_item("process_ocr_json", input_path, lambda: produce(input_path), "opts")
+    second = with_state.run_item("process_ocr_json", input_path, lambda: produce(input_path), "opts")
+
+    assert first == second == str(pages / "raw_text" / "book_pg7.txt")
+    assert runs == [input_path]
+    assert with_state.skipped == 1
+    assert "Skipping process_ocr_json for page 7" in capsys.readouterr().out
+    with_state.close()
+
+def test_changed_input_or_settings_rerun_the_page(pages, capsys):
+    input_path = write(pages / "json" / "book_pg7.json", "{}")
+    produce, runs = make_stage(pages)
+    state = RunState(str(pages / "state.sqlite"), resume=True)
+
+    state.run_item("process_ocr_json", input_path, lambda: produce(input_path), "opts")
+    write(pages / "json" / "book_pg7.json", '{"changed": true}')
+    state.run_item("process_ocr_json", input_path, lambda: produce(input_path), "opts")
+    state.run_item("process_ocr_json", input_path, lambda: produce(input_path), "other opts")
+
+    assert len(runs) == 3
+    assert state.skipped == 0
+    state.close()
+
+def test_without_resume_every_page_runs(pages, capsys):
+    input_path = write(pages / "json" / "book_pg7.json", "{}")
+    produce, runs = make_stage(pages)
+    state = RunState(str(pages / "state.sqlite"))
+
+    state.run_item("process_ocr_json", input_path, lambda: produce(input_path))
+    state.run_item("process_ocr_json", input_path, lambda: produce(input_path))
+
+    assert len(runs) == 2
+    state.close()
+
+def test_deleted_output_is_redone_and_not_listed(pages, capsys):
+    input_path = write(pages / "json" / "book_pg7.json", "{}")
+    produce, runs = make_stage(pages)
+    state = RunState(str(pages / "state.sqlite"), resume=True)
+
+    output_path = state.run_item("process_ocr_json", input_path, lambda: produce(input_path))
+    os.remove(output_path)
+    # The rescan a changed directory triggers forgets the deleted output
+    state.import_outputs("process_ocr_json", [])
+    assert state.get_outputs("process_ocr_json") == []
+    assert state.get_current_output("process_ocr_json", input_path) is None
+
+    state.run_item("process_ocr_json", input_path, lambda: produce(input_path))
+    assert len(runs) == 2
+    assert state.get_outputs("process_ocr_json") == [output_path]
+    state.close()
+
+def test_failures_are_recorded_and_retried(pages, capsys):
+    input_path = write(pages / "json" / "book_pg7.json", "{}")
+    state = RunState(str(pages / "state.sqlite"), resume=True)
+    def fail():
+        raise RuntimeError("endpoint down")
+
+    with pytest.raises(RuntimeError):
+        state.run_item("process_ocr_json", input_path, fail)
+    assert state.get_failed_pages("process_ocr_json") == [(7, "endpoint down")]
+    assert state.get_current_output("process_ocr_json", input_path) is None
+    state.close()
+
+def test_imported_outputs_are_trusted_only_if_newer_than_their_input(pages, capsys):
+    old_input = write(pages / "json" / "book_pg1.json", "{}")
+    new_input = write(pages / "json" / "book_pg2.json", "{}")
+    old_output = write(pages / "raw_text" / "book_pg1.txt", "one")
+    stale_output = write(pages / "raw_text" / "book_pg2.txt", "two")
+    os.utime(old_input, (1000, 1000))
+    os.utime(stale_output, (1000, 1000))
+    state = RunState(str(pages / "state.sqlite"), resume=True)
+
+    assert state.import_outputs("process_ocr_json", [old_output, stale_output, str(pages / "raw_text" / "notes.txt")]) == 2
+    assert state.is_scanned("process_ocr_json")
+    assert state.get_outputs("process_ocr_json", 2, 2) == [stale_output]
+
+    assert state.get_current_output("process_ocr_json", old_input) == old_output
+    assert state.get_current_output("process_ocr_json", new_input) is None
+    # A trusted import is recorded with its input's hash from then on
+    assert state.is_current("process_ocr_json", 1, old_input, None) is False
+    state.close()
+
+def test_get_stage_files_follows_the_directory(pages, capsys):
+    pdf_processor = pytest.importorskip("pdf_processor")
+    raw_text = pages / "raw_text"
+    first = write(raw_text / "book_pg1.txt", "one")
+    second = write(raw_text / "book_pg2.txt", "two")
+    state = RunState(str(pages / "state.sqlite"))
+
+    def stage_files(start_page=None, end_page=None):
+        return pdf_processor.get_stage_files(state, "process_ocr_json", str(raw_text), "book", start_page, end_page, "txt")
+
+    assert stage_files() == [first, second]
+    assert stage_files(2, 2) == [second]
+
+    # An untracked run adds a page and one is deleted to force a redo
+    os.remove(first)
+    third = write(raw_text / "book_pg3.txt", "three")
+    os.utime(raw_text, (os.path.getatime(raw_text), state.get_scanned_at("process_ocr_json") + 1))
+    assert stage_files() == [second, third]
+    assert "Imported 1 existing process_ocr_json outputs" in capsys.readouterr().out
+    state.close()
+
+def test_tracked_writes_do_not_trigger_a_rescan(tmp_path, capsys):
+    pdf_processor = pytest.importorskip("pdf_processor")
+    config = {"paths": {"ocr_output_dir": str(tmp_path)}}
+    json_dir = tmp_path / "book" / "json"
+    raw_text = tmp_path / "book" / "raw_text"
+    json_dir.mkdir(parents=True)
+    raw_text.mkdir()
+    first = write(raw_text / "book_pg1.txt", "one")
+    state = RunState(str(tmp_path / "state.sqlite"))
+    def stage_files():
+        return pdf_processor.get_stage_files(state, "process_ocr_json", str(raw_text), "book", None, None, "txt")
+    assert stage_files() == [first]
+    capsys.readouterr()
+
+    input_path = write(json_dir / "book_pg2.json", "{}")
+    def produce():
+        output_path = write(raw_text / "book_pg2.txt", "two")
+        # Make sure the write moves the directory's modification time on coarse clocks too
+        os.utime(raw_text, (os.path.getatime(raw_text), state.get_scanned_at("process_ocr_json") + 1))
+        return output_path
+    synced_dirs = pdf_processor.get_synced_stage_dirs(state, config, "book", ["process_ocr_json"])
+    second = state.run_item("process_ocr_json", input_path, produce)
+    pdf_processor.mark_stage_dirs_synced(state, synced_dirs)
+
+    assert synced_dirs == {"process_ocr_json": str(raw_text)}
+    assert stage_files() == [first, second]
+    assert "Imported" not in capsys.readouterr().out
+    state.close()
@@ -0,0 +1,51 @@
+import csv
+import json
+import sys
+
+import pytest
+
+import spell_audit
+
+HEADERS = ["Spell Name", "School", "Comp", "Full Refer", "Bard", "Wizard", "Description"]
+ROWS = [
+    ["Fireball", "evo[fire]", "V, S, M", "PH: pg 231, SC: pg 9", "", "3", "A burst of flame."],
+    ["Daze", "en[compulsion]", "V, S", "PH: pg 217", "0", "0", "Dazed."],
+    ["Bogus", "xyz", "", "SC: pg 12", "", "", ""],
+    ["Bogus Too", "xyz", "", "", "", "", ""],
+]
+
+@pytest.fixture
+def spells_csv(tmp_path):
+    path = tmp_path / "all_spells.csv"
+    with open(path, "w", newline="", encoding="cp1252") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADERS)
+        writer.writerows(ROWS)
+    return str(path)
+
+def test_reports_share_one_pass(spells_csv, monkeypatch):
+    reads = []
+    iter_spell_rows = spell_audit.iter_spell_rows
+    monkeypatch.setattr(spell_audit, "iter_spell_rows", lambda path, columns: reads.append(columns) or iter_spell_rows(path, columns))
+    reports = [report() for report in spell_audit.REPORTS.values()]
+
+    assert spell_audit.run_reports(spells_csv, reports) == len(ROWS)
+    assert len(reads) == 1
+    field_lengths, schools, class_levels, source_books = (report.result() for report in reports)
+    assert field_lengths == {"Spell Name": 9, "School": 14, "Comp": 7, "Description": 17}
+    assert schools["invalid_values"] == {"xyz": {"count": 2, "invalid": {"school": "xyz"}}}
+    assert class_levels == [["Fireball", "Wizard", "3"], ["Daze", "Bard", "0"], ["Daze", "Wizard", "0"]]
+    assert source_books == {"PH": 2, "SC": 2}
+
+def test_main_writes_report_files_and_bundle(spells_csv, tmp_path, monkeypatch, capsys):
+    bundle_path = tmp_path / "audit.json"
+    monkeypatch.setattr(sys, "argv", ["spell_audit.py", "-f", spells_csv, "-r", "class_levels", "source_books", "-o", str(tmp_path / "out"), "--bundle", str(bundle_path)])
+    spell_audit.main()
+
+    with open(tmp_path / "out" / "class_levels.csv", newline="") as f:
+        assert list(csv.reader(f))[0] == ["Fireball", "Wizard", "3"]
+    with open(tmp_path / "out" / "source_books.json") as f:
+        assert json.load(f) == {"PH": 2, "SC": 2}
+    with open(bundle_path) as f:
+        assert set(json.load(f)) == {"rows", "class_levels", "source_books"}
+    assert "Audited 4 rows in one pass" in capsys.readouterr().err
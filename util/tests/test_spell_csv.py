@@ -0,0 +1,151 @@
+import csv
+import io
+import sys
+
+import pytest
+
+import spell_csv
+import spell_dumper
+import spell_field_size
+import spell_parser
+
+HEADERS = ["Spell Name", "School", "Level", "Level", "Bard", "Wizard", "Description"]
+ROWS = [
+    ["Fireball", "Evo", "3", "", "", "3", "A burst of flame."],
+    ["Daze", "En[Compulsion]", "0", "x", "0", "0", "Café – dazed."],
+    ["Short", "Abj"],
+]
+
+@pytest.fixture
+def spells_csv(tmp_path):
+    path = tmp_path / "all_spells.csv"
+    with open(path, "w", newline="", encoding="cp1252") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADERS)
+        writer.writerows(ROWS)
+    return str(path)
+
+def test_make_unique_headers_numbers_repeats():
+    assert spell_csv.make_unique_headers(["A", "B", "A", "A"]) == ["A", "B", "A1", "A2"]
+
+def test_iter_spell_rows_projects_requested_columns(spells_csv):
+    rows = list(spell_csv.iter_spell_rows(spells_csv, ["Description", "Spell Name", "Level1", "Missing"]))
+    assert rows == [
+        ("A burst of flame.", "Fireball", "", None),
+        ("Café – dazed.", "Daze", "x", None),
+        (None, "Short", None, None),
+    ]
+    assert list(spell_csv.iter_spell_rows(spells_csv, ["School"])) == [("Evo",), ("En[Compulsion]",), ("Abj",)]
+    assert spell_csv.read_spell_csv_headers(spells_csv) == ["Spell Name", "School", "Level", "Level1", "Bard", "Wizard", "Description"]
+
+def test_header_ordered_follows_the_csv_columns(spells_csv, tmp_path):
+    assert spell_csv.header_ordered(spells_csv, ["Wizard", "Missing", "Bard", "Spell Name"]) == ["Spell Name", "Bard", "Wizard", "Missing"]
+    assert spell_csv.header_ordered(str(tmp_path / "nope.csv"), ["Wizard", "Bard"]) == ["Wizard", "Bard"]
+
+def test_spell_parser_prints_classes_in_column_order(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "all_spells.csv"
+    with open(path, "w", newline="", encoding="cp1252") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Spell Name", "Wizard", "Bard", "Full Refer"])
+        writer.writerows([["Sleep", "1", "1", "PH: pg 280"], ["Unlisted", "", "", "PH: pg 1"], ["Glitterdust", "2", "", "PH: pg 236, SC: pg 9"]])
+    monkeypatch.setattr(sys, "argv", ["spell_parser.py", "-f", str(path)])
+    spell_parser.main()
+    # Wizard is class 51 and Bard class 5, but Wizard's column comes first
+    assert capsys.readouterr().out.splitlines() == [
+        "0 {'Spell Name': 'Sleep', 'Source': [{'Book': 'PH', 'Page': '280'}], 'Classes': [{'Class': 51, 'Level': '1'}, {'Class': 5, 'Level': '1'}]}",
+        "1 {'Spell Name': 'Glitterdust', 'Source': [{'Book': 'PH', 'Page': '236'}, {'Book': 'SC', 'Page': '9'}], 'Classes': [{'Class': 51, 'Level': '2'}]}",
+    ]
+
+def test_iter_spell_rows_reports_missing_file(tmp_path, capsys):
+    assert list(spell_csv.iter_spell_rows(str(tmp_path / "nope.csv"), ["School"])) == []
+    assert "not found" in capsys.readouterr().out
+
+def test_spell_field_size_reports_longest_values(spells_csv, monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["spell_field_size.py", "-f", spells_csv])
+    spell_field_size.main()
+    assert capsys.readouterr().out.splitlines() == [
+        "Field: Spell Name Max Len: 8",
+        "Field: School Max Len: 14",
+        "Field: Description Max Len: 17",
+    ]
+
+def test_spell_dumper_lists_class_levels(spells_csv, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data_extracts").mkdir()
+    monkeypatch.setattr(sys, "argv", ["spell_dumper.py", "-f", spells_csv])
+    spell_dumper.main()
+    with open(tmp_path / "data_extracts" / "spell_class_list.csv", newline="") as f:
+        assert list(csv.reader(f)) == [["Fireball", "Wizard", "3"], ["Daze", "Bard", "0"], ["Daze", "Wizard", "0"]]
+
+def test_spell_dumper_writes_load_data_tsv(spells_csv, tmp_path):
+    output = io.StringIO()
+    rows = [("Fireball", "Wizard", "3"), ("Odd\tName\\", "Bard", "0")]
+    assert spell_dumper.write_class_levels(rows, [spell_dumper.ClassLevelTsvWriter(output)]) == 2
+    assert output.getvalue() == "Fireball\tWizard\t3\nOdd\\tName\\\\\tBard\t0\n"
+    assert list(spell_dumper.iter_class_levels(spells_csv)) == [("Fireball", "Wizard", "3"), ("Daze", "Bard", "0"), ("Daze", "Wizard", "0")]
+
+def test_spell_dumper_skips_rows_without_a_name(tmp_path):
+    path = tmp_path / "all_spells.csv"
+    with open(path, "w", newline="", encoding="cp1252") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Bard", "Wizard", "Spell Name"])
+        # An empty name, and a row too short to have one, which reads as None
+        writer.writerows([["1", "1", "Sleep"], ["2", "", ""], ["3"], ["2", "2", "Glitterdust"]])
+    output = io.StringIO()
+    assert spell_dumper.write_class_levels(spell_dumper.iter_class_levels(str(path)), [spell_dumper.ClassLevelTsvWriter(output)]) == 4
+    assert output.getvalue() == "Sleep\tBard\t1\nSleep\tWizard\t1\nGlitterdust\tBard\t2\nGlitterdust\tWizard\t2\n"
+
+class FakeCursor:
+    """Answers the loader's id queries from tables and records its inserts."""
+    def __init__(self, tables):
+        self.tables = tables
+        self.result = []
+        self.batches = []
+
+    def execute(self, query, params=()):
+        table = query.split("FROM ")[1].split()[0]
+        self.result = [(row_id, name) for row_id, name, edition_id in self.tables[table] if not params or edition_id == params[0]]
+
+    def fetchall(self):
+        return self.result
+
+    def executemany(self, query, rows):
+        assert query.startswith("INSERT INTO SpellLevelMap")
+        self.batches.append(list(rows))
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    def __init__(self, tables):
+        self.cursor_ = FakeCursor(tables)
+        self.committed = False
+
+    def cursor(self):
+        return self.cursor_
+
+    def commit(self):
+        self.committed = True
+
+def test_spell_level_loader_resolves_ids_and_batches_inserts():
+    conn = FakeConnection({
+        "Class": [(1, "Bard", 1), (2, "Wizard", 1), (3, "Wizard", 2)],
+        "Spell": [(10, "Fireball", 1), (11, "Daze", 1), (12, "Daze", 1), (13, "Light", 1)],
+    })
+    loader = spell_dumper.SpellLevelLoader(conn, batch_size=2, edition_id=1)
+    rows = [("Fireball", "Wizard", "3"), ("light", "Bard", "0"), ("Light", "wizard", "0"), ("Daze", "Bard", "0"), ("Nope", "Bard", "1"), ("Fireball", "Monk", "1"), ("Fireball", "Bard", "3*"), ("Fireball", "Bard", "²")]
+    spell_dumper.write_class_levels(rows, [loader])
+
+    # Names match whatever their case, as they do under the database's collation
+    assert conn.cursor_.batches == [[(2, 10, 3), (1, 13, 0)], [(2, 13, 0)]]
+    assert loader.inserted == 3
+    assert conn.committed
+    assert loader.skipped == {"unknown_spell": {"Nope"}, "unknown_class": {"Monk"}, "ambiguous": {"Daze"}, "invalid_level": {"Fireball: Bard 3*", "Fireball: Bard ²"}}
+
+def test_load_data_sql_applies_the_loader_checks():
+    sql = spell_dumper.load_data_sql("/tmp/levels.tsv", edition_id=1)
+    assert "LOAD DATA LOCAL INFILE '/tmp/levels.tsv'" in sql
+    assert "FROM Spell WHERE editionId = 1 GROUP BY name HAVING COUNT(*) = 1" in sql
+    assert "FROM Class WHERE editionId = 1 GROUP BY name HAVING COUNT(*) = 1" in sql
+    assert "WHERE TRIM(st.level) REGEXP '^[0-9]+$'" in sql
+    assert "editionId" not in spell_dumper.load_data_sql("/tmp/levels.tsv")
@@ -0,0 +1,31 @@
+import spell_data_analyzer
+
+def test_school_validator_finds_unknown_parts():
+    validator = spell_data_analyzer.SchoolValidator()
+    assert validator.validate("evo") == {}
+    assert validator.validate("con[creation][fire,cold]") == {}
+    assert validator.validate("en[fire]") == {}  # one bracket holding a descriptor
+    assert validator.validate("ill[glitter][fire]") == {"subschool": "glitter"}
+    assert validator.validate("abj/xyz[zap]") == {"school": "xyz"}
+    assert validator.validate("en[fire,zap]") == {"descriptor": ["zap"]}
+
+def test_school_validator_memoizes_and_counts_distinct_values(capsys, monkeypatch):
+    validator = spell_data_analyzer.SchoolValidator()
+    parsed = []
+    parse_school_string = spell_data_analyzer.parse_school_string
+    monkeypatch.setattr(spell_data_analyzer, "parse_school_string", lambda val: parsed.append(val) or parse_school_string(val))
+    for val in ["evo", "xyz", "evo", "bad]format", "xyz", "xyz", "con[creation][zap]"]:
+        validator.add(val)
+
+    assert parsed == ["evo", "xyz", "bad]format", "con[creation][zap]"]
+    assert validator.report() == {
+        "rows": 7,
+        "distinct_values": 4,
+        "invalid_rows": 5,
+        "invalid_values": {
+            "xyz": {"count": 3, "invalid": {"school": "xyz"}},
+            "bad]format": {"count": 1, "invalid": {"school": ""}},
+            "con[creation][zap]": {"count": 1, "invalid": {"descriptor": ["zap"]}},
+        },
+    }
+    assert capsys.readouterr().out == 'ERROR: Invalid Format: "bad]format"\n'
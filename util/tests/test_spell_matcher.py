@@ -0,0 +1,91 @@
+import csv
+import os
+import random
+import re
+from functools import lru_cache
+
+import pytest
+
+from spell_matcher import INF, OCR_MERGES, OCR_SUBSTITUTIONS, AhoCorasick, ApproximateNameIndex, NameMatcher, fold_ocr_text, ocr_edit_distance
+
+# Canonical names of every known spell
+SPELLS_TSV = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "apps", "backend", "scripts", "spells.tsv")
+
+def test_aho_corasick_matches_every_overlapping_occurrence():
+    rng = random.Random(18)
+    for _ in range(500):
+        patterns = sorted({"".join(rng.choice("ab") for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 6))})
+        text = "".join(rng.choice("abc") for _ in range(rng.randint(0, 40)))
+        found = sorted((start, patterns[index]) for start, index in AhoCorasick(patterns).iter_matches(text))
+        expected = sorted((match.start(), pattern) for pattern in patterns for match in re.finditer(f"(?=({pattern}))", text))
+        assert found == expected
+
+def test_name_matcher_is_case_insensitive():
+    matcher = NameMatcher(["Light", "Daylight", "Cure Light Wounds"])
+    assert matcher.find_all("DAYLIGHT\ncure light wounds") == {0: [3, 14], 1: [0], 2: [9]}
+
+def reference_distance(a, b):
+    """Unbanded recursive form of ocr_edit_distance."""
+    def gap(char):
+        return 0.5 if char in " '-" else 1.0
+
+    @lru_cache(maxsize=None)
+    def distance(i, j):
+        if i == 0 and j == 0:
+            return 0.0
+        options = []
+        if i:
+            options.append(distance(i - 1, j) + gap(a[i - 1]))
+        if j:
+            options.append(distance(i, j - 1) + gap(b[j - 1]))
+        if i and j:
+            options.append(distance(i - 1, j - 1) + (0.0 if a[i - 1] == b[j - 1] else 0.5 if (a[i - 1], b[j - 1]) in OCR_SUBSTITUTIONS else 1.0))
+        if i > 1 and j and (a[i - 2:i], b[j - 1]) in OCR_MERGES:
+            options.append(distance(i - 2, j - 1) + 0.5)
+        if j > 1 and i and (a[i - 1], b[j - 2:j]) in OCR_MERGES:
+            options.append(distance(i - 1, j - 2) + 0.5)
+        return min(options)
+    return distance(len(a), len(b))
+
+def test_ocr_edit_distance_matches_reference_within_bound():
+    rng = random.Random(19)
+    for _ in range(2000):
+        a = "".join(rng.choice("lirnmcdvwe '") for _ in range(rng.randint(0, 7)))
+        b = "".join(rng.choice("lirnmcdvwe '") for _ in range(rng.randint(0, 7)))
+        expected = reference_distance(a, b)
+        assert ocr_edit_distance(a, b) == expected
+        bound = rng.choice([0, 0.5, 1, 2])
+        assert ocr_edit_distance(a, b, bound) == (expected if expected <= bound else INF)
+
+def test_fold_ocr_text():
+    assert fold_ocr_text("  Ca11   Light- ning") == "call lightning"
+    assert fold_ocr_text("Pr0tection from Evil") == "protection from evil"
+    assert fold_ocr_text("Mind-Affecting") == "mind-affecting"
+
+@pytest.fixture(scope="module")
+def name_index():
+    with open(SPELLS_TSV, newline="", encoding="utf-8") as f:
+        return ApproximateNameIndex(row["name"] for row in csv.DictReader(f, delimiter="\t"))
+
+@pytest.mark.parametrize("text, name", [
+    ("Magic Missile", "Magic Missile"),
+    ("MAGIC MISSILE", "Magic Missile"),
+    ("Magic Missi1e", "Magic Missile"),
+    ("Magic Mis- sile", "Magic Missile"),
+    ("MagicMissile", "Magic Missile"),
+    ("Expediti0us Retreat", "Expeditious Retreat"),
+    ("Expeditious Retrcat", "Expeditious Retreat"),
+    ("Rary's Mnernonic Enhancer", "Rary's Mnemonic Enhancer"),
+])
+def test_approximate_name_index_canonicalizes_ocr_errors(name_index, text, name):
+    assert name_index.lookup(text)[0] == name
+
+def test_approximate_name_index_rejects_unknown_names(name_index):
+    assert name_index.lookup("Evocation [Fire] Level Sor/Wiz 3") is None
+    assert name_index.lookup("Zqxv") is None
+
+def test_approximate_name_index_throughput(name_index, throughput):
+    rng = random.Random(20)
+    queries = [name[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + name[i + 1:] for name in rng.sample(name_index.names, 500) for i in [rng.randrange(len(name))]]
+    results = throughput("ApproximateNameIndex.lookup", len(queries), "lookups", lambda: [name_index.lookup(query) for query in queries])
+    assert sum(result is not None for result in results) > 0.9 * len(queries)